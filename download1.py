@@ -14,35 +14,259 @@ Attempting to read the next channel without a full reinitialisation
 yields a silently truncated record (often 1/4 or 1/10 of the real
 depth).  The workaround is ``_reset_wav_subsystem()``, which cycles
 the mode NORMal → RAW, resets STAR/STOP, re-selects the source, and
-pauses briefly before proceeding.  See the function's docstring for
+waits for the engine to report the full depth before proceeding.  See the function's docstring for
 details.
+
+Interrupted downloads
+---------------------
+With CHECKPOINT set, every chunk goes straight to the archive code file
+and into a ``_download.json`` journal.  If the link drops or a
+``:WAV:DATA?`` times out, leave the scope stopped and run::
+
+    python download1.py --resume aq_YYYY-MM-DD_HHMMSS
+
+to fetch only the missing ranges, after checking that the scope still
+reports the same ``*IDN?``, depth and preambles and the same samples at
+the end of what was already downloaded.
 """
 
+import argparse
+import contextlib
+import contextvars
 import csv
+import json
+import math
+import os
+import queue
+import sys
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
 import pyvisa  # noqa: E402
 
+try:
+    import resource  # noqa: E402  (POSIX only; peak RSS in the metrics)
+except ImportError:
+    resource = None
+
+from capture_archive import (  # noqa: E402
+    code_path, compression_summary, save_archive,
+)
+from ensemble import Ensemble, format_added  # noqa: E402
+from events import format_stats, index_capture, save_events  # noqa: E402
+from scope_analyzer import analyze_capture, write_report  # noqa: E402
+from scpi_socket import DEFAULT_PORT, SocketInstrument  # noqa: E402
+from waveform import (  # noqa: E402
+    Capture, Preamble, Pyramid, Waveform, bucket_starts, minmax_buckets,
+    scaled_indices,
+)
+
 # ── User-configurable constants ──────────────────────────────────────
-IP = "192.168.1.162"
+IP = "192.168.1.162"     # or "host:port" for raw SCPI socket (e.g. scope_sim.py)
+TRANSPORT = "visa"       # "visa" (PyVISA-py) or "socket" (raw TCP, zero-copy bulk reads)
 CHANNELS = ["CHAN1", "CHAN2", "CHAN3", "CHAN4"]
 OUT_PREFIX = ""
 OUT_DIR_PREFIX = "aq_"
-CHUNK_POINTS = 250_000   # samples per :WAV:DATA? request (BYTE mode → 1 byte/sample)
+WAV_FORMAT = "BYTE"      # "BYTE" (8-bit, 1 byte/sample) or "WORD" (full ADC, 2 bytes/sample)
+CHUNK_POINTS = 250_000   # samples per :WAV:DATA? request
+CHUNK_TUNE = False       # probe chunk sizes on the first channel, keep the fastest
+CHUNK_TUNE_FILE = "chunk_tuning.json"  # tuned sizes, reused as the next run's start
+CHUNK_MAX_BYTES = 1_000_000  # largest :WAV:DATA? reply ever requested
+LOG_CHUNKS = True        # print a line per :WAV:DATA? chunk
+PROGRESS = False         # instead, keep one live progress line per channel
+SAVE_METRICS = True      # write <prefix>_metrics.json into the capture directory
 OUTPUT_POINTS = 10_000   # target row count for the decimated CSV
-RESET_PAUSE = 0.5        # seconds to let the scope settle between channel reads
+DECIMATION = "sample"    # decimated CSV: "sample", "minmax" or "minmax_mean"
+LOD_FACTOR = 16          # reduction per envelope pyramid level
+PLOT_WORKERS = None      # processes rendering check plots (None = CPU count)
+PIPELINE = True          # overlap SCPI transfer with archive / CSV writes
+PIPELINE_QUEUE = 16      # max chunks in flight between transfer and writer
+PIPELINE_WORKERS = 2     # threads writing per-channel CSVs during transfer
+STRICT_SCPI = False      # True: one command per write, drain errors after each
+RESET_PAUSE = None       # fixed settle sleep (s) per channel; None = poll for readiness
+SETTLE_POLL = 0.01       # first readiness poll interval (s), doubled each poll
+SETTLE_TIMEOUT = 2.0     # give up polling after this long (s)
+RESET_RETRIES = 2        # extra reset cycles when the record still looks truncated
+SAVE_ARCHIVE = True      # also write raw codes + JSON sidecar (see capture_archive.py)
+ARCHIVE_CODEC = None     # None (raw codes) or "zlib" / "lzma" block-compressed codes
+ARCHIVE_LEVEL = None     # codec level (None = codec default, favours speed)
+ARCHIVE_WORKERS = None   # threads compressing blocks (None = CPU count based)
+CHECKPOINT = True        # spill + journal every chunk so a broken download resumes
+RESUME_VERIFY_POINTS = 1000  # samples re-read on resume to confirm the acquisition
+CSV_PRECISION = None     # significant digits for CSV floats (None = full repr)
+CSV_BLOCK_ROWS = 1 << 18 # rows formatted and written per block
+ANALYZE = False          # write <prefix>_analysis.log (scope_analyzer.py report)
+ANALYSIS_FUNDAMENTAL_HZ = 50.0  # target fundamental for the analysis
+ANALYSIS_MAX_HARMONIC = 15      # highest harmonic reported
+EVENT_INDEX = False      # write <prefix>_CHANn.events.npy edge indexes (events.py)
+EVENT_THRESHOLD = None   # volts; None = each channel's mid-level
+EVENT_HYSTERESIS = None  # total band in volts; None = 10 % of peak-to-peak, >= 2 LSB
+ENSEMBLE_DIR = None      # fold every capture into this ensemble.py directory
+ENSEMBLE_ALIGN = None    # channel whose lag aligns each capture (None = off)
+
+# Code dtype per :WAV:FORM; WORD arrives as little-endian 16-bit words.
+_WAV_DTYPES = {"BYTE": np.dtype(np.uint8), "WORD": np.dtype("<u2")}
+
+
+# ── Instrumentation ──────────────────────────────────────────────────
+
+class _Metrics:
+    """
+    Structured timings for one capture, collected from any thread.
+
+    ``phases`` holds one entry per timed step (reset, preamble, channel,
+    archive, each CSV, plots, screenshot, ...) with its start offset,
+    duration, thread and tags; ``chunks`` one entry per :WAV:DATA?
+    request.  ``write()`` adds per-phase totals, the SCPI latency
+    histogram from the session's ``_ScpiLink`` and peak RSS.
+    """
+
+    # Upper bucket edges of the SCPI latency histogram, in milliseconds.
+    LATENCY_EDGES_MS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500,
+                        1000, 2000, 5000)
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases: list[dict] = []
+        self.chunks: list[dict] = []
+        self._lock = threading.Lock()
+
+    def add_phase(self, name: str, start: float, seconds: float, **tags):
+        entry = {"name": name, "start_s": start - self.t0, "seconds": seconds,
+                 "thread": threading.current_thread().name, **tags}
+        with self._lock:
+            self.phases.append(entry)
+
+    def add_chunk(self, channel: str, start: int, points: int, nbytes: int,
+                  seconds: float):
+        entry = {"channel": channel, "start": start, "points": points,
+                 "bytes": nbytes, "seconds": seconds,
+                 "bytes_per_s": nbytes / seconds if seconds > 0 else None}
+        with self._lock:
+            self.chunks.append(entry)
+
+    def _latency(self, latencies: list[float]) -> dict:
+        ms = np.asarray(latencies, dtype=np.float64) * 1e3
+        edges = (0.0,) + self.LATENCY_EDGES_MS + (float("inf"),)
+        counts, _ = np.histogram(ms, bins=edges)
+        out = {"count": len(ms),
+               "histogram_ms": {"le": list(self.LATENCY_EDGES_MS) + ["inf"],
+                                "counts": counts.tolist()}}
+        if len(ms):
+            p50, p90, p99 = np.percentile(ms, (50, 90, 99))
+            out.update(p50_ms=p50, p90_ms=p90, p99_ms=p99, max_ms=ms.max())
+        return out
+
+    def write(self, path: Path, scope=None, **info) -> Path:
+        totals: dict[str, dict] = {}
+        for ph in self.phases:
+            t = totals.setdefault(ph["name"], {"count": 0, "seconds": 0.0})
+            t["count"] += 1
+            t["seconds"] += ph["seconds"]
+        nbytes = sum(c["bytes"] for c in self.chunks)
+        secs = sum(c["seconds"] for c in self.chunks)
+        rates = [c["bytes_per_s"] for c in self.chunks if c["bytes_per_s"]]
+        transfer = {"chunks": len(self.chunks), "bytes": nbytes,
+                    "seconds": secs,
+                    "bytes_per_s": nbytes / secs if secs else None}
+        if rates:
+            transfer.update(chunk_bytes_per_s_min=min(rates),
+                            chunk_bytes_per_s_median=float(np.median(rates)),
+                            chunk_bytes_per_s_max=max(rates))
+        meta = {
+            "version": 1,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            **info,
+            "wall_s": time.perf_counter() - self.t0,
+            "peak_rss_bytes": _peak_rss(),
+            "phase_totals": totals,
+            "transfer": transfer,
+        }
+        if isinstance(scope, _ScpiLink):
+            meta["scpi"] = {
+                "writes": scope.writes, "queries": scope.queries,
+                "round_trips": scope.writes + scope.queries,
+                "unbatched_round_trips": scope.unbatched,
+                "query_latency": self._latency(scope.latencies),
+            }
+        meta["phases"] = self.phases
+        meta["chunks"] = self.chunks
+        path.write_text(json.dumps(meta, indent=2))
+        return path
+
+
+# Metrics of the capture running in this context; helper threads are
+# started through _submit() / copy_context() so they report to it too.
+_METRICS: contextvars.ContextVar[_Metrics | None] = contextvars.ContextVar(
+    "download1_metrics", default=None)
+
+
+@contextlib.contextmanager
+def _phase(name: str, **tags):
+    """
+    Time the enclosed block as phase *name* of the current capture.
+    Yields the tag dict, so the block can add results (e.g. a poll count).
+    """
+    t0 = time.perf_counter()
+    try:
+        yield tags
+    finally:
+        m = _METRICS.get()
+        if m is not None:
+            m.add_phase(name, t0, time.perf_counter() - t0, **tags)
+
+
+def _submit(pool, fn, *args):
+    """``pool.submit`` that carries the caller's metrics context along."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _peak_rss() -> int | None:
+    """Peak resident set size of this process in bytes, if known."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
 
 
 # ── SCPI helpers ─────────────────────────────────────────────────────
 
-def _open_scope(ip: str):
+def _visa_resource(address: str) -> str:
+    """
+    VISA resource string for *address*: ``"host"`` (VXI-11 INSTR),
+    ``"host:port"`` (raw SCPI socket, e.g. port 5555 or scope_sim.py),
+    or a full resource string passed through unchanged.
+    """
+    if "::" in address:
+        return address
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        return f"TCPIP::{host}::{int(port)}::SOCKET"
+    return f"TCPIP::{address}::INSTR"
+
+
+def _open_scope(ip: str, transport: str = "visa"):
+    """
+    Open a session to *ip*; returns ``(rm, scope)``.
+
+    ``transport="socket"`` talks to the raw SCPI port (``host:port``, or
+    port 5555 for a bare host) through ``SocketInstrument`` and returns
+    ``rm=None``.
+    """
+    if transport == "socket":
+        host, _, port = ip.rpartition(":") if ":" in ip else (ip, "", "")
+        return None, SocketInstrument(host, int(port or DEFAULT_PORT))
+    if transport != "visa":
+        raise ValueError(f"TRANSPORT must be 'visa' or 'socket', got {transport!r}")
     rm = pyvisa.ResourceManager("@py")
-    scope = rm.open_resource(f"TCPIP::{ip}::INSTR")
+    scope = rm.open_resource(_visa_resource(ip))
     scope.timeout = 180_000
     scope.chunk_size = 1024 * 1024
     scope.read_termination = "\n"
@@ -50,8 +274,120 @@ def _open_scope(ip: str):
     return rm, scope
 
 
+class _ScpiLink:
+    """
+    Command layer over a VISA session that cuts SCPI round-trips.
+
+    * ``write(*cmds)`` sends several commands as one ``;``-joined line.
+    * ``check(context)`` marks a point where the old code drained
+      ``:SYST:ERR?``; the drain is deferred to the next ``checkpoint()``,
+      which empties the queue once for everything since the last one.
+    * ``strict=True`` restores one line per command and an immediate
+      drain at every ``check()``, for attributing errors precisely.
+
+    Every write and query is counted and timed so the run can report how
+    many round-trips batching saved.  Other attributes (``timeout``,
+    ``close``, ...) pass through to the wrapped resource.
+    """
+
+    def __init__(self, scope, strict: bool = False):
+        self._scope = scope
+        self.strict = strict
+        self._pending: list[tuple[str, bool]] = []
+        self.writes = 0
+        self.queries = 0
+        self.query_time = 0.0   # text queries only (bulk reads excluded)
+        self.latencies: list[float] = []  # seconds per text query
+        self.bulk_bytes = 0     # code bytes received through read_block()
+        self.bulk_time = 0.0
+        self.unbatched = 0      # round-trips the one-command-per-call code needs
+
+    def __getattr__(self, name):
+        return getattr(self._scope, name)
+
+    def write(self, *cmds: str):
+        self.unbatched += len(cmds)
+        if self.strict:
+            for cmd in cmds:
+                self._scope.write(cmd)
+            self.writes += len(cmds)
+        else:
+            self._scope.write(";".join(cmds))
+            self.writes += 1
+
+    def query(self, cmd: str) -> str:
+        self.unbatched += 1
+        return self._timed_query(cmd)
+
+    def _timed_query(self, cmd: str) -> str:
+        t0 = time.perf_counter()
+        reply = self._scope.query(cmd)
+        dt = time.perf_counter() - t0
+        self.query_time += dt
+        self.latencies.append(dt)
+        self.queries += 1
+        return reply
+
+    def query_binary_values(self, cmd: str, **kwargs):
+        self.unbatched += 1
+        self.queries += 1
+        return self._scope.query_binary_values(cmd, **kwargs)
+
+    def read_block(self, cmd: str, out) -> int:
+        self.unbatched += 1
+        self.queries += 1
+        t0 = time.perf_counter()
+        n = _read_block(self._scope, cmd, out)
+        self.bulk_time += time.perf_counter() - t0
+        self.bulk_bytes += n * out.itemsize
+        return n
+
+    def check(self, context: str = "", quiet: bool = False):
+        """Error check point; immediate in strict mode, deferred otherwise."""
+        self.unbatched += 1
+        if self.strict:
+            self._drain(context, quiet)
+        else:
+            self._pending.append((context, quiet))
+
+    def checkpoint(self, context: str = "", quiet: bool = False):
+        """Drain the error queue now, covering every deferred check."""
+        self.unbatched += 1
+        pending, self._pending = self._pending, []
+        if pending:
+            # a deep record defers hundreds of chunk checks: name only the
+            # first and last of them so one error stays one readable line
+            deferred = [c for c, _ in pending if c]
+            if len(deferred) > 2:
+                deferred = [f"{deferred[0]} .. {deferred[-1]} "
+                            f"({len(pending)} deferred checks)"]
+            context = ", ".join(deferred + [context])
+            quiet = quiet and all(q for _, q in pending)
+        self._drain(context, quiet)
+
+    def _drain(self, context: str, quiet: bool):
+        while True:
+            err = self._timed_query(":SYST:ERR?").strip()
+            if err.startswith("0,") or err.startswith("0 ") or err == "0":
+                break
+            if not quiet:
+                tag = f" [{context}]" if context else ""
+                print(f"SCPI ERROR{tag}: {err}")
+
+    def report(self) -> str:
+        actual = self.writes + self.queries
+        saved = self.unbatched - actual
+        rtt = self.query_time / self.queries if self.queries else 0.0
+        return (f"SCPI: {self.writes} writes + {self.queries} queries = "
+                f"{actual} round-trips (unbatched {self.unbatched}, saved "
+                f"{saved} ≈ {saved * rtt:.2f} s at {rtt * 1e3:.1f} ms each)")
+
+
 def _check_scpi_errors(scope, context: str = "", quiet: bool = False):
     """Drain all queued SCPI errors.  Print them unless *quiet*."""
+    if isinstance(scope, _ScpiLink):
+        scope.checkpoint(context, quiet)
+        return
     while True:
         err = scope.query(":SYST:ERR?").strip()
         if err.startswith("0,") or err.startswith("0 ") or err == "0":
@@ -61,6 +397,51 @@ def _check_scpi_errors(scope, context: str = "", quiet: bool = False):
             print(f"SCPI ERROR{tag}: {err}")
 
 
+def _defer_scpi_check(scope, context: str = "", quiet: bool = False):
+    """Request an error check that a ``_ScpiLink`` may batch into the next
+    checkpoint; on a bare VISA resource it drains immediately."""
+    if isinstance(scope, _ScpiLink):
+        scope.check(context, quiet)
+    else:
+        _check_scpi_errors(scope, context, quiet)
+
+
+def _read_block(scope, cmd: str, out) -> int:
+    """
+    Query *cmd* and store its IEEE block reply in the code array *out*
+    (``uint8``, or little-endian ``uint16`` for WORD); returns the number
+    of samples the instrument sent.
+
+    Transports with ``read_block_into`` (``SocketInstrument``) receive
+    straight into *out*'s bytes; PyVISA goes through
+    ``query_binary_values`` and one copy.  Only ``min(len(out), sent)``
+    samples are stored.
+    """
+    if isinstance(scope, _ScpiLink):
+        return scope.read_block(cmd, out)
+    read_into = getattr(scope, "read_block_into", None)
+    if read_into is not None:
+        return read_into(cmd, out) // out.itemsize
+    raw = scope.query_binary_values(
+        cmd, datatype="B" if out.itemsize == 1 else "H",
+        is_big_endian=False, container=np.ndarray,
+        header_fmt="ieee", expect_termination=True,
+    )
+    n = min(len(raw), len(out))
+    out[:n] = raw[:n]
+    return len(raw)
+
+
+def _write(scope, *cmds: str):
+    """Send *cmds*: one ``;``-joined line through a ``_ScpiLink``,
+    one write each on a bare VISA resource."""
+    if isinstance(scope, _ScpiLink):
+        scope.write(*cmds)
+    else:
+        for cmd in cmds:
+            scope.write(cmd)
+
+
 def _acquire_memory_depth(scope) -> int:
     """Return the current acquisition memory depth in points (0 if AUTO)."""
     raw = scope.query(":ACQ:MDEP?").strip().upper()
@@ -89,231 +470,729 @@ def _reset_wav_subsystem(scope, channel: str):
     real per-channel depth — with no SCPI error.
 
     The sequence below was found empirically to clear that state
-    reliably on DHO924S firmware 00.01.02:
+    reliably on DHO924S firmware 00.01.02 (steps 1-3 and step 4 each go
+    out as one ``;``-joined line unless STRICT_SCPI is set):
 
       1. Switch :WAV:MODE to NORMal (flushes RAW engine).
       2. Reset :WAV:STAR / :WAV:STOP to small defaults.
       3. Select the new channel source.
-      4. Switch back to :WAV:MODE RAW + :WAV:FORM BYTE.
-      5. Sleep briefly (RESET_PAUSE) to let firmware settle.
+      4. Switch back to :WAV:MODE RAW + :WAV:FORM (BYTE or WORD).
+      5. Wait for ``*OPC?``, i.e. until the firmware has processed the
+         mode switch (or sleep RESET_PAUSE seconds if that is set).
+
+    Whether the engine really came back at full depth is checked
+    afterwards by ``_settle_wav()``.
+    """
+    with _phase("reset", channel=channel):
+        _write(scope, ":WAV:MODE NORMal", ":WAV:STAR 1", ":WAV:STOP 1000",
+               f":WAV:SOUR {channel}")
+        _defer_scpi_check(scope, "WAV:MODE NORMal/STAR/STOP (reset)",
+                          quiet=True)
+        _defer_scpi_check(scope, f"WAV:SOUR {channel}")
+
+        _write(scope, ":WAV:MODE RAW", f":WAV:FORM {WAV_FORMAT}")
+        _defer_scpi_check(scope, f"WAV:MODE RAW / FORM {WAV_FORMAT}")
+
+        if RESET_PAUSE is None:
+            scope.query("*OPC?")
+        else:
+            time.sleep(RESET_PAUSE)
+        _check_scpi_errors(scope, f"post-reset {channel}", quiet=True)
+
+
+def _settle_wav(scope, channel: str, memory_depth: int):
     """
-    scope.write(":WAV:MODE NORMal")
-    _check_scpi_errors(scope, "WAV:MODE NORMal (reset)", quiet=True)
-    scope.write(":WAV:STAR 1")
-    scope.write(":WAV:STOP 1000")
-    _check_scpi_errors(scope, "WAV:STAR/STOP reset", quiet=True)
+    Request *memory_depth* points and poll until the WAV engine agrees.
 
-    scope.write(f":WAV:SOUR {channel}")
-    _check_scpi_errors(scope, f"WAV:SOUR {channel}")
+    Right after :WAV:MODE RAW the firmware can still report the short
+    record of the state-leak quirk for a while.  Polls ``:WAV:POIN?`` and
+    the preamble with exponential backoff (SETTLE_POLL, doubling) until
+    both report *memory_depth* points — or, with AUTO depth, until they
+    agree on the same count twice running — or SETTLE_TIMEOUT expires.
+    With a fixed RESET_PAUSE the state is sampled once.
 
-    scope.write(":WAV:MODE RAW")
-    _check_scpi_errors(scope, "WAV:MODE RAW")
-    scope.write(":WAV:FORM BYTE")
-    _check_scpi_errors(scope, "WAV:FORM BYTE")
+    Returns ``(accepted, preamble, polls, seconds)`` from the last poll.
+    """
+    scope.write(f":WAV:POIN {memory_depth}")
+    _defer_scpi_check(scope, f"WAV:POIN {memory_depth} {channel}", quiet=True)
+
+    t0 = time.perf_counter()
+    timeout = SETTLE_TIMEOUT if RESET_PAUSE is None else 0.0
+    delay = SETTLE_POLL
+    polls = 0
+    last = None
+    while True:
+        accepted = scope.query(":WAV:POIN?").strip()
+        raw_pre = scope.query(":WAV:PRE?").strip()
+        polls += 1
+        try:
+            preamble = Preamble.parse(raw_pre)
+        except ValueError:
+            raise RuntimeError(f"Unexpected preamble for {channel}: {raw_pre}")
+        try:
+            points = int(float(accepted))
+        except ValueError:
+            points = -1
+        if memory_depth:
+            ready = points >= memory_depth and preamble.points >= memory_depth
+        else:
+            ready = points == preamble.points == last
+        last = preamble.points
+        elapsed = time.perf_counter() - t0
+        if ready or elapsed >= timeout:
+            return accepted, preamble, polls, elapsed
+        time.sleep(min(delay, timeout - elapsed))
+        delay *= 2
 
-    time.sleep(RESET_PAUSE)
-    _check_scpi_errors(scope, f"post-reset {channel}", quiet=True)
+
+# ── Chunk-size tuning ───────────────────────────────────────────────
+
+# fleet.py tunes several scopes at once; their read-modify-write of
+# CHUNK_TUNE_FILE must not interleave or one scope's entry is lost.
+_TUNE_FILE_LOCK = threading.Lock()
+
+
+class _ChunkTuner:
+    """
+    Picks the :WAV:DATA? chunk size from live measurements.
+
+    After one untimed warm-up chunk (the first DATA? of a capture pays
+    one-off costs), chunks are requested at 1/4, 1/2, 1, 2 and 4 times
+    the starting size (capped at CHUNK_MAX_BYTES); each STAR/STOP + DATA?
+    round is timed.  The smallest size within 5 % of the best
+    measured bytes/s is then used for the rest of the capture, and saved
+    to CHUNK_TUNE_FILE under *key* together with the raw measurements and
+    a latency / bandwidth fit, so the next run probes around it.  Probe
+    chunks are real data; nothing is transferred twice.
+    """
+
+    def __init__(self, key: str, path=CHUNK_TUNE_FILE,
+                 start: int = CHUNK_POINTS, itemsize: int = 1):
+        self.key = key
+        self.path = Path(path)
+        self.itemsize = itemsize
+        stored = self._load().get(key)
+        if stored:
+            start = int(stored["chunk_points"])
+            print(f"Chunk tuning: starting from stored {start:,} points")
+        limit = CHUNK_MAX_BYTES // itemsize
+        self.chunk = min(start, limit)
+        self.probes = sorted({max(1, min(int(self.chunk * f), limit))
+                              for f in (0.25, 0.5, 1, 2, 4)})
+        self.samples: list[tuple[int, float]] = []
+        self._warm = False
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    @property
+    def probing(self) -> bool:
+        return len(self.samples) < len(self.probes)
+
+    def size(self) -> int:
+        """Chunk size to request next."""
+        if not self._warm or not self.probing:
+            return self.chunk
+        return self.probes[len(self.samples)]
+
+    def record(self, points: int, seconds: float):
+        """Time one full chunk of the size ``size()`` returned."""
+        if not self._warm:
+            self._warm = True
+            return
+        if not self.probing or points != self.size():
+            return
+        self.samples.append((points, seconds))
+        if not self.probing:
+            self._finish()
+
+    def _finish(self):
+        rates = [p * self.itemsize / t for p, t in self.samples]
+        best = max(rates)
+        self.chunk = min(p for (p, _), r in zip(self.samples, rates)
+                         if r >= 0.95 * best)
+        pts, secs = np.array(self.samples, dtype=np.float64).T
+        slope, latency = np.polyfit(pts, secs, 1)
+        fit_rate = self.itemsize / slope if slope > 0 else None
+        print("Chunk tuning: " + ", ".join(
+            f"{p:,} pts {r / 1e6:.2f} MB/s" for (p, _), r in
+            zip(self.samples, rates)))
+        fit = (f"{fit_rate / 1e6:.2f} MB/s" if fit_rate else "no slope")
+        print(f"Chunk tuning: using {self.chunk:,} points "
+              f"(fit: {latency * 1e3:.1f} ms/request, {fit})")
+        entry = {
+            "chunk_points": self.chunk,
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "latency_s": latency,
+            "bytes_per_s": fit_rate,
+            "probes": [{"points": p, "seconds": t} for p, t in self.samples],
+        }
+        with _TUNE_FILE_LOCK:
+            table = self._load()
+            table[self.key] = entry
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(table, indent=2) + "\n")
+            os.replace(tmp, self.path)
+
+
+# ── Download checkpoints ────────────────────────────────────────────
+
+JOURNAL_SUFFIX = "_download.json"
+
+
+class _Checkpoint:
+    """
+    Chunk-level progress journal for one capture directory.
+
+    Every chunk is written at its offset in the channel's archive code
+    file (``code_path()``, preallocated to the preamble's length) and
+    then recorded in ``<prefix>_download.json`` together with the
+    channel's preamble, so a download that dies on chunk 150 of 200 keeps
+    everything before it.  ``--resume`` reopens the journal and
+    ``_read_channel_raw`` fetches only the ranges it does not list.  The
+    journal is removed once the archive sidecar has been written.  It
+    also records which scope the download came from (address, transport,
+    ensemble subdirectory), so a resume reconnects to that scope even when
+    the download was started by ``fleet.py``.
+
+    ``open()`` is called from the transfer thread, ``write()`` from
+    whichever thread persists chunks; both are serialised.
+    """
+
+    def __init__(self, out_dir: Path, prefix: str, meta: dict):
+        self.out_dir = Path(out_dir)
+        self.prefix = prefix
+        self.meta = meta
+        self.path = self.out_dir / f"{prefix}{JOURNAL_SUFFIX}"
+        self._files = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, out_dir: Path, prefix: str, idn: str, memory_depth: int,
+               channels: list[str], address: str = IP,
+               ensemble_sub: str = "") -> "_Checkpoint":
+        cp = cls(out_dir, prefix, {
+            "version": 1, "idn": idn, "memory_depth": memory_depth,
+            "format": WAV_FORMAT, "prefix": prefix,
+            "address": address, "transport": TRANSPORT,
+            "ensemble_sub": ensemble_sub,
+            "channels": list(channels), "waveforms": {},
+        })
+        cp._save()
+        return cp
+
+    @classmethod
+    def load(cls, out_dir: Path) -> "_Checkpoint":
+        found = sorted(Path(out_dir).glob(f"*{JOURNAL_SUFFIX}"))
+        if not found:
+            raise FileNotFoundError(f"No *{JOURNAL_SUFFIX} in {out_dir}; "
+                                    f"nothing to resume")
+        meta = json.loads(found[0].read_text())
+        if meta.get("version") != 1:
+            raise ValueError(f"{found[0]}: unsupported journal version "
+                             f"{meta.get('version')}")
+        return cls(out_dir, meta["prefix"], meta)
+
+    def _save(self):
+        self.meta["updated"] = datetime.now().isoformat(timespec="milliseconds")
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.meta, indent=2))
+        os.replace(tmp, self.path)
+
+    def done(self, channel: str) -> list[list[int]]:
+        """Completed 1-based inclusive ``[start, stop]`` ranges of *channel*."""
+        entry = self.meta["waveforms"].get(channel)
+        return [] if entry is None else entry["done"]
+
+    def open(self, channel: str, preamble: Preamble,
+             dtype) -> tuple[np.ndarray, list[tuple[int, int]]]:
+        """
+        Code buffer for *channel* and the 1-based ranges still to fetch.
+
+        A channel already in the journal must report the same preamble
+        as before; its downloaded codes are read back into the buffer.
+        """
+        dtype = np.dtype(dtype)
+        points = preamble.points
+        path = code_path(self.out_dir, self.prefix, channel, dtype)
+        with self._lock:
+            entry = self.meta["waveforms"].get(channel)
+            if entry is None:
+                codes = np.empty(points, dtype=dtype)
+                with open(path, "wb") as f:
+                    f.truncate(points * dtype.itemsize)
+                self.meta["waveforms"][channel] = {
+                    "file": path.name, "dtype": dtype.name, "points": points,
+                    "preamble": preamble._asdict(), "done": [],
+                }
+                self._save()
+                done = []
+            else:
+                if Preamble(**entry["preamble"]) != preamble:
+                    raise RuntimeError(
+                        f"{channel}: preamble changed since the interrupted "
+                        f"download; the scope is no longer on the same "
+                        f"acquisition\n  was: {entry['preamble']}\n"
+                        f"  now: {preamble._asdict()}")
+                codes = np.fromfile(path, dtype=dtype.newbyteorder("<"),
+                                    count=points).astype(dtype, copy=False)
+                done = entry["done"]
+            self._files[channel] = open(path, "r+b")
+        missing, pos = [], 1
+        for lo, hi in done:
+            if lo > pos:
+                missing.append((pos, lo - 1))
+            pos = max(pos, hi + 1)
+        if pos <= points:
+            missing.append((pos, points))
+        return codes, missing
+
+    def write(self, channel: str, codes: np.ndarray, lo: int, hi: int):
+        """Persist ``codes[lo:hi]`` (0-based, half-open), then journal it."""
+        with self._lock:
+            f = self._files[channel]
+            f.seek(lo * codes.itemsize)
+            f.write(codes[lo:hi].astype(codes.dtype.newbyteorder("<"),
+                                        copy=False).data)
+            f.flush()
+            done = self.meta["waveforms"][channel]["done"]
+            done.append([lo + 1, hi])
+            done.sort()
+            merged = [done[0]]
+            for a, b in done[1:]:
+                if a <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], b)
+                else:
+                    merged.append([a, b])
+            done[:] = merged
+            self._save()
+
+    def close(self, channel: str | None = None):
+        with self._lock:
+            for ch in [channel] if channel else list(self._files):
+                f = self._files.pop(ch, None)
+                if f is not None:
+                    f.close()
+
+    def finish(self):
+        """The archive is complete: drop the journal."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+
+def _verify_resumed(scope, channel: str, codes: np.ndarray,
+                    done: list[list[int]]):
+    """
+    Re-read the tail of the last completed range and compare it with the
+    spilled codes: identical preambles alone do not prove that the scope
+    was not re-armed and stopped again with the same settings.
+    """
+    if not done or not RESUME_VERIFY_POINTS:
+        return
+    stop = done[-1][1]
+    start = max(done[-1][0], stop - RESUME_VERIFY_POINTS + 1)
+    fresh = np.empty(stop - start + 1, dtype=codes.dtype)
+    _write(scope, f":WAV:STAR {start}", f":WAV:STOP {stop}")
+    got = _read_block(scope, ":WAV:DATA?", fresh)
+    if got != len(fresh) or not np.array_equal(fresh, codes[start - 1:stop]):
+        raise RuntimeError(
+            f"{channel}: samples {start}..{stop} differ from the interrupted "
+            f"download; the scope is no longer on the same acquisition")
+    print(f"{channel}: resume check {start}..{stop} matches")
 
 
 # ── Waveform download ───────────────────────────────────────────────
 
 def _read_channel_raw(scope, channel: str, memory_depth: int,
-                      chunk: int = CHUNK_POINTS) -> dict:
+                      chunk: int = CHUNK_POINTS, on_chunk=None,
+                      tuner: _ChunkTuner | None = None,
+                      checkpoint: _Checkpoint | None = None) -> Waveform:
     """
     Read the full RAW record for *channel*.
 
-    Returns a dict with keys: channel, points, xinc, xorig, xref, values.
+    Chunks land in a code buffer preallocated from the preamble point
+    count — ``uint8`` for BYTE, little-endian ``uint16`` for WORD —
+    received directly into it on the socket transport, copied from a
+    NumPy view on PyVISA.  The
+    returned ``Waveform`` keeps those raw codes plus the full preamble;
+    voltages are only computed when a writer asks for them.
+
+    If the preamble still reports fewer than *memory_depth* points once
+    the engine has settled, the WAV reset is repeated up to RESET_RETRIES
+    times before the short record is downloaded with a warning.
+
+    If given, ``on_chunk(channel, codes, lo, hi)`` is called after each
+    chunk lands in ``codes[lo:hi]`` (0-based, half-open).  A *tuner*
+    overrides *chunk* and is fed the timing of every request.
+
+    With a *checkpoint*, the buffer comes from ``checkpoint.open()``: a
+    channel the journal already has is checked against the scope and
+    only its missing ranges are requested.  Persisting the chunks (via
+    ``checkpoint.write``) is left to *on_chunk*.
     """
-    _reset_wav_subsystem(scope, channel)
-
-    scope.write(f":WAV:POIN {memory_depth}")
-    _check_scpi_errors(scope, f"WAV:POIN {memory_depth} {channel}", quiet=True)
-    accepted = scope.query(":WAV:POIN?").strip()
-    print(f"{channel}: :WAV:POIN {memory_depth} -> accepted {accepted}")
-
-    preamble = scope.query(":WAV:PRE?").strip()
+    t_channel = time.perf_counter()
+    for attempt in range(RESET_RETRIES + 1):
+        _reset_wav_subsystem(scope, channel)
+        with _phase("preamble", channel=channel, attempt=attempt) as tags:
+            accepted, preamble, polls, settle = _settle_wav(scope, channel,
+                                                            memory_depth)
+            tags.update(polls=polls, points=preamble.points)
+        print(f"{channel}: :WAV:POIN {memory_depth} -> accepted {accepted} "
+              f"(settled in {settle:.2f} s, {polls} poll(s))")
+        if not memory_depth or preamble.points >= memory_depth:
+            break
+        if attempt < RESET_RETRIES:
+            print(f"{channel}: record truncated to {preamble.points} of "
+                  f"{memory_depth} points; resetting WAV again "
+                  f"({attempt + 1}/{RESET_RETRIES})")
+        else:
+            print(f"{channel}: WARNING still truncated after "
+                  f"{RESET_RETRIES} retries; downloading {preamble.points} points")
     _check_scpi_errors(scope, f"WAV:PRE? {channel}")
-    parts = [p.strip() for p in preamble.split(",")]
-    if len(parts) < 10:
-        raise RuntimeError(f"Unexpected preamble for {channel}: {preamble}")
 
-    points = int(float(parts[2]))
+    points = preamble.points
     print(f"{channel}: preamble reports {points} RAW points "
           f"(memory depth setting: {memory_depth})")
 
-    xinc  = float(parts[4])
-    xorig = float(parts[5])
-    xref  = float(parts[6])
-    yinc  = float(parts[7])
-    yorig = float(parts[8])
-    yref  = float(parts[9])
-
-    values: list[float] = []
-    start = 1
-    while start <= points:
-        stop = min(start + chunk - 1, points)
-        scope.write(f":WAV:STAR {start}")
-        scope.write(f":WAV:STOP {stop}")
-        _check_scpi_errors(scope, f"WAV:STAR/STOP {start}..{stop}")
-        raw = scope.query_binary_values(
-            ":WAV:DATA?", datatype="B",
-            header_fmt="ieee", expect_termination=True,
-        )
-        _check_scpi_errors(scope, f"WAV:DATA? {channel} {start}..{stop}")
-        expected = stop - start + 1
-        if len(raw) != expected:
-            raise RuntimeError(
-                f"{channel}: expected {expected} samples "
-                f"for {start}..{stop}, got {len(raw)}"
-            )
-        for b in raw:
-            values.append((b - yref - yorig) * yinc)
-        print(f"  {channel}: read {start}..{stop} / {points}")
-        start = stop + 1
-
-    return {
-        "channel": channel,
-        "points": len(values),
-        "xinc": xinc, "xorig": xorig, "xref": xref,
-        "values": values,
-    }
+    if checkpoint is None:
+        codes = np.empty(points, dtype=_WAV_DTYPES[WAV_FORMAT])
+        missing = [(1, points)] if points else []
+    else:
+        codes, missing = checkpoint.open(channel, preamble,
+                                         _WAV_DTYPES[WAV_FORMAT])
+        _verify_resumed(scope, channel, codes, checkpoint.done(channel))
+        if missing != [(1, points)]:
+            todo = sum(hi - lo + 1 for lo, hi in missing)
+            print(f"{channel}: resuming, {points - todo:,} of {points:,} "
+                  f"points already on disk")
+    chunk = min(chunk, CHUNK_MAX_BYTES // codes.itemsize)
+    metrics = _METRICS.get()
+    t_data = time.perf_counter()
+    fetched = 0
+    for start, last in missing:
+        while start <= last:
+            if tuner is not None:
+                chunk = tuner.size()
+            stop = min(start + chunk - 1, last)
+            t0 = time.perf_counter()
+            _write(scope, f":WAV:STAR {start}", f":WAV:STOP {stop}")
+            _defer_scpi_check(scope, f"WAV:STAR/STOP {start}..{stop}")
+            got = _read_block(scope, ":WAV:DATA?", codes[start - 1:stop])
+            dt = time.perf_counter() - t0
+            if tuner is not None:
+                tuner.record(got, dt)
+            if metrics is not None:
+                metrics.add_chunk(channel, start, got, got * codes.itemsize, dt)
+            _defer_scpi_check(scope, f"WAV:DATA? {channel} {start}..{stop}")
+            expected = stop - start + 1
+            if got != expected:
+                _check_scpi_errors(scope, f"{channel} short read")
+                raise RuntimeError(
+                    f"{channel}: expected {expected} samples "
+                    f"for {start}..{stop}, got {got}"
+                )
+            if PROGRESS:
+                fetched += got
+                rate = fetched * codes.itemsize / (time.perf_counter() - t_data)
+                sys.stdout.write(f"\r  {channel}: {stop / points:6.1%} of "
+                                 f"{points:,} pts, {rate / 1e6:.2f} MB/s")
+                sys.stdout.flush()
+            elif LOG_CHUNKS:
+                print(f"  {channel}: read {start}..{stop} / {points}")
+            if on_chunk is not None:
+                on_chunk(channel, codes, start - 1, stop)
+            start = stop + 1
+    if PROGRESS and points:
+        print()
+
+    _check_scpi_errors(scope, f"{channel} done")
+    if metrics is not None:
+        metrics.add_phase("channel", t_channel,
+                          time.perf_counter() - t_channel, channel=channel,
+                          points=points, bytes=codes.nbytes)
+    return Waveform(channel, codes, preamble)
 
 
 # ── Time helpers ─────────────────────────────────────────────────────
 
-def _ref_time(ref_wf: dict, idx) -> float:
+def _ref_time(ref_wf: Waveform, idx) -> float:
     """Absolute timestamp from the reference (longest) channel's preamble."""
-    return ref_wf["xorig"] + (idx - ref_wf["xref"]) * ref_wf["xinc"]
+    return ref_wf.time_at(idx)
 
 
-def _evenly_spaced_indices(n: int, k: int) -> list[int]:
+def _evenly_spaced_indices(n: int, k: int) -> np.ndarray:
     """Return *k* indices in [0, n-1] spanning the full record."""
     if n <= 0 or k <= 0:
-        return []
+        return np.zeros(0, dtype=np.int64)
     if n <= k:
-        return list(range(n))
+        return np.arange(n)
     if k == 1:
-        return [n // 2]
-    return [round(j * (n - 1) / (k - 1)) for j in range(k)]
+        return np.array([n // 2])
+    return scaled_indices(n, k)
+
+
+# ── CSV export engine ───────────────────────────────────────────────
+#
+# Rows are never formatted one at a time.  Each writer hands the engine
+# a callback returning whole columns of strings for a block of rows;
+# the engine joins the block and writes it in one call, so memory stays
+# bounded by CSV_BLOCK_ROWS regardless of record length.  With
+# CSV_PRECISION = None floats are formatted with repr(), which is what
+# csv.writer does, so the files are byte-identical to the old
+# row-by-row writers.
+
+_LUT_CACHE: dict = {}
+
+
+def _format_floats(values, precision: int | None = None) -> list[str]:
+    """Format a float array / list the way csv.writer would (or to N digits)."""
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    if precision is None:
+        return list(map(repr, values))
+    return list(map(f"%.{precision}g".__mod__, values))
+
+
+def _format_codes(wf: Waveform, codes, precision: int | None = None) -> list[str]:
+    """
+    Format ADC codes as voltage strings through a per-channel lookup table.
+
+    A channel only has 2**bits distinct voltages, so each one is
+    formatted once and every row is a table lookup.
+    """
+    key = (wf.preamble, wf.codes.dtype.str, precision)
+    lut = _LUT_CACHE.get(key)
+    if lut is None:
+        levels = np.arange(np.iinfo(wf.codes.dtype).max + 1)
+        lut = np.array(_format_floats(wf.to_volts(levels), precision),
+                       dtype=object)
+        _LUT_CACHE[key] = lut
+    return lut[codes].tolist()
+
+
+def _time_precision(ref_wf: Waveform, precision: int | None) -> int | None:
+    """Widen *precision* so adjacent timestamps stay distinct."""
+    if precision is None or ref_wf.points == 0 or ref_wf.xinc == 0:
+        return precision
+    span = max(abs(_ref_time(ref_wf, 0)),
+               abs(_ref_time(ref_wf, ref_wf.points - 1)))
+    if span == 0:
+        return precision
+    return max(precision, math.ceil(math.log10(span / abs(ref_wf.xinc))) + 2)
+
+
+def _write_csv(path: Path, header: list[str], n: int, block_columns,
+               block: int = CSV_BLOCK_ROWS) -> float:
+    """
+    Write *n* rows produced by ``block_columns(lo, hi)`` to *path*.
+
+    ``block_columns`` returns one list of already-formatted strings per
+    column for rows ``[lo, hi)``.  Returns the throughput in rows/s.
+    """
+    t0 = time.perf_counter()
+    with _phase("csv", file=path.name, rows=n), \
+            open(path, "w", newline="", buffering=1 << 22) as f:
+        csv.writer(f).writerow(header)
+        for lo in range(0, n, block):
+            hi = min(lo + block, n)
+            f.write("\r\n".join(map(",".join, zip(*block_columns(lo, hi)))))
+            f.write("\r\n")
+    dt = time.perf_counter() - t0
+    return n / dt if dt > 0 else float("inf")
 
 
 # ── CSV writers ──────────────────────────────────────────────────────
 
-def _save_single_channel_csv(wf, ref_wf, prefix: str, out_dir: Path):
+def _save_single_channel_csv(wf: Waveform, ref_wf: Waveform, prefix: str,
+                             out_dir: Path, precision: int | None = None):
     """One CSV per channel with timestamps from the reference channel."""
-    n = wf["points"]
-    ref_n = ref_wf["points"]
+    n = wf.points
+    ref_n = ref_wf.points
     ratio = (ref_n - 1) / (n - 1) if n > 1 else 1
+    t_prec = _time_precision(ref_wf, precision)
 
-    path = out_dir / f"{prefix}_{wf['channel']}.csv"
-    with open(path, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["index", "time_s", "voltage_V"])
-        for i, v in enumerate(wf["values"]):
-            w.writerow([i, _ref_time(ref_wf, i * ratio), v])
-    print(f"Saved {path}  ({n} rows)")
+    def columns(lo, hi):
+        return (
+            list(map(str, range(lo, hi))),
+            _format_floats(_ref_time(ref_wf, np.arange(lo, hi) * ratio), t_prec),
+            _format_codes(wf, wf.codes[lo:hi], precision),
+        )
 
+    path = out_dir / f"{prefix}_{wf.channel}.csv"
+    rate = _write_csv(path, ["index", "time_s", "voltage_V"], n, columns)
+    print(f"Saved {path}  ({n} rows, {rate:,.0f} rows/s)")
 
-def _build_aligned_rows(waveforms, ref_wf):
-    """
-    Align all channels to the *shortest* channel's sample count.
 
-    Longer channels are sub-sampled; shorter ones keep every point.
-    Returns (aligned_n, [(ref_index, [voltage_per_channel]), ...]).
+def _aligned_columns(capture: Capture, rows, rowids, precision: int | None):
     """
-    aligned_n = min(wf["points"] for wf in waveforms)
-    ref_n = ref_wf["points"]
-    rows = []
-    for i in range(aligned_n):
-        ref_idx = round(i * (ref_n - 1) / (aligned_n - 1)) if aligned_n > 1 else 0
-        voltages = []
-        for wf in waveforms:
-            wf_n = wf["points"]
-            if wf_n == aligned_n:
-                voltages.append(wf["values"][i])
-            else:
-                j = round(i * (wf_n - 1) / (aligned_n - 1)) if aligned_n > 1 else 0
-                voltages.append(wf["values"][j])
-        rows.append((ref_idx, voltages))
-    return aligned_n, rows
+    Format aligned *rows* (slice or index array into the aligned grid)
+    as (rowid, time, ch...) string columns, gathering straight from the
+    capture's cached alignment indices.
+    """
+    al = capture.alignment()
+    ref_wf = capture.ref
+    return (
+        list(map(str, rowids)),
+        _format_floats(_ref_time(ref_wf, al.ref_rows(rows)),
+                       _time_precision(ref_wf, precision)),
+        *(_format_codes(wf, wf.codes[al.take(k, rows)], precision)
+          for k, wf in enumerate(capture.waveforms)),
+    )
 
 
-def _save_aligned_csv(waveforms, ref_wf, prefix: str, out_dir: Path):
+def _save_aligned_csv(capture: Capture, prefix: str, out_dir: Path,
+                      precision: int | None = None):
     """Multi-channel CSV at the shortest channel's sample count."""
-    aligned_n, rows = _build_aligned_rows(waveforms, ref_wf)
-    header = ["rowid", "time_s"] + [wf["channel"] for wf in waveforms]
+    aligned_n = capture.alignment().n
+    header = ["rowid", "time_s"] + capture.channels
     path = out_dir / f"{prefix}_aligned.csv"
-    with open(path, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(header)
-        for i, (ref_idx, voltages) in enumerate(rows):
-            w.writerow([i, _ref_time(ref_wf, ref_idx)] + voltages)
-    print(f"Saved {path}  ({aligned_n} rows)")
-
-
-def _save_decimated_csv(waveforms, ref_wf, prefix: str, out_dir: Path):
-    """Evenly decimated to OUTPUT_POINTS from the aligned data."""
-    aligned_n, all_rows = _build_aligned_rows(waveforms, ref_wf)
-    idxs = _evenly_spaced_indices(aligned_n, min(OUTPUT_POINTS, aligned_n))
-    header = ["rowid", "time_s"] + [wf["channel"] for wf in waveforms]
+    rate = _write_csv(path, header, aligned_n, lambda lo, hi: _aligned_columns(
+        capture, slice(lo, hi), range(lo, hi), precision))
+    print(f"Saved {path}  ({aligned_n} rows, {rate:,.0f} rows/s)")
+
+
+def _save_decimated_csv(capture: Capture, prefix: str, out_dir: Path,
+                        precision: int | None = None, mode: str = "sample"):
+    """
+    Decimate to OUTPUT_POINTS rows.
+
+    ``mode="sample"`` keeps every k-th aligned row.  ``"minmax"`` splits
+    each channel's full record into OUTPUT_POINTS buckets and writes the
+    min and max of each bucket (read from the envelope pyramid), so a
+    one-sample glitch always survives; ``"minmax_mean"`` adds the bucket
+    mean (one extra pass over the raw codes).
+    """
+    aligned_n = capture.alignment().n
     path = out_dir / f"{prefix}_decimated.csv"
-    with open(path, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(header)
-        for new_i, src_i in enumerate(idxs):
-            ref_idx, voltages = all_rows[src_i]
-            w.writerow([new_i, _ref_time(ref_wf, ref_idx)] + voltages)
-    print(f"Saved {path}  ({len(idxs)} rows)")
+    if mode == "sample":
+        idxs = _evenly_spaced_indices(aligned_n, min(OUTPUT_POINTS, aligned_n))
+        header = ["rowid", "time_s"] + capture.channels
+        rate = _write_csv(path, header, len(idxs), lambda lo, hi: _aligned_columns(
+            capture, idxs[lo:hi], range(lo, hi), precision))
+        print(f"Saved {path}  ({len(idxs)} rows, {rate:,.0f} rows/s)")
+        return
+    if mode not in ("minmax", "minmax_mean"):
+        raise ValueError(f"Unknown DECIMATION mode: {mode!r}")
+
+    k = min(OUTPUT_POINTS, aligned_n)
+    ref_wf = capture.ref
+    header = ["rowid", "time_s"]
+    columns = [
+        list(map(str, range(k))),
+        _format_floats(_ref_time(ref_wf, bucket_starts(0, ref_wf.points, k)),
+                       _time_precision(ref_wf, precision)),
+    ]
+    for wf in capture:
+        pyr = capture.pyramid(wf.channel, LOD_FACTOR, OUTPUT_POINTS)
+        _, mins, maxs = pyr.envelope(wf.codes, 0, wf.points, k)
+        header += [f"{wf.channel}_min", f"{wf.channel}_max"]
+        columns += [_format_codes(wf, mins, precision),
+                    _format_codes(wf, maxs, precision)]
+        if mode == "minmax_mean":
+            starts = bucket_starts(0, wf.points, k)
+            means = minmax_buckets(wf.codes, starts, mean=True)[2]
+            header.append(f"{wf.channel}_mean")
+            columns.append(_format_floats(wf.to_volts(means), precision))
+    rate = _write_csv(path, header, k,
+                      lambda lo, hi: [col[lo:hi] for col in columns])
+    print(f"Saved {path}  ({k} rows, {mode}, {rate:,.0f} rows/s)")
 
 
 # ── Plotting ─────────────────────────────────────────────────────────
+#
+# Plots are drawn from the in-memory (or memory-mapped) capture, never
+# from the CSVs.  The main process reduces each channel to one min/max
+# pair per horizontal pixel via the envelope pyramid, so the worker that
+# renders a PNG only receives a few thousand points; workers run in a
+# process pool, one figure per channel.
+
+_PLOT_SIZE = (11, 4)
+_PLOT_DPI = 150
+
+
+def _plot_payload(capture: Capture, k: int, out_png: Path,
+                  mode: str = "sample") -> dict:
+    """Everything a worker needs to render channel *k* (small arrays only)."""
+    wf = capture.waveforms[k]
+    ref_wf = capture.ref
+    ratio = (ref_wf.points - 1) / (wf.points - 1) if wf.points > 1 else 1
+    pixels = _PLOT_SIZE[0] * _PLOT_DPI
+
+    pyr = capture.pyramid(wf.channel, LOD_FACTOR, OUTPUT_POINTS)
+    starts, mins, maxs = pyr.envelope(wf.codes, 0, wf.points, pixels)
+
+    al = capture.alignment()
+    n_dec = min(OUTPUT_POINTS, al.n)
+    if mode == "sample":
+        rows = _evenly_spaced_indices(al.n, n_dec)
+        t_dec = _ref_time(ref_wf, al.ref_rows(rows))
+        v_dec = [wf.voltages_at(al.take(k, rows))]
+    else:
+        dec_starts, dmin, dmax = pyr.envelope(wf.codes, 0, wf.points, n_dec)
+        t_dec = _ref_time(ref_wf, dec_starts * ratio)
+        v_dec = [wf.to_volts(dmin), wf.to_volts(dmax)]
+
+    return {
+        "channel": wf.channel,
+        "t_env": _ref_time(ref_wf, starts * ratio),
+        "v_min": wf.to_volts(mins),
+        "v_max": wf.to_volts(maxs),
+        "t_dec": t_dec,
+        "v_dec": v_dec,
+        "out_png": out_png,
+    }
 
-def _read_multichannel_csv(path: Path):
-    """Parse an aligned / decimated CSV into (channel_names, times, {ch: [v]})."""
-    with open(path, newline="") as f:
-        reader = csv.reader(f)
-        header = next(reader)
-        if len(header) < 3 or header[0] != "rowid" or header[1] != "time_s":
-            raise ValueError(f"Unexpected header in {path}: {header}")
-        ch_names = header[2:]
-        times: list[float] = []
-        cols: dict[str, list[float]] = {c: [] for c in ch_names}
-        for row in reader:
-            if len(row) < 2 + len(ch_names):
-                continue
-            times.append(float(row[1]))
-            for i, c in enumerate(ch_names):
-                cols[c].append(float(row[2 + i]))
-    return ch_names, times, cols
-
-
-def _plot_aligned_vs_decimated(out_dir: Path, prefix: str,
-                               channels: list[str]) -> None:
-    """Per-channel PNG: aligned trace with decimated dots overlaid."""
-    aligned_path  = out_dir / f"{prefix}_aligned.csv"
-    decimated_path = out_dir / f"{prefix}_decimated.csv"
-    _, t_a, v_a = _read_multichannel_csv(aligned_path)
-    _, t_d, v_d = _read_multichannel_csv(decimated_path)
 
+def _render_channel_plot(p: dict) -> Path:
+    """Render one verification PNG (runs in a worker process)."""
+    fig, ax = plt.subplots(figsize=_PLOT_SIZE)
+    ax.fill_between(p["t_env"], p["v_min"], p["v_max"], color="C0",
+                    alpha=0.35, lw=0, label="envelope (min/max per pixel)")
+    ax.plot(p["t_env"], p["v_min"], color="C0", lw=0.6, alpha=0.85)
+    ax.plot(p["t_env"], p["v_max"], color="C0", lw=0.6, alpha=0.85)
+    for j, v in enumerate(p["v_dec"]):
+        ax.plot(p["t_dec"], v, color="C1", ls="none", marker=".",
+                markersize=3, label="decimated" if j == 0 else None)
+    ax.set_xlabel("time (s)")
+    ax.set_ylabel("voltage (V)")
+    ax.set_title(f"{p['channel']}: full-record envelope vs decimated")
+    ax.legend(loc="best", fontsize=9)
+    ax.grid(True, alpha=0.35)
+    fig.tight_layout()
+    fig.savefig(p["out_png"], dpi=_PLOT_DPI)
+    plt.close(fig)
+    return p["out_png"]
+
+
+def _plot_aligned_vs_decimated(capture: Capture, out_dir: Path, prefix: str,
+                               channels: list[str], mode: str = "sample",
+                               workers: int | None = None) -> None:
+    """Per-channel PNG: full-record min/max envelope with decimated dots."""
+    with _phase("plots", channels=len(channels)):
+        _plot_channels(capture, out_dir, prefix, channels, mode, workers)
+
+
+def _plot_channels(capture, out_dir, prefix, channels, mode, workers):
+    payloads = []
     for ch in channels:
-        if ch not in v_a or ch not in v_d:
-            print(f"plot: skip {ch} (column missing in CSV)")
+        if ch not in capture.channels:
+            print(f"plot: skip {ch} (not in capture)")
             continue
-        fig, ax = plt.subplots(figsize=(11, 4))
-        ax.plot(t_a, v_a[ch], color="C0", lw=0.6, alpha=0.85,
-                label="aligned")
-        ax.plot(t_d, v_d[ch], color="C1", ls="none", marker=".",
-                markersize=3, label="decimated")
-        ax.set_xlabel("time (s)")
-        ax.set_ylabel("voltage (V)")
-        ax.set_title(f"{ch}: aligned vs decimated")
-        ax.legend(loc="best", fontsize=9)
-        ax.grid(True, alpha=0.35)
-        fig.tight_layout()
-        out_png = out_dir / f"{prefix}_{ch}_check.png"
-        fig.savefig(out_png, dpi=150)
-        plt.close(fig)
-        print(f"Saved {out_png}")
+        k = capture.channels.index(ch)
+        payloads.append(_plot_payload(
+            capture, k, out_dir / f"{prefix}_{ch}_check.png", mode))
+
+    if workers == 1 or len(payloads) <= 1:
+        saved = map(_render_channel_plot, payloads)
+        for out_png in saved:
+            print(f"Saved {out_png}")
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for out_png in pool.map(_render_channel_plot, payloads):
+            print(f"Saved {out_png}")
 
 
 # ── Screenshot ────────────────────────────────────────────────────────
@@ -321,16 +1200,162 @@ def _plot_aligned_vs_decimated(out_dir: Path, prefix: str,
 def _save_screenshot(scope, out_dir: Path, prefix: str):
     """Download a PNG screenshot of the oscilloscope display via SCPI."""
     print("Capturing screenshot...")
-    png = scope.query_binary_values(
-        ":DISP:DATA? PNG", datatype="B", container=bytes,
-    )
-    _check_scpi_errors(scope, "DISP:DATA? PNG")
-    path = out_dir / f"{prefix}screenshot.png"
-    with open(path, "wb") as f:
-        f.write(png)
+    with _phase("screenshot"):
+        png = scope.query_binary_values(
+            ":DISP:DATA? PNG", datatype="B", container=bytes,
+        )
+        _check_scpi_errors(scope, "DISP:DATA? PNG")
+        path = out_dir / f"{prefix}screenshot.png"
+        with open(path, "wb") as f:
+            f.write(png)
     print(f"Saved {path}  ({len(png)} bytes)")
 
 
+# ── Pipelined acquisition ───────────────────────────────────────────
+#
+# A transfer thread owns the SCPI session and pushes every chunk, then
+# every completed channel, onto a bounded queue.  The main thread drains
+# it: chunks are appended to the channel's archive code file as they
+# arrive, and completed channels get their envelope pyramid and
+# per-channel CSV on a small thread pool while the next channel is still
+# on the wire.
+#
+# The queue bounds how many chunks the writer may lag behind, not memory:
+# each chunk is a view into its channel's preallocated record, which the
+# capture keeps in full for the exports anyway, so peak memory is the
+# whole capture with or without the pipeline.
+#
+# Per-channel CSVs need the reference (longest) channel's preamble.  The
+# first channel that reports the full memory depth is necessarily the
+# longest one, so exports start as soon as it is seen; if the final
+# reference turns out different, the affected CSVs are rewritten.
+
+def _build_pyramid(wf: Waveform) -> Pyramid:
+    with _phase("pyramid", channel=wf.channel):
+        return Pyramid.build(wf.codes, LOD_FACTOR, OUTPUT_POINTS)
+
+
+def _acquire_pipelined(scope, channels: list[str], memory_depth: int,
+                       out_dir: Path, prefix: str, idn: str,
+                       after_transfer=None, tuner=None,
+                       checkpoint: _Checkpoint | None = None) -> Capture:
+    """
+    Download *channels* while concurrently persisting finished data.
+
+    Chunks are queued as views into the channel arrays; PIPELINE_QUEUE
+    limits their count (how far the writer may fall behind), not the
+    memory held, which is the full capture either way.
+    """
+    events: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE)
+    abort = threading.Event()
+
+    def on_chunk(*args):
+        if abort.is_set():
+            raise RuntimeError("pipeline aborted by writer")
+        events.put(("chunk",) + args)
+
+    def transfer():
+        try:
+            for ch in channels:
+                wf = _read_channel_raw(scope, ch, memory_depth, CHUNK_POINTS,
+                                       on_chunk=on_chunk, tuner=tuner,
+                                       checkpoint=checkpoint)
+                events.put(("channel", wf))
+            t_done = time.perf_counter()
+            if after_transfer is not None:
+                after_transfer()
+            events.put(("done", t_done))
+        except BaseException as e:  # re-raised in the main thread
+            events.put(("error", e))
+
+    t0 = time.perf_counter()
+    # Helper threads are named after the caller so fleet.py can attribute
+    # their output to the right scope.
+    owner = threading.current_thread().name
+    thread = threading.Thread(target=contextvars.copy_context().run,
+                              args=(transfer,), name=f"{owner}/scpi-transfer",
+                              daemon=True)
+    thread.start()
+
+    spills = {}
+    waveforms: list[Waveform] = []
+    exported: dict[str, Waveform] = {}   # channel -> ref used for its CSV
+    ref_wf = None
+    pool = ThreadPoolExecutor(PIPELINE_WORKERS,
+                              thread_name_prefix=f"{owner}/export")
+    pyr_jobs, csv_jobs = [], []
+    try:
+        while True:
+            kind, *ev = events.get()
+            if kind == "chunk":
+                ch, codes, lo, hi = ev
+                if checkpoint is not None:
+                    checkpoint.write(ch, codes, lo, hi)
+                    continue
+                f = spills.get(ch)
+                if f is None and SAVE_ARCHIVE:
+                    f = spills[ch] = open(
+                        code_path(out_dir, prefix, ch, codes.dtype), "wb")
+                if f is not None:
+                    f.write(codes[lo:hi].astype(
+                        codes.dtype.newbyteorder("<"), copy=False).data)
+            elif kind == "channel":
+                wf = ev[0]
+                if checkpoint is not None:
+                    checkpoint.close(wf.channel)
+                if wf.channel in spills:
+                    spills.pop(wf.channel).close()
+                waveforms.append(wf)
+                pyr_jobs.append(_submit(pool, _build_pyramid, wf))
+                if ref_wf is None and 0 < memory_depth <= wf.points:
+                    ref_wf = wf
+                if ref_wf is not None:
+                    for w in waveforms:
+                        if w.channel not in exported:
+                            exported[w.channel] = ref_wf
+                            csv_jobs.append(_submit(
+                                pool, _save_single_channel_csv, w, ref_wf,
+                                prefix, out_dir, CSV_PRECISION))
+            elif kind == "error":
+                raise ev[0]
+            else:
+                t_transfer = ev[0] - t0
+                break
+
+        capture = Capture(waveforms, idn=idn, memory_depth=memory_depth)
+        for job in csv_jobs:
+            job.result()
+        for w in waveforms:
+            if exported.get(w.channel) is not capture.ref:
+                if w.channel in exported:
+                    print(f"{w.channel}: reference changed, rewriting CSV")
+                csv_jobs.append(_submit(
+                    pool, _save_single_channel_csv, w, capture.ref, prefix,
+                    out_dir, CSV_PRECISION))
+        for job in csv_jobs:
+            job.result()
+        for wf, job in zip(waveforms, pyr_jobs):
+            capture.pyramids[wf.channel] = job.result()
+    except BaseException:
+        abort.set()
+        while thread.is_alive():     # unblock the producer so it can exit
+            try:
+                events.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise
+    finally:
+        for f in spills.values():
+            f.close()
+        pool.shutdown(wait=True)
+
+    thread.join()
+    wall = time.perf_counter() - t0
+    print(f"Pipeline: transfer {t_transfer:.2f} s, "
+          f"transfer + exports {wall:.2f} s")
+    return capture
+
+
 # ── Validation ───────────────────────────────────────────────────────
 
 def _validate_channels(channels):
@@ -342,50 +1367,245 @@ def _validate_channels(channels):
 
 # ── Main ─────────────────────────────────────────────────────────────
 
-def main():
-    _validate_channels(CHANNELS)
+def _check_resumable(scope, checkpoint: _Checkpoint, idn: str,
+                     memory_depth: int):
+    """Refuse to resume unless the scope is still stopped on the same setup."""
+    meta = checkpoint.meta
+    problems = []
+    if idn != meta["idn"]:
+        problems.append(f"*IDN? is {idn!r}, journal has {meta['idn']!r}")
+    if memory_depth != meta["memory_depth"]:
+        problems.append(f"memory depth is {memory_depth}, journal has "
+                        f"{meta['memory_depth']}")
+    if WAV_FORMAT != meta["format"]:
+        problems.append(f"WAV_FORMAT is {WAV_FORMAT}, journal has "
+                        f"{meta['format']}")
+    status = scope.query(":TRIG:STAT?").strip().upper()
+    if status != "STOP":
+        problems.append(f"trigger status is {status}, not STOP")
+    if problems:
+        raise RuntimeError(f"Cannot resume {checkpoint.path}: "
+                           + "; ".join(problems))
+
+
+def _acquire_capture(scope, channels: list[str], out_dir: Path, prefix: str,
+                     idn: str, stop: bool = True,
+                     resume: _Checkpoint | None = None,
+                     address: str | None = None,
+                     ensemble_sub: str = "") -> Capture:
+    """
+    Stop the scope (unless already done by the caller), download
+    *channels* and write the archive, per-channel CSVs and screenshot.
 
-    rm, scope = _open_scope(IP)
+    With *resume*, the scope is not stopped again: the journal's setup is
+    checked against the scope and only the ranges it lacks are fetched.
+    *address* (default ``IP``) and *ensemble_sub* are recorded in the
+    journal for ``--resume``.
+    """
+    if stop and resume is None:
+        scope.write(":STOP")
+        _check_scpi_errors(scope, "STOP")
+
+    memory_depth = _acquire_memory_depth(scope)
+    _check_scpi_errors(scope, "ACQ:MDEP")
+    print(f"Memory depth (points): {memory_depth}")
+
+    if resume is not None:
+        _check_resumable(scope, resume, idn, memory_depth)
+        checkpoint = resume
+    elif SAVE_ARCHIVE and CHECKPOINT:
+        checkpoint = _Checkpoint.create(out_dir, prefix, idn, memory_depth,
+                                        channels, address or IP, ensemble_sub)
+    else:
+        checkpoint = None
+
+    itemsize = _WAV_DTYPES[WAV_FORMAT].itemsize
+    tuner = (_ChunkTuner(f"{idn}|{TRANSPORT}|{WAV_FORMAT}", itemsize=itemsize)
+             if CHUNK_TUNE else None)
+    try:
+        if PIPELINE:
+            capture = _acquire_pipelined(
+                scope, channels, memory_depth, out_dir, prefix, idn,
+                after_transfer=lambda: _save_screenshot(scope, out_dir, prefix),
+                tuner=tuner, checkpoint=checkpoint)
+        else:
+            waveforms = []
+            for ch in channels:
+                wf = _read_channel_raw(
+                    scope, ch, memory_depth, CHUNK_POINTS, tuner=tuner,
+                    on_chunk=checkpoint.write if checkpoint else None,
+                    checkpoint=checkpoint)
+                if checkpoint is not None:
+                    checkpoint.close(ch)
+                waveforms.append(wf)
+            capture = Capture(waveforms, idn=idn, memory_depth=memory_depth)
+    except BaseException:
+        if checkpoint is not None:
+            checkpoint.close()
+            print(f"Download interrupted; progress is in {checkpoint.path}. "
+                  f"Resume with: python {Path(__file__).name} --resume "
+                  f"{out_dir}")
+        raise
+
+    if SAVE_ARCHIVE or checkpoint is not None:
+        with _phase("archive"):
+            meta_path = save_archive(capture, out_dir, prefix,
+                                     LOD_FACTOR, OUTPUT_POINTS,
+                                     write_codes=not PIPELINE
+                                     and checkpoint is None,
+                                     codec=ARCHIVE_CODEC, level=ARCHIVE_LEVEL,
+                                     workers=ARCHIVE_WORKERS)
+        if checkpoint is not None:
+            checkpoint.finish()
+        print(f"Saved {meta_path}  (binary archive, "
+              f"{sum(wf.nbytes for wf in capture):,} code bytes)")
+        if ARCHIVE_CODEC:
+            print(f"  {compression_summary(meta_path)}")
+
+    ref_wf = capture.ref
+    for wf in capture:
+        t0 = _ref_time(ref_wf, 0)
+        t1 = _ref_time(ref_wf, ref_wf.points - 1)
+        ratio = ref_wf.points / wf.points
+        print(f"  {wf.channel}: {wf.points:,} pts "
+              f"(ratio {ratio:.0f}x), "
+              f"time [{t0:.6e} .. {t1:.6e}]")
+
+    if isinstance(scope, _ScpiLink) and scope.bulk_time:
+        print(_format_cost(capture, scope.bulk_bytes, scope.bulk_time))
+
+    if not PIPELINE:
+        for wf in capture:
+            _save_single_channel_csv(wf, ref_wf, prefix, out_dir,
+                                     CSV_PRECISION)
+        _save_screenshot(scope, out_dir, prefix)
+    return capture
+
+
+def _format_cost(capture: Capture, nbytes: int, seconds: float) -> str:
+    """
+    One-line transfer / disk cost of the chosen WAV_FORMAT, with the
+    other format's cost extrapolated at the same link rate.
+    """
+    disk = sum(wf.nbytes for wf in capture) + sum(
+        lv.nbytes for pyr in capture.pyramids.values() for lv in pyr.levels)
+    other = "BYTE" if WAV_FORMAT == "WORD" else "WORD"
+    scale = _WAV_DTYPES[other].itemsize / _WAV_DTYPES[WAV_FORMAT].itemsize
+    return (f"{WAV_FORMAT}: {nbytes / 1e6:.1f} MB of codes in {seconds:.2f} s "
+            f"({nbytes / seconds / 1e6:.2f} MB/s), {disk / 1e6:.1f} MB archive; "
+            f"{other} would be ~{nbytes * scale / 1e6:.1f} MB in "
+            f"~{seconds * scale:.2f} s, ~{disk * scale / 1e6:.1f} MB archive")
+
+
+def _save_metrics(metrics: _Metrics, scope, out_dir: Path, prefix: str,
+                  idn: str) -> Path:
+    path = metrics.write(out_dir / f"{prefix}_metrics.json", scope, idn=idn,
+                         transport=TRANSPORT, format=WAV_FORMAT,
+                         pipeline=PIPELINE, chunk_points=CHUNK_POINTS)
+    print(f"Saved {path}")
+    return path
+
+
+def _fold_into_ensemble(capture: Capture, sub: str = ""):
+    """
+    Add *capture* to the running statistics under ENSEMBLE_DIR (in
+    subdirectory *sub*, e.g. one per scope).  The first capture defines
+    the ensemble's channels.  A capture that does not fit is reported
+    and skipped, so the download itself still succeeds.
+    """
+    root = Path(ENSEMBLE_DIR) / sub
     try:
+        with _phase("ensemble"):
+            ens = Ensemble(root, align=ENSEMBLE_ALIGN)
+            added = ens.add(capture)
+    except (ValueError, RuntimeError) as e:
+        print(f"Ensemble {root}: capture not added: {e}")
+        return
+    print(format_added(ens, added))
+
+
+def _export_capture(capture: Capture, out_dir: Path, prefix: str,
+                    plots: bool = True, ensemble_sub: str = ""):
+    """
+    Write the aligned / decimated CSVs, the analysis report (ANALYZE),
+    the edge indexes (EVENT_INDEX, into the archive), the ensemble update
+    (ENSEMBLE_DIR, subdirectory *ensemble_sub*) and (optionally) check
+    plots.
+    """
+    _save_aligned_csv(capture, prefix, out_dir, CSV_PRECISION)
+    _save_decimated_csv(capture, prefix, out_dir, CSV_PRECISION, DECIMATION)
+    if ANALYZE:
+        with _phase("analysis"):
+            an = analyze_capture(capture, ANALYSIS_FUNDAMENTAL_HZ,
+                                 ANALYSIS_MAX_HARMONIC)
+            path = write_report(an, out_dir / f"{prefix}_analysis.log")
+        print(f"Saved {path}  ({len(an.channels)} channels, "
+              f"{len(an.pairs)} pairs)")
+    if EVENT_INDEX:
+        with _phase("events"):
+            indexes = index_capture(capture, threshold=EVENT_THRESHOLD,
+                                    hysteresis=EVENT_HYSTERESIS)
+            if capture.path:
+                save_events(capture.path, indexes)
+        for idx in indexes.values():
+            print(f"  {format_stats(idx)}")
+        if not capture.path:
+            print("  (edge indexes not saved: they are stored in the archive, "
+                  "and SAVE_ARCHIVE is off)")
+    if ENSEMBLE_DIR:
+        _fold_into_ensemble(capture, ensemble_sub)
+    if plots:
+        _plot_aligned_vs_decimated(capture, out_dir, prefix,
+                                   capture.channels, DECIMATION, PLOT_WORKERS)
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--resume", type=Path, metavar="DIR", default=None,
+                    help="finish the interrupted download journalled in DIR")
+    a = ap.parse_args(argv)
+
+    if a.resume is not None:
+        resume = _Checkpoint.load(a.resume)
+        out_dir, prefix = a.resume, resume.prefix
+        channels = resume.meta["channels"]
+        # Journals from before the address was recorded fall back to IP.
+        address = resume.meta.get("address", IP)
+        transport = resume.meta.get("transport", TRANSPORT)
+        ensemble_sub = resume.meta.get("ensemble_sub", "")
+        print(f"Resuming {out_dir} from {address} ({transport})")
+    else:
+        resume = None
         out_dir = Path(
             f"{OUT_DIR_PREFIX}{datetime.now().strftime('%Y-%m-%d_%H%M%S')}"
         )
+        prefix, channels = OUT_PREFIX, CHANNELS
+        address, transport, ensemble_sub = IP, TRANSPORT, ""
+    _validate_channels(channels)
+
+    metrics = _Metrics()
+    _METRICS.set(metrics)
+    rm, visa = _open_scope(address, transport)
+    scope = _ScpiLink(visa, strict=STRICT_SCPI)
+    try:
         out_dir.mkdir(parents=True, exist_ok=True)
         print(f"Output directory: {out_dir.resolve()}")
-        print(scope.query("*IDN?").strip())
-
-        _check_scpi_errors(scope, "startup", quiet=True)
-
-        scope.write(":STOP")
-        _check_scpi_errors(scope, "STOP")
-
-        memory_depth = _acquire_memory_depth(scope)
-        _check_scpi_errors(scope, "ACQ:MDEP")
-        print(f"Memory depth (points): {memory_depth}")
-
-        waveforms = []
-        for ch in CHANNELS:
-            wf = _read_channel_raw(scope, ch, memory_depth, CHUNK_POINTS)
-            waveforms.append(wf)
-
-        ref_wf = max(waveforms, key=lambda w: w["points"])
-        for wf in waveforms:
-            t0 = _ref_time(ref_wf, 0)
-            t1 = _ref_time(ref_wf, ref_wf["points"] - 1)
-            ratio = ref_wf["points"] / wf["points"]
-            print(f"  {wf['channel']}: {wf['points']:,} pts "
-                  f"(ratio {ratio:.0f}x), "
-                  f"time [{t0:.6e} .. {t1:.6e}]")
-
-        for wf in waveforms:
-            _save_single_channel_csv(wf, ref_wf, OUT_PREFIX, out_dir)
-        _save_aligned_csv(waveforms, ref_wf, OUT_PREFIX, out_dir)
-        _save_decimated_csv(waveforms, ref_wf, OUT_PREFIX, out_dir)
-        _plot_aligned_vs_decimated(out_dir, OUT_PREFIX, CHANNELS)
-        _save_screenshot(scope, out_dir, OUT_PREFIX)
+        with _phase("startup"):
+            idn = scope.query("*IDN?").strip()
+            print(idn)
+            _check_scpi_errors(scope, "startup", quiet=True)
+
+        capture = _acquire_capture(scope, channels, out_dir, prefix, idn,
+                                   resume=resume, address=address,
+                                   ensemble_sub=ensemble_sub)
+        _export_capture(capture, out_dir, prefix, ensemble_sub=ensemble_sub)
+        print(scope.report())
+        if SAVE_METRICS:
+            _save_metrics(metrics, scope, out_dir, prefix, idn)
     finally:
         scope.close()
-        rm.close()
+        if rm is not None:
+            rm.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Ensemble statistics over repeated captures.
+
+An ensemble directory holds per-sample running accumulators for each
+channel, in volts: count, mean and M2 (Welford's sum of squared
+deviations) plus the min / max envelope.  They are plain headerless
+memory-mapped arrays, so folding in capture number N touches one block
+at a time and never needs the earlier captures (or a whole 50 Mpt
+record) in memory:
+
+    ensemble.json          grid per channel (points, xinc, t0), captures
+                           folded in and the lag each was shifted by
+    CHAN1.count.u4         samples accumulated at each grid point
+    CHAN1.mean.f8          running mean
+    CHAN1.m2.f8            running sum of squared deviations
+    CHAN1.min.f4           envelope
+    CHAN1.max.f4
+    CHAN1_summary.csv      decimated mean / σ / envelope, rewritten on
+                           every add
+
+The first capture defines each channel's time grid; later ones are
+placed on it by their preamble time offset and, with *align*, shifted by
+the lag that best matches the current ensemble mean on that channel
+(FFT cross-correlation over a window around the trigger).  Captures
+whose sample interval differs are refused.
+
+Usage:
+    python ensemble.py <ensemble_dir> <capture_dir> [<capture_dir> ...]
+                       [--align CHAN1] [--max-lag N]
+    python ensemble.py <ensemble_dir> --watch <root> [--poll S]
+    python ensemble.py <ensemble_dir> --trace CHAN1 T0 T1 > trace.csv
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from capture_archive import META_SUFFIX, find_archive, load_archive
+from scope_analyzer import estimate_lag
+from waveform import Capture
+
+ENSEMBLE_VERSION = 1
+META_NAME = "ensemble.json"
+SUMMARY_SUFFIX = "_summary.csv"
+BLOCK_POINTS = 1 << 22      # grid samples updated per vectorised block
+SUMMARY_POINTS = 10_000     # target row count of the summary CSVs
+ALIGN_WINDOW = 1 << 16      # samples around the trigger used for the lag
+ALIGN_MAX_LAG = 1000        # largest shift searched, in samples
+
+# accumulator -> dtype; min / max only need the precision of the codes
+_ARRAYS = {"count": "<u4", "mean": "<f8", "m2": "<f8",
+           "min": "<f4", "max": "<f4"}
+
+
+class Summary(NamedTuple):
+    """Per-bucket ensemble statistics of one channel (``SUMMARY_POINTS`` rows)."""
+    times: np.ndarray       # bucket start time
+    count: np.ndarray       # fewest captures at any sample in the bucket
+    mean: np.ndarray        # average of the per-sample means
+    std: np.ndarray         # largest per-sample σ (NaN below two captures)
+    vmin: np.ndarray
+    vmax: np.ndarray
+
+
+class Trace(NamedTuple):
+    """Full-resolution ensemble statistics over a grid range."""
+    times: np.ndarray
+    count: np.ndarray
+    mean: np.ndarray        # NaN where nothing was accumulated
+    std: np.ndarray         # sample σ (ddof 1), NaN below two captures
+    vmin: np.ndarray
+    vmax: np.ndarray
+
+
+class Added(NamedTuple):
+    source: str
+    lag_samples: int        # shift applied on the align channel
+    lag_s: float
+    score: float | None     # normalised correlation at that lag
+    seconds: float
+
+
+# ── Lag estimation ───────────────────────────────────────────────────
+
+def _estimate_lag(ref: np.ndarray, x: np.ndarray,
+                  max_lag: int) -> tuple[int, float]:
+    """
+    Lag *L* with ``x[i + L] ~ ref[i]`` from the detrended windows (see
+    ``scope_analyzer.estimate_lag``); returns ``(L, score)``.
+    """
+    n = min(len(ref), len(x))
+    lag, score, _ = estimate_lag(ref[:n] - ref[:n].mean(),
+                                 x[:n] - x[:n].mean(), max_lag)
+    return lag, score
+
+
+# ── Ensemble ─────────────────────────────────────────────────────────
+
+class Ensemble:
+    """
+    Running per-sample statistics of repeated captures under *root*.
+
+    An existing root is resumed (its grid, alignment channel and capture
+    list carry on; *align* and *channels* are then ignored).  ``add()``
+    folds in one capture and rewrites the summary CSVs; ``trace()`` and
+    ``summary()`` read the accumulators back.  If a previous ``add()``
+    was interrupted the accumulators are inconsistent and opening the
+    root raises ``RuntimeError``.
+    """
+
+    def __init__(self, root: Path, align: str | None = None,
+                 channels: list[str] | None = None,
+                 max_lag: int = ALIGN_MAX_LAG):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / META_NAME
+        if path.exists():
+            meta = json.loads(path.read_text())
+            if meta.get("version") != ENSEMBLE_VERSION:
+                raise ValueError(f"{path}: unsupported ensemble version "
+                                 f"{meta.get('version')}")
+            if meta.get("pending"):
+                raise RuntimeError(
+                    f"{self.root}: interrupted while adding {meta['pending']}; "
+                    f"the accumulators are inconsistent, start a new ensemble")
+        else:
+            meta = {"version": ENSEMBLE_VERSION,
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "align": align, "max_lag": max_lag,
+                    "channels": list(channels) if channels else None,
+                    "grid": {}, "captures": [], "pending": None}
+        self.meta = meta
+        self._arrays: dict[str, dict[str, np.memmap]] = {}
+
+    def __len__(self) -> int:
+        return len(self.meta["captures"])
+
+    def __repr__(self) -> str:
+        return (f"Ensemble({str(self.root)!r}, {len(self)} captures, "
+                f"channels={self.channels})")
+
+    @property
+    def channels(self) -> list[str]:
+        return list(self.meta["grid"])
+
+    @property
+    def align(self) -> str | None:
+        return self.meta["align"]
+
+    @property
+    def sources(self) -> list[str]:
+        return [c["source"] for c in self.meta["captures"]]
+
+    def _write_meta(self):
+        tmp = self.root / (META_NAME + ".tmp")
+        tmp.write_text(json.dumps(self.meta, indent=2))
+        os.replace(tmp, self.root / META_NAME)
+
+    def _acc(self, channel: str) -> dict[str, np.memmap]:
+        acc = self._arrays.get(channel)
+        if acc is None:
+            n = self.meta["grid"][channel]["points"]
+            acc = {}
+            for name, dtype in _ARRAYS.items():
+                path = self.root / f"{channel}.{name}.{dtype[1:]}"
+                acc[name] = np.memmap(path, dtype=dtype,
+                                      mode="r+" if path.exists() else "w+",
+                                      shape=(n,))
+            self._arrays[channel] = acc
+        return acc
+
+    # ── Grid ────────────────────────────────────────────────────────
+
+    def _init_grid(self, capture: Capture):
+        wanted = self.meta["channels"] or capture.channels
+        channels = [ch for ch in wanted if ch in capture.channels]
+        if not channels:
+            raise ValueError(f"capture has none of {', '.join(wanted)}")
+        for ch in channels:
+            wf = capture[ch]
+            if not wf.points:
+                raise ValueError(f"{ch}: empty record cannot define the grid")
+            self.meta["grid"][ch] = {"points": wf.points, "xinc": wf.xinc,
+                                     "t0": float(wf.time_at(0))}
+        if self.align is not None and self.align not in self.meta["grid"]:
+            raise ValueError(f"align channel {self.align} is not in the "
+                             f"ensemble ({', '.join(self.channels)})")
+
+    def _offset(self, capture: Capture, channel: str) -> int:
+        """Grid index of sample 0 of *channel* from the preamble alone."""
+        grid = self.meta["grid"][channel]
+        wf = capture[channel]
+        if not math.isclose(wf.xinc, grid["xinc"], rel_tol=1e-9):
+            raise ValueError(f"{channel}: sample interval {wf.xinc:g} s does "
+                             f"not match the ensemble's {grid['xinc']:g} s")
+        return round((float(wf.time_at(0)) - grid["t0"]) / grid["xinc"])
+
+    def _lag(self, capture: Capture) -> tuple[int, float | None]:
+        """Shift of the new capture against the ensemble mean, align channel."""
+        ch = self.align
+        if ch is None or not len(self):
+            return 0, None
+        grid = self.meta["grid"][ch]
+        wf = capture[ch]
+        off = self._offset(capture, ch)
+        half = ALIGN_WINDOW // 2
+        centre = round(-grid["t0"] / grid["xinc"])      # the trigger, t = 0
+        g0 = min(max(centre - half, 0), max(grid["points"] - ALIGN_WINDOW, 0))
+        g0 = min(max(g0, off), off + wf.points)         # keep inside the capture
+        g1 = min(g0 + ALIGN_WINDOW, grid["points"], off + wf.points)
+        if g1 - g0 < 8:
+            return 0, None
+        ref = self._acc(ch)["mean"][g0:g1]
+        lag, score = _estimate_lag(np.asarray(ref),
+                                   wf.voltages(g0 - off, g1 - off),
+                                   self.meta["max_lag"])
+        return lag, score
+
+    # ── Accumulation ────────────────────────────────────────────────
+
+    def add(self, capture: Capture, source: str | None = None) -> Added:
+        """
+        Fold *capture* into the accumulators and rewrite the summaries.
+
+        Ensemble channels the capture lacks are left as they are (their
+        per-sample counts show it); a capture with none of them, or
+        without the align channel, raises ``ValueError``.
+        """
+        t0 = time.perf_counter()
+        if source is None:
+            source = (str(capture.path) if capture.path
+                      else datetime.now().isoformat(timespec="milliseconds"))
+        if not self.meta["grid"]:
+            self._init_grid(capture)
+        channels = [ch for ch in self.channels if ch in capture.channels]
+        if not channels:
+            raise ValueError(f"capture has none of the ensemble's channels "
+                             f"({', '.join(self.channels)})")
+        if self.align is not None and self.align not in capture.channels:
+            raise ValueError(f"capture has no align channel {self.align}")
+        offsets = {ch: self._offset(capture, ch) for ch in channels}
+        lag, score = self._lag(capture)
+        lag_s = lag * self.meta["grid"][self.align]["xinc"] if lag else 0.0
+
+        self.meta["pending"] = source
+        self._write_meta()
+        summaries = {}
+        for ch in channels:
+            grid = self.meta["grid"][ch]
+            shift = offsets[ch] - round(lag_s / grid["xinc"])
+            summaries[ch] = self._fold(ch, capture[ch], shift)
+            for a in self._acc(ch).values():
+                a.flush()
+        self.meta["captures"].append({
+            "source": source,
+            "added": datetime.now().isoformat(timespec="milliseconds"),
+            "idn": capture.idn, "lag_samples": lag, "lag_s": lag_s,
+            "score": score,
+            "points": {ch: capture[ch].points for ch in channels},
+        })
+        self.meta["pending"] = None
+        self._write_meta()
+        for ch, s in summaries.items():
+            self._write_summary(ch, s)
+        return Added(source, lag, lag_s, score, time.perf_counter() - t0)
+
+    def _bucket(self, channel: str) -> int:
+        return max(1, math.ceil(self.meta["grid"][channel]["points"]
+                                / SUMMARY_POINTS))
+
+    def _fold(self, channel: str, wf, shift: int) -> Summary:
+        """
+        Welford update of every grid sample ``g`` covered by
+        ``wf[g - shift]``, block by block, summarising each block as it
+        goes (blocks are whole summary buckets).
+        """
+        acc = self._acc(channel)
+        n = len(acc["count"])
+        k = self._bucket(channel)
+        step = max(k, BLOCK_POINTS // k * k)
+        lo, hi = max(shift, 0), min(shift + wf.points, n)
+        parts = []
+        for g0 in range(0, n, step):
+            g1 = min(g0 + step, n)
+            a, b = max(g0, lo), min(g1, hi)
+            if a < b:
+                x = wf.voltages(a - shift, b - shift)
+                cnt = acc["count"][a:b]
+                mean = acc["mean"][a:b]
+                first = cnt == 0
+                delta = x - mean
+                mean += delta / (cnt + 1.0)
+                acc["m2"][a:b] += delta * (x - mean)
+                x32 = x.astype(np.float32)
+                for name, op in (("min", np.minimum), ("max", np.maximum)):
+                    env = acc[name][a:b]
+                    if first.any():
+                        env[first] = x32[first]
+                    op(env, x32, out=env)
+                cnt += 1
+            parts.append(self._summarize(channel, g0, g1, k))
+        return Summary(*(np.concatenate(cols) for cols in zip(*parts)))
+
+    # ── Read-back ───────────────────────────────────────────────────
+
+    def trace(self, channel: str, start: int = 0,
+              stop: int | None = None) -> Trace:
+        """Per-sample statistics for grid samples ``[start, stop)``."""
+        acc = self._acc(channel)
+        grid = self.meta["grid"][channel]
+        stop = grid["points"] if stop is None else stop
+        cnt = np.asarray(acc["count"][start:stop])
+        none = cnt == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(acc["m2"][start:stop] / (cnt - 1.0))
+        std[cnt < 2] = np.nan
+
+        def masked(a):
+            out = np.asarray(a[start:stop], dtype=np.float64)
+            out[none] = np.nan
+            return out
+
+        times = grid["t0"] + np.arange(start, stop) * grid["xinc"]
+        return Trace(times, cnt, masked(acc["mean"]), std,
+                     masked(acc["min"]), masked(acc["max"]))
+
+    def trace_between(self, channel: str, t_start: float, t_end: float) -> Trace:
+        """``trace()`` of the grid samples whose times lie in ``[t_start, t_end]``."""
+        grid = self.meta["grid"][channel]
+        eps = 1e-6
+        lo = math.ceil((t_start - grid["t0"]) / grid["xinc"] - eps)
+        hi = math.floor((t_end - grid["t0"]) / grid["xinc"] + eps) + 1
+        lo = min(max(lo, 0), grid["points"])
+        return self.trace(channel, lo, min(max(hi, lo), grid["points"]))
+
+    def _summarize(self, channel: str, g0: int, g1: int, k: int) -> Summary:
+        """Bucket statistics of grid samples ``[g0, g1)``, *g0* a bucket start."""
+        acc = self._acc(channel)
+        grid = self.meta["grid"][channel]
+        starts = np.arange(0, g1 - g0, k)
+        cnt = np.asarray(acc["count"][g0:g1])
+        # unvisited samples hold zeros: they add nothing to the mean sum,
+        # and are masked out of the variance and envelope reductions
+        seen = np.add.reduceat(cnt > 0, starts, dtype=np.int64)
+        var = acc["m2"][g0:g1] / np.maximum(cnt - 1.0, 1.0)
+        var[cnt < 2] = -1.0
+        vmin = np.asarray(acc["min"][g0:g1])
+        vmax = np.asarray(acc["max"][g0:g1])
+        if not cnt.all():
+            vmin = np.where(cnt > 0, vmin, np.inf)
+            vmax = np.where(cnt > 0, vmax, -np.inf)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.add.reduceat(acc["mean"][g0:g1], starts) / seen
+            std = np.sqrt(np.maximum.reduceat(var, starts))
+        vmin = np.minimum.reduceat(vmin, starts).astype(np.float64)
+        vmax = np.maximum.reduceat(vmax, starts).astype(np.float64)
+        vmin[seen == 0] = vmax[seen == 0] = np.nan
+        return Summary(grid["t0"] + (g0 + starts) * grid["xinc"],
+                       np.minimum.reduceat(cnt, starts), mean, std,
+                       vmin, vmax)
+
+    def summary(self, channel: str) -> Summary:
+        """Decimated statistics of the whole channel (one pass over it)."""
+        n = self.meta["grid"][channel]["points"]
+        k = self._bucket(channel)
+        step = max(k, BLOCK_POINTS // k * k)
+        parts = [self._summarize(channel, g0, min(g0 + step, n), k)
+                 for g0 in range(0, n, step)]
+        return Summary(*(np.concatenate(cols) for cols in zip(*parts)))
+
+    def summary_path(self, channel: str) -> Path:
+        return self.root / f"{channel}{SUMMARY_SUFFIX}"
+
+    def _write_summary(self, channel: str, s: Summary):
+        path = self.summary_path(channel)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", newline="") as f:
+            f.write("time_s,count,mean_V,std_V,min_V,max_V\n")
+            np.savetxt(f, np.column_stack([s.times, s.count, s.mean, s.std,
+                                           s.vmin, s.vmax]),
+                       fmt=["%.12g", "%d", "%.9g", "%.6g", "%.6g", "%.6g"],
+                       delimiter=",")
+        os.replace(tmp, path)
+
+
+def format_added(ens: Ensemble, added: Added) -> str:
+    lag = (f", shifted {added.lag_samples:+d} samples "
+           f"({added.lag_s:+.4g} s, r = {added.score:.4f})"
+           if added.score is not None else "")
+    return (f"Ensemble {ens.root}: capture #{len(ens)} folded in "
+            f"in {added.seconds:.2f} s{lag}")
+
+
+def _watch(ens: Ensemble, root: Path, poll: float):
+    """Fold in every archive that appears under *root* until Ctrl-C."""
+    done = {str(Path(s).resolve()) for s in ens.sources}
+    print(f"Watching {root.resolve()} (Ctrl-C to stop)")
+    try:
+        while True:
+            for path in sorted(root.rglob(f"*{META_SUFFIX}")):
+                key = str(path.resolve())
+                if key in done:
+                    continue
+                try:
+                    capture = load_archive(path)
+                except (ValueError, OSError):     # sidecar still being written
+                    continue
+                done.add(key)
+                try:
+                    print(format_added(ens, ens.add(capture, key)))
+                except ValueError as e:
+                    print(f"Skipped {path}: {e}")
+            time.sleep(poll)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("ensemble", type=Path, help="ensemble directory")
+    ap.add_argument("captures", type=Path, nargs="*",
+                    help="capture directories or sidecars to fold in")
+    ap.add_argument("--align", default=None,
+                    help="channel used to estimate each capture's lag")
+    ap.add_argument("--max-lag", type=int, default=ALIGN_MAX_LAG,
+                    help="largest shift searched, in samples")
+    ap.add_argument("--channel", action="append", default=None,
+                    help="channels to accumulate (default: all)")
+    ap.add_argument("--watch", type=Path, default=None,
+                    help="keep folding in archives appearing under this root")
+    ap.add_argument("--poll", type=float, default=2.0)
+    ap.add_argument("--trace", nargs=3, metavar=("CHANNEL", "T0", "T1"),
+                    help="print CHANNEL's statistics between T0 and T1 as CSV")
+    a = ap.parse_args()
+
+    ens = Ensemble(a.ensemble, a.align, a.channel, a.max_lag)
+    for path in a.captures:
+        meta_path = find_archive(path).resolve()
+        print(format_added(ens, ens.add(load_archive(meta_path),
+                                        str(meta_path))))
+    if a.watch is not None:
+        _watch(ens, a.watch, a.poll)
+    if a.trace:
+        ch, t0, t1 = a.trace[0], float(a.trace[1]), float(a.trace[2])
+        if ch not in ens.channels:
+            ap.error(f"{ch} is not in the ensemble "
+                     f"({', '.join(ens.channels) or 'empty'})")
+        t = ens.trace_between(ch, t0, t1)
+        out = sys.stdout
+        out.write("time_s,count,mean_V,std_V,min_V,max_V\n")
+        np.savetxt(out, np.column_stack(t), fmt="%.12g", delimiter=",")
+    elif ens.channels:
+        print(f"{len(ens)} captures; summaries: "
+              + ", ".join(ens.summary_path(ch).name for ch in ens.channels))
+
+
+if __name__ == "__main__":
+    main()
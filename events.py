@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Edge / event index over deep records.
+
+``index_events`` finds every rising and falling crossing of a threshold
+with hysteresis (a Schmitt trigger) in one vectorised pass per block of
+codes, so a memory-mapped or compressed 50 Mpt channel is scanned
+without ever being fully in memory.  An edge is declared when the signal
+leaves the hysteresis band on the far side; its time is interpolated
+linearly at the last crossing of the threshold itself before that, so
+noise inside the band neither adds events nor shifts them.
+
+The result, an ``EventIndex``, is a compact sorted array of fractional
+sample positions and edge directions (9 bytes per event).  Period,
+frequency and duty-cycle statistics, "time of the Nth rising edge" and
+"events between t0 and t1" are answered from it without touching the
+samples again.  ``save_events`` stores it next to an archive as
+``<prefix>_CHAN1.events.npy`` and records it in the sidecar;
+``load_events`` reopens it memory-mapped.
+
+Usage:
+    python events.py <capture_dir> [--channel CHAN1] [--threshold V]
+                     [--hysteresis V]
+"""
+
+import argparse
+import json
+import math
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from capture_archive import META_SUFFIX, find_archive, load_archive
+from waveform import Capture, Waveform
+
+EVENT_DTYPE = np.dtype([("pos", "<f8"), ("rising", "?")])
+BLOCK_POINTS = 1 << 22      # samples scanned per vectorised block
+HYSTERESIS_FRACTION = 0.1   # default band: this fraction of peak-to-peak
+MIN_BAND_LSB = 2            # ... but never narrower than this many codes
+MIN_SWING_LSB = 8           # default levels refuse a smaller peak-to-peak
+
+
+class EdgeStats(NamedTuple):
+    rising: int
+    falling: int
+    period_mean_s: float
+    period_std_s: float
+    period_min_s: float
+    period_max_s: float
+    frequency_hz: float
+    duty_mean: float            # high time / period, over complete cycles
+    high_time_mean_s: float
+
+
+# ── Index ────────────────────────────────────────────────────────────
+
+class EventIndex:
+    """
+    Sorted crossings of one channel.
+
+    ``events`` is an ``EVENT_DTYPE`` array ordered by ``pos``, the
+    fractional sample index of each threshold crossing; edges strictly
+    alternate between rising and falling.  Times come from the channel's
+    preamble on demand.
+    """
+
+    def __init__(self, wf: Waveform, events: np.ndarray, threshold: float,
+                 low: float, high: float):
+        self.wf = wf
+        self.events = events
+        self.threshold = threshold
+        self.low = low
+        self.high = high
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __repr__(self) -> str:
+        return (f"EventIndex({self.wf.channel!r}, {len(self):,} events, "
+                f"threshold={self.threshold:g} V, "
+                f"band=[{self.low:g}, {self.high:g}] V)")
+
+    @property
+    def channel(self) -> str:
+        return self.wf.channel
+
+    @property
+    def times(self) -> np.ndarray:
+        return self.wf.time_at(self.events["pos"])
+
+    def edges(self, edge: str = "rising") -> np.ndarray:
+        """Times of the ``"rising"``, ``"falling"`` or ``"both"`` edges."""
+        ev = self.events
+        if edge == "both":
+            return self.wf.time_at(ev["pos"])
+        if edge not in ("rising", "falling"):
+            raise ValueError(f"edge must be rising, falling or both, not {edge!r}")
+        return self.wf.time_at(ev["pos"][ev["rising"] == (edge == "rising")])
+
+    def nth(self, n: int, edge: str = "rising") -> float:
+        """
+        Time of the *n*-th (0-based, negative from the end) edge.
+
+        Edges alternate, so this is O(1): no search over the index.
+        """
+        ev = self.events
+        if edge == "both":
+            return float(self.wf.time_at(ev["pos"][n]))
+        if not len(ev):
+            raise IndexError("no events")
+        first = 0 if ev["rising"][0] == (edge == "rising") else 1
+        count = (len(ev) - first + 1) // 2
+        if not -count <= n < count:
+            raise IndexError(f"{edge} edge {n} out of range ({count} edges)")
+        return float(self.wf.time_at(ev["pos"][first + 2 * (n % count)]))
+
+    def between(self, t_start: float, t_end: float) -> np.ndarray:
+        """Events with times in ``[t_start, t_end]`` (binary search)."""
+        pos = self.events["pos"]
+        a, b = sorted((self.wf.index_at(t_start), self.wf.index_at(t_end)))
+        return self.events[np.searchsorted(pos, a, "left"):
+                           np.searchsorted(pos, b, "right")]
+
+    def stats(self) -> EdgeStats:
+        """Period (rising to rising), frequency and duty cycle."""
+        ev = self.events
+        rising = ev["rising"]
+        up = self.wf.time_at(ev["pos"][rising])
+        periods = np.diff(up)
+        nan = float("nan")
+        # Complete cycles: a rising edge, its falling edge, the next rising.
+        first = int(np.argmax(rising)) if rising.any() else len(ev)
+        cyc = ev["pos"][first:]
+        k = max((len(cyc) - 1) // 2, 0)
+        high = self.wf.xinc * (cyc[1:2 * k:2] - cyc[0:2 * k:2])
+        per = self.wf.xinc * (cyc[2:2 * k + 1:2] - cyc[0:2 * k:2])
+        mean = float(periods.mean()) if len(periods) else nan
+        return EdgeStats(
+            rising=int(rising.sum()), falling=int(len(ev) - rising.sum()),
+            period_mean_s=mean,
+            period_std_s=float(periods.std()) if len(periods) else nan,
+            period_min_s=float(periods.min()) if len(periods) else nan,
+            period_max_s=float(periods.max()) if len(periods) else nan,
+            frequency_hz=1.0 / mean if len(periods) and mean > 0 else nan,
+            duty_mean=float((high / per).mean()) if k else nan,
+            high_time_mean_s=float(high.mean()) if k else nan,
+        )
+
+
+# ── Scan ─────────────────────────────────────────────────────────────
+
+def _code_level(wf: Waveform, volts: float) -> float:
+    """Fractional code at which *wf* reads *volts* (inverse of ``to_volts``)."""
+    return volts / wf.yinc + wf.yref + wf.yorig
+
+
+def _default_levels(wf: Waveform, pyramid=None) -> tuple[float, float, float]:
+    """
+    Mid-level threshold, HYSTERESIS_FRACTION of peak-to-peak (at least
+    MIN_BAND_LSB codes) and the peak-to-peak itself, in volts.
+
+    Low / high levels are the 1st / 99th percentiles of bucket minima /
+    maxima (the pyramid's top level, else ~4096 buckets computed block by
+    block), so a few glitches do not drag the threshold off the signal.
+    """
+    if pyramid is not None and pyramid.levels:
+        mins, maxs = pyramid.levels[-1]
+    else:
+        bucket = max(1, wf.points // 4096)
+        step = max(bucket, BLOCK_POINTS // bucket * bucket)
+        parts = []
+        for a in range(0, wf.points, step):
+            block = np.asarray(wf.codes[a:a + step])
+            starts = np.arange(0, len(block), bucket)
+            parts.append((np.minimum.reduceat(block, starts),
+                          np.maximum.reduceat(block, starts)))
+        mins = np.concatenate([p[0] for p in parts])
+        maxs = np.concatenate([p[1] for p in parts])
+    lo = wf.to_volts(float(np.percentile(mins, 1)))
+    hi = wf.to_volts(float(np.percentile(maxs, 99)))
+    swing = abs(hi - lo)
+    band = max(HYSTERESIS_FRACTION * swing, MIN_BAND_LSB * abs(wf.yinc))
+    return (lo + hi) / 2, band, swing
+
+
+def index_events(wf: Waveform, threshold: float | None = None,
+                 hysteresis: float | None = None, pyramid=None,
+                 block_points: int = BLOCK_POINTS) -> EventIndex:
+    """
+    Index every threshold crossing of *wf* (volts), with a hysteresis
+    band of total width *hysteresis* centred on the threshold.
+
+    Defaults: the mid-level of the record and HYSTERESIS_FRACTION of its
+    peak-to-peak, but at least MIN_BAND_LSB codes (from *pyramid* when
+    given, else one extra pass).  Below MIN_SWING_LSB codes of
+    peak-to-peak the record is treated as a flat, noisy line: with the
+    default threshold, no band can separate edges from quantisation
+    noise, so a warning is printed and the index is empty.  The scan
+    works on codes block by block; state and the last threshold
+    crossings carry over between blocks, so the result does not depend
+    on *block_points*.
+    """
+    if wf.yinc <= 0:
+        raise ValueError(f"{wf.channel}: non-positive yinc {wf.yinc}")
+    if threshold is None or hysteresis is None:
+        mid, band, swing = _default_levels(wf, pyramid)
+        if threshold is None and swing < MIN_SWING_LSB * wf.yinc:
+            print(f"{wf.channel}: WARNING peak-to-peak is only "
+                  f"{swing / wf.yinc:.1f} LSB; no edges indexed (give a "
+                  f"threshold to index it anyway)")
+            half = band / 2 if hysteresis is None else hysteresis / 2
+            return EventIndex(wf, np.empty(0, dtype=EVENT_DTYPE), mid,
+                              mid - half, mid + half)
+        threshold = mid if threshold is None else threshold
+        hysteresis = band if hysteresis is None else hysteresis
+    level = _code_level(wf, threshold)
+    lo_code = _code_level(wf, threshold - hysteresis / 2)
+    hi_code = _code_level(wf, threshold + hysteresis / 2)
+
+    state = None                    # Schmitt output after the last block
+    last = {True: math.nan, False: math.nan}   # last level crossing per direction
+    out_pos, out_rise = [], []
+    n = wf.points
+    for a in range(0, n, block_points):
+        b = min(a + block_points, n)
+        a0 = max(a - 1, 0)          # one sample overlap for boundary crossings
+        x = np.asarray(wf.codes[a0:b])
+
+        # Every crossing of the level itself, interpolated.
+        above = x >= level
+        c = np.flatnonzero(above[1:] != above[:-1])
+        x0, x1 = x[c].astype(np.float64), x[c + 1].astype(np.float64)
+        cpos = a0 + c + (level - x0) / (x1 - x0)
+        up = above[c + 1]
+        cross = {True: cpos[up], False: cpos[~up]}
+
+        # Schmitt trigger: only samples outside the band decide the state.
+        xs = x[a - a0:]
+        dec = np.flatnonzero((xs >= hi_code) | (xs <= lo_code))
+        st = xs[dec] >= hi_code
+        if state is None:
+            full, at = st, dec
+        else:
+            full, at = np.concatenate(([state], st)), np.concatenate(([-1], dec))
+        j = np.flatnonzero(full[1:] != full[:-1]) + 1
+        k, rise = a + at[j], full[j]
+
+        # Each edge is timed at the last level crossing in its direction.
+        pos = np.empty(len(k))
+        for d in (True, False):
+            m = rise == d
+            if len(cross[d]):
+                i = np.searchsorted(cross[d], k[m], side="right") - 1
+                pos[m] = np.where(i >= 0, cross[d][np.maximum(i, 0)], last[d])
+                last[d] = cross[d][-1]
+            else:
+                pos[m] = last[d]
+        out_pos.append(pos)
+        out_rise.append(rise)
+        if len(st):
+            state = bool(st[-1])
+
+    events = np.empty(sum(len(p) for p in out_pos), dtype=EVENT_DTYPE)
+    if len(events):
+        events["pos"] = np.concatenate(out_pos)
+        events["rising"] = np.concatenate(out_rise)
+    return EventIndex(wf, events, threshold, threshold - hysteresis / 2,
+                      threshold + hysteresis / 2)
+
+
+def index_capture(capture: Capture, channels=None, threshold=None,
+                  hysteresis=None) -> dict[str, EventIndex]:
+    """``index_events`` for each of *channels* (default: all)."""
+    return {ch: index_events(capture[ch], threshold, hysteresis,
+                             capture.pyramids.get(ch))
+            for ch in (channels or capture.channels)}
+
+
+# ── Storage ──────────────────────────────────────────────────────────
+
+def _events_path(meta_path: Path, channel: str) -> Path:
+    prefix = meta_path.name[:-len(META_SUFFIX)]
+    return meta_path.parent / f"{prefix}_{channel}.events.npy"
+
+
+def save_events(path: Path, indexes: dict[str, EventIndex]) -> Path:
+    """Write each index next to the archive at *path*; update its sidecar."""
+    meta_path = find_archive(path)
+    meta = json.loads(meta_path.read_text())
+    for ch, idx in indexes.items():
+        out = _events_path(meta_path, ch)
+        np.save(out, idx.events)
+        meta["waveforms"][ch]["events"] = {
+            "file": out.name, "count": len(idx), "threshold": idx.threshold,
+            "low": idx.low, "high": idx.high,
+        }
+    tmp = meta_path.with_name(meta_path.name + ".tmp")
+    tmp.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp, meta_path)
+    return meta_path
+
+
+def load_events(path: Path, capture: Capture | None = None) -> dict[str, EventIndex]:
+    """Reopen the stored indexes of an archive (events memory-mapped)."""
+    meta_path = find_archive(path)
+    meta = json.loads(meta_path.read_text())
+    capture = capture or load_archive(meta_path)
+    out = {}
+    for ch in meta["channels"]:
+        info = meta["waveforms"][ch].get("events")
+        if info is None:
+            continue
+        events = np.load(meta_path.parent / info["file"], mmap_mode="r")
+        out[ch] = EventIndex(capture[ch], events, info["threshold"],
+                             info["low"], info["high"])
+    return out
+
+
+def format_stats(idx: EventIndex) -> str:
+    s = idx.stats()
+    return (f"{idx.channel}: {s.rising:,} rising / {s.falling:,} falling edges "
+            f"at {idx.threshold:.4g} V (band {idx.high - idx.low:.3g} V); "
+            f"f = {s.frequency_hz:.6g} Hz, period {s.period_mean_s:.6g} s "
+            f"(σ {s.period_std_s:.3g} s), duty {s.duty_mean:.2%}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("path", type=Path, help="capture directory or sidecar")
+    ap.add_argument("--channel", action="append", default=None)
+    ap.add_argument("--threshold", type=float, default=None, help="volts")
+    ap.add_argument("--hysteresis", type=float, default=None,
+                    help="total band width in volts")
+    a = ap.parse_args()
+
+    capture = load_archive(a.path)
+    indexes = index_capture(capture, a.channel, a.threshold, a.hysteresis)
+    meta_path = save_events(capture.path, indexes)
+    for idx in indexes.values():
+        print(format_stats(idx))
+    print(f"Saved event indexes into {meta_path}")
+
+
+if __name__ == "__main__":
+    main()
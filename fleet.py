@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Acquire from several DHO800/DHO900 scopes at once.
+
+Opens a session to every scope in ``SCOPES`` (or a JSON file given on
+the command line), sends ``:STOP`` to all of them from threads released
+by one barrier so the acquisitions freeze as close together as the LAN
+allows, then downloads every scope in parallel with the same code path
+as ``download1.py`` (settings such as PIPELINE, TRANSPORT, CHUNK_TUNE
+and the CSV options are taken from there).  With ``ENSEMBLE_DIR`` set,
+each scope gets its own ensemble in ``ENSEMBLE_DIR/<name>/``.
+
+Output is one directory with a subfolder per scope and a
+``fleet_manifest.json`` recording each scope's address, ``*IDN?``,
+channels, when its ``:STOP`` went out, transfer time, and archive path.
+A scope that fails is recorded in the manifest with its error; the
+others still complete and the script exits non-zero.  A download that
+broke part-way is finished with ``python download1.py --resume
+fleet_.../<name>``: the journal records the scope's address.
+
+Usage:
+    python fleet.py [fleet.json]
+
+where ``fleet.json`` is a list of ``{"name", "address", "channels"}``
+objects (``name`` and ``channels`` optional).
+"""
+
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import download1
+
+# ── User-configurable constants ──────────────────────────────────────
+SCOPES = [
+    {"name": "scope1", "address": "192.168.1.162", "channels": ["CHAN1", "CHAN2"]},
+    {"name": "scope2", "address": "192.168.1.163", "channels": ["CHAN1", "CHAN2"]},
+]
+OUT_DIR_PREFIX = "fleet_"
+MANIFEST_NAME = "fleet_manifest.json"
+PLOTS = True             # render check plots once all downloads are done
+
+
+# ── Per-thread log prefix ────────────────────────────────────────────
+
+class _TaggedStdout:
+    """
+    Prefix every line printed on behalf of a scope with its name.
+
+    A line belongs to scope *name* when it comes from a thread called
+    *name* or from a helper thread whose name starts with ``name/`` (the
+    pipeline names its transfer and export threads after the caller).
+    """
+
+    def __init__(self, stream, names):
+        self._stream = stream
+        self._names = set(names)
+        self._partial: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        thread = threading.current_thread()
+        tag = thread.name.split("/")[0]
+        if tag not in self._names:
+            return self._stream.write(text)
+        with self._lock:
+            buf = self._partial.pop(thread.ident, "") + text
+            *lines, rest = buf.split("\n")
+            if rest:
+                self._partial[thread.ident] = rest
+            self._stream.write("".join(f"[{tag}] {ln}\n" for ln in lines))
+        return len(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+# ── Fleet ────────────────────────────────────────────────────────────
+
+def _load_specs(argv: list[str]) -> list[dict]:
+    specs = json.loads(Path(argv[0]).read_text()) if argv else SCOPES
+    out = []
+    for i, spec in enumerate(specs):
+        spec = {"name": f"scope{i + 1}", "channels": download1.CHANNELS,
+                **spec}
+        download1._validate_channels(spec["channels"])
+        out.append(spec)
+    names = [s["name"] for s in out]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate scope names: {names}")
+    return out
+
+
+def _open(spec: dict):
+    rm, visa = download1._open_scope(spec["address"], download1.TRANSPORT)
+    scope = download1._ScpiLink(visa, strict=download1.STRICT_SCPI)
+    idn = scope.query("*IDN?").strip()
+    download1._check_scpi_errors(scope, "startup", quiet=True)
+    return rm, scope, idn
+
+
+def _stop_all(sessions: dict) -> dict[str, float]:
+    """Send ``:STOP`` to every scope at once; return each send time."""
+    barrier = threading.Barrier(len(sessions))
+    sent = {}
+
+    def stop(name, scope):
+        barrier.wait()
+        scope.write(":STOP")
+        sent[name] = time.time()
+
+    threads = [threading.Thread(target=stop, args=(name, s["scope"]))
+               for name, s in sessions.items()]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for s in sessions.values():
+        download1._check_scpi_errors(s["scope"], "STOP")
+    return sent
+
+
+def main(argv: list[str] | None = None):
+    specs = _load_specs(sys.argv[1:] if argv is None else argv)
+    out_dir = Path(
+        f"{OUT_DIR_PREFIX}{datetime.now().strftime('%Y-%m-%d_%H%M%S')}"
+    )
+    out_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Output directory: {out_dir.resolve()}")
+
+    log = _TaggedStdout(sys.stdout, [s["name"] for s in specs])
+    sys.stdout = log
+    sessions: dict[str, dict] = {}
+    entries = {s["name"]: {"name": s["name"], "address": s["address"],
+                           "channels": list(s["channels"]), "error": None}
+               for s in specs}
+    captures = {}
+    t_wall = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(len(specs), thread_name_prefix="fleet") as pool:
+            opened = {s["name"]: pool.submit(_open, s) for s in specs}
+            for name, fut in opened.items():
+                try:
+                    rm, scope, idn = fut.result()
+                except Exception as e:
+                    entries[name]["error"] = f"open: {e!r}"
+                    print(f"{name}: could not open: {e!r}")
+                    continue
+                sessions[name] = {"rm": rm, "scope": scope}
+                entries[name]["idn"] = idn
+                print(f"{name}: {idn}")
+            if not sessions:
+                raise RuntimeError("no scope could be opened")
+
+            sent = _stop_all(sessions)
+            first = min(sent.values())
+            for name, t in sent.items():
+                entries[name]["stop_sent"] = datetime.fromtimestamp(t).isoformat()
+                entries[name]["stop_skew_s"] = t - first
+
+            def acquire(spec):
+                name = spec["name"]
+                thread = threading.current_thread()
+                pool_name, thread.name = thread.name, name
+                metrics = download1._Metrics()
+                token = download1._METRICS.set(metrics)
+                try:
+                    scope = sessions[name]["scope"]
+                    sub = out_dir / name
+                    sub.mkdir(exist_ok=True)
+                    t0 = time.perf_counter()
+                    capture = download1._acquire_capture(
+                        scope, spec["channels"], sub, download1.OUT_PREFIX,
+                        entries[name]["idn"], stop=False,
+                        address=spec["address"], ensemble_sub=name)
+                    download1._export_capture(
+                        capture, sub, download1.OUT_PREFIX, plots=False,
+                        ensemble_sub=name)
+                    print(scope.report())
+                    seconds = time.perf_counter() - t0
+                    if download1.SAVE_METRICS:
+                        download1._save_metrics(metrics, scope, sub,
+                                                download1.OUT_PREFIX,
+                                                entries[name]["idn"])
+                    return capture, seconds
+                finally:
+                    download1._METRICS.reset(token)
+                    thread.name = pool_name
+
+            jobs = {s["name"]: pool.submit(acquire, s) for s in specs
+                    if s["name"] in sessions}
+            for name, fut in jobs.items():
+                entry = entries[name]
+                try:
+                    capture, seconds = fut.result()
+                except Exception as e:
+                    entry["error"] = f"acquire: {e!r}"
+                    print(f"{name}: FAILED: {e!r}")
+                    continue
+                captures[name] = capture
+                entry.update(
+                    dir=name, seconds=seconds,
+                    memory_depth=capture.memory_depth,
+                    points={wf.channel: wf.points for wf in capture},
+                    archive=(str(Path(capture.path).relative_to(out_dir))
+                             if capture.path else None),
+                )
+        wall = time.perf_counter() - t_wall
+    finally:
+        sys.stdout = log._stream
+        for s in sessions.values():
+            s["scope"].close()
+            if s["rm"] is not None:
+                s["rm"].close()
+
+    if PLOTS:
+        for name, capture in captures.items():
+            download1._plot_aligned_vs_decimated(
+                capture, out_dir / name, download1.OUT_PREFIX,
+                capture.channels, download1.DECIMATION, download1.PLOT_WORKERS)
+
+    times = [e["seconds"] for e in entries.values() if "seconds" in e]
+    manifest = {
+        "version": 1,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "wall_s": wall,
+        "slowest_scope_s": max(times, default=0.0),
+        "sum_scope_s": sum(times),
+        "scopes": list(entries.values()),
+    }
+    path = out_dir / MANIFEST_NAME
+    path.write_text(json.dumps(manifest, indent=2) + "\n")
+    print(f"Saved {path}")
+    print(f"Fleet: {len(captures)}/{len(specs)} scopes in {wall:.2f} s "
+          f"(slowest scope {manifest['slowest_scope_s']:.2f} s, "
+          f"sequential would be ~{manifest['sum_scope_s']:.2f} s)")
+    failed = [e["name"] for e in entries.values() if e["error"]]
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
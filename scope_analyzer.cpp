@@ -102,6 +102,8 @@ namespace
         double bestLagSec = 0.0;
         double bestLagUs = 0.0;
         double bestLagCorrelation = 0.0;
+        double refinedLagSamples = 0.0; // sub-sample peak (parabolic fit)
+        double refinedLagUs = 0.0;
 
         double alignedCorrelation = 0.0;
         double harmonicSimilarity = 0.0; // 1 is ideal
@@ -392,6 +394,95 @@ namespace
         return result;
     }
 
+    // fftw_malloc'd array, freed on scope exit.
+    template <typename T>
+    class FftwBuffer
+    {
+    public:
+        explicit FftwBuffer(std::size_t n)
+            : p_(static_cast<T*>(fftw_malloc(sizeof(T) * std::max<std::size_t>(n, 1)))), n_(n)
+        {
+            if (!p_)
+                throw std::runtime_error("fftw_malloc failed");
+        }
+        ~FftwBuffer() { fftw_free(p_); }
+
+        FftwBuffer(const FftwBuffer&) = delete;
+        FftwBuffer& operator=(const FftwBuffer&) = delete;
+        FftwBuffer(FftwBuffer&& o) noexcept : p_(std::exchange(o.p_, nullptr)), n_(o.n_) {}
+
+        [[nodiscard]] T* data() { return p_; }
+        [[nodiscard]] const T* data() const { return p_; }
+        [[nodiscard]] std::size_t size() const { return n_; }
+
+    private:
+        T* p_;
+        std::size_t n_;
+    };
+
+    // r2c / c2r plans per transform size, created once and reused for every
+    // channel and pair.  Plans are made on scratch buffers and run with the
+    // new-array execute functions, so FFTW_MEASURE planning never touches
+    // real data; all buffers come from fftw_malloc and share its alignment.
+    class FftPlanCache
+    {
+    public:
+        struct Plans
+        {
+            fftw_plan r2c = nullptr;
+            fftw_plan c2r = nullptr;
+        };
+
+        explicit FftPlanCache(unsigned flags = FFTW_ESTIMATE) : flags_(flags) {}
+        ~FftPlanCache()
+        {
+            for (auto& [n, p] : plans_)
+            {
+                fftw_destroy_plan(p.r2c);
+                fftw_destroy_plan(p.c2r);
+            }
+        }
+
+        FftPlanCache(const FftPlanCache&) = delete;
+        FftPlanCache& operator=(const FftPlanCache&) = delete;
+
+        [[nodiscard]] const Plans& get(int n)
+        {
+            if (auto it = plans_.find(n); it != plans_.end())
+                return it->second;
+
+            FftwBuffer<double> in(static_cast<std::size_t>(n));
+            FftwBuffer<fftw_complex> out(static_cast<std::size_t>(n / 2 + 1));
+            Plans p;
+            p.r2c = fftw_plan_dft_r2c_1d(n, in.data(), out.data(), flags_);
+            p.c2r = fftw_plan_dft_c2r_1d(n, out.data(), in.data(), flags_);
+            if (!p.r2c || !p.c2r)
+            {
+                if (p.r2c) fftw_destroy_plan(p.r2c);
+                if (p.c2r) fftw_destroy_plan(p.c2r);
+                throw std::runtime_error("fftw plan creation failed");
+            }
+            return plans_.emplace(n, p).first->second;
+        }
+
+    private:
+        unsigned flags_;
+        std::map<int, Plans> plans_;
+    };
+
+    // Smallest 2^a 3^b 5^c >= n: sizes FFTW transforms fastest.
+    [[nodiscard]] static int fastFftSize(int n)
+    {
+        for (int m = std::max(n, 1);; ++m)
+        {
+            int r = m;
+            for (int p : {2, 3, 5})
+                while (r % p == 0) r /= p;
+            if (r == 1)
+                return m;
+        }
+    }
+
     [[nodiscard]] static double binFrequency(const FftResult& fft, int k)
     {
         return static_cast<double>(k) * fft.fs / static_cast<double>(fft.n);
@@ -495,46 +586,167 @@ namespace
         return num / den;
     }
 
-    [[nodiscard]] static std::pair<int, double> bestCrossCorrelationLag(
+    struct LagResult
+    {
+        int lag = 0;
+        double score = 0.0;
+        double refined = 0.0;
+    };
+
+    // Above this many multiply-adds (n * number of lags) the lag search
+    // switches from the direct scan to FFT cross-correlation.
+    constexpr double kDirectLagWorkLimit = 16.0 * 1024 * 1024;
+
+    // Normalised overlap correlation for every lag in [-maxLag, maxLag]:
+    // sum a[i] b[i+lag] / sqrt(sum a[i]^2 * sum b[i+lag]^2) over the
+    // overlapping range, -inf where either energy is zero.  The energy
+    // sums come from prefix sums; numer(lag) supplies the dot product.
+    template <typename Numer>
+    [[nodiscard]] static std::vector<double> lagScores(
+        const std::vector<double>& a,
+        const std::vector<double>& b,
+        int n,
+        int maxLag,
+        Numer numer)
+    {
+        std::vector<double> ca(static_cast<std::size_t>(n) + 1, 0.0);
+        std::vector<double> cb(static_cast<std::size_t>(n) + 1, 0.0);
+        for (int i = 0; i < n; ++i)
+        {
+            ca[i + 1] = ca[i] + a[i] * a[i];
+            cb[i + 1] = cb[i] + b[i] * b[i];
+        }
+
+        std::vector<double> scores(static_cast<std::size_t>(2 * maxLag + 1),
+                                   -std::numeric_limits<double>::infinity());
+        for (int lag = -maxLag; lag <= maxLag; ++lag)
+        {
+            const int lo = std::max(0, -lag);
+            const int hi = std::min(n, n - lag);
+            if (hi <= lo) continue;
+
+            const double aa = ca[hi] - ca[lo];
+            const double bb = cb[hi + lag] - cb[lo + lag];
+            if (aa <= 0.0 || bb <= 0.0)
+                continue;
+
+            scores[static_cast<std::size_t>(lag + maxLag)] = numer(lag, lo, hi) / std::sqrt(aa * bb);
+        }
+        return scores;
+    }
+
+    // First (most negative) lag with the highest score, as the direct scan
+    // picks it, plus a parabolic fit through the peak and its neighbours
+    // for a sub-sample estimate.
+    [[nodiscard]] static LagResult pickBestLag(const std::vector<double>& scores, int maxLag)
+    {
+        LagResult r;
+        r.score = -std::numeric_limits<double>::infinity();
+        int best = -1;
+        for (int i = 0; i < static_cast<int>(scores.size()); ++i)
+        {
+            if (scores[i] > r.score)
+            {
+                r.score = scores[i];
+                best = i;
+            }
+        }
+        if (best < 0)
+            return r;
+
+        r.lag = best - maxLag;
+        r.refined = r.lag;
+        if (best > 0 && best + 1 < static_cast<int>(scores.size()))
+        {
+            const double ym = scores[best - 1];
+            const double y0 = scores[best];
+            const double yp = scores[best + 1];
+            const double den = ym - 2.0 * y0 + yp;
+            if (std::isfinite(ym) && std::isfinite(yp) && den < 0.0)
+                r.refined += std::clamp(0.5 * (ym - yp) / den, -0.5, 0.5);
+        }
+        return r;
+    }
+
+    // O(n * maxLag): one dot product per lag.
+    [[nodiscard]] static LagResult bestCrossCorrelationLag(
         const std::vector<double>& a,
         const std::vector<double>& b,
         int maxLag)
     {
         const int n = static_cast<int>(std::min(a.size(), b.size()));
-        if (n < 8) return {0, 0.0};
+        if (n < 8) return {0, 0.0, 0.0};
+        maxLag = std::min(maxLag, n - 1);
 
-        double bestScore = -std::numeric_limits<double>::infinity();
-        int bestLag = 0;
-
-        for (int lag = -maxLag; lag <= maxLag; ++lag)
+        const auto scores = lagScores(a, b, n, maxLag, [&](int lag, int lo, int hi)
         {
             double num = 0.0;
-            double aa = 0.0;
-            double bb = 0.0;
+            for (int i = lo; i < hi; ++i)
+                num += a[i] * b[i + lag];
+            return num;
+        });
+        return pickBestLag(scores, maxLag);
+    }
 
-            for (int i = 0; i < n; ++i)
-            {
-                const int j = i + lag;
-                if (j < 0 || j >= n) continue;
+    // O(n log n) cross-correlation: every channel is transformed once
+    // (zero-padded so lags up to maxLag do not wrap) and each pair costs one
+    // spectrum product and one inverse transform.  Plans come from the
+    // shared FftPlanCache.
+    class CrossCorrelator
+    {
+    public:
+        CrossCorrelator(FftPlanCache& plans, int n, int maxLag)
+            : plans_(plans), n_(n), maxLag_(std::min(maxLag, n - 1)), m_(fastFftSize(n + maxLag_))
+        {
+        }
 
-                num += a[i] * b[j];
-                aa += a[i] * a[i];
-                bb += b[j] * b[j];
-            }
+        [[nodiscard]] LagResult bestLag(const ChannelStats& a, const ChannelStats& b)
+        {
+            if (n_ < 8) return {0, 0.0, 0.0};
 
-            if (aa <= 0.0 || bb <= 0.0)
-                continue;
+            const auto& p = plans_.get(m_);
+            const fftw_complex* fa = spectrum(a);
+            const fftw_complex* fb = spectrum(b);
 
-            const double corr = num / std::sqrt(aa * bb);
-            if (corr > bestScore)
+            const int nOut = m_ / 2 + 1;
+            FftwBuffer<fftw_complex> prod(static_cast<std::size_t>(nOut));
+            for (int k = 0; k < nOut; ++k)
             {
-                bestScore = corr;
-                bestLag = lag;
+                // conj(A) * B  ->  r[lag] = sum a[i] b[i + lag]
+                prod.data()[k][0] = fa[k][0] * fb[k][0] + fa[k][1] * fb[k][1];
+                prod.data()[k][1] = fa[k][0] * fb[k][1] - fa[k][1] * fb[k][0];
             }
+            FftwBuffer<double> r(static_cast<std::size_t>(m_));
+            fftw_execute_dft_c2r(p.c2r, prod.data(), r.data());
+
+            const double scale = 1.0 / static_cast<double>(m_);
+            const auto scores = lagScores(a.detrended, b.detrended, n_, maxLag_, [&](int lag, int, int)
+            {
+                return r.data()[lag >= 0 ? lag : m_ + lag] * scale;
+            });
+            return pickBestLag(scores, maxLag_);
         }
 
-        return {bestLag, bestScore};
-    }
+    private:
+        const fftw_complex* spectrum(const ChannelStats& s)
+        {
+            if (auto it = spectra_.find(s.name); it != spectra_.end())
+                return it->second.data();
+
+            FftwBuffer<double> in(static_cast<std::size_t>(m_));
+            std::copy_n(s.detrended.begin(), n_, in.data());
+            std::fill(in.data() + n_, in.data() + m_, 0.0);
+            FftwBuffer<fftw_complex> out(static_cast<std::size_t>(m_ / 2 + 1));
+            fftw_execute_dft_r2c(plans_.get(m_).r2c, in.data(), out.data());
+            return spectra_.emplace(s.name, std::move(out)).first->second.data();
+        }
+
+        FftPlanCache& plans_;
+        int n_;
+        int maxLag_;
+        int m_;
+        std::map<std::string, FftwBuffer<fftw_complex>> spectra_;
+    };
 
     [[nodiscard]] static std::vector<double> shiftSignal(const std::vector<double>& x, int lag)
     {
@@ -696,11 +908,17 @@ namespace
         return s;
     }
 
+    [[nodiscard]] static int pairMaxLag(double fs, double fundamentalHz)
+    {
+        return std::max(1, static_cast<int>(std::llround(fs / fundamentalHz * 0.5)));
+    }
+
     [[nodiscard]] static PairStats analyzePair(
         const ChannelStats& a,
         const ChannelStats& b,
         double fs,
-        double fundamentalHz)
+        double fundamentalHz,
+        CrossCorrelator& xcorr)
     {
         PairStats p;
         p.a = a.name;
@@ -715,12 +933,18 @@ namespace
         p.timeShiftSec = degToTimeSec(p.phaseDiffDeg, fundamentalHz);
         p.timeShiftUs = p.timeShiftSec * 1e6;
 
-        const int maxLag = std::max(1, static_cast<int>(std::llround(fs / fundamentalHz * 0.5)));
-        auto [lag, score] = bestCrossCorrelationLag(a.detrended, b.detrended, maxLag);
+        const int n = static_cast<int>(std::min(a.detrended.size(), b.detrended.size()));
+        const int maxLag = std::min(pairMaxLag(fs, fundamentalHz), std::max(n - 1, 1));
+        const auto [lag, score, refined] =
+            (static_cast<double>(n) * (2.0 * maxLag + 1.0) > kDirectLagWorkLimit)
+                ? xcorr.bestLag(a, b)
+                : bestCrossCorrelationLag(a.detrended, b.detrended, maxLag);
         p.bestLagSamples = lag;
         p.bestLagSec = static_cast<double>(lag) / fs;
         p.bestLagUs = p.bestLagSec * 1e6;
         p.bestLagCorrelation = score;
+        p.refinedLagSamples = refined;
+        p.refinedLagUs = refined / fs * 1e6;
 
         const auto shiftedB = shiftSignal(b.detrended, lag);
         p.alignedCorrelation = pearsonCorrelation(a.detrended, shiftedB);
@@ -731,6 +955,336 @@ namespace
         return p;
     }
 
+    // Welch (segmented) spectral mode: the record is streamed row by row
+    // and cut into 50 %-overlapping Hann-windowed segments; only one
+    // segment per channel is ever held, so memory is proportional to the
+    // segment length rather than the record.
+
+    constexpr int kHarmonicBandBins = 2;      // +- bins summed per harmonic (Hann main lobe)
+    constexpr std::size_t kDtRows = 4097;     // leading rows used to estimate dt
+
+    struct WelchChannel
+    {
+        std::string name;
+        std::size_t column = 0;
+        bool valid = true;
+
+        std::vector<double> pending;          // samples not yet consumed by a segment
+        double sum = 0.0;
+        double sumSq = 0.0;
+        std::size_t count = 0;
+
+        int segments = 0;
+        std::vector<double> powerSum;         // sum over segments of |X_k|^2
+        std::vector<double> harmonicMs;       // sum over segments of band mean-square
+        double fundamentalSum = 0.0;
+        double fundamentalSq = 0.0;
+    };
+
+    struct WelchStats
+    {
+        std::string name;
+        std::size_t samples = 0;
+        int segments = 0;
+        double mean = 0.0;
+        double rms = 0.0;
+        double stddev = 0.0;
+        double dominantFreqHz = 0.0;
+        double fundamentalHz = 0.0;
+        double fundamentalSpreadHz = 0.0;
+        double fundamentalAmplitude = 0.0;
+        double thd = 0.0;
+        std::vector<HarmonicInfo> harmonics;  // 1..maxHarmonic
+    };
+
+    class WelchAnalyzer
+    {
+    public:
+        WelchAnalyzer(int segment, double fs, double fundamentalHz, int maxHarmonic, bool track, FftPlanCache& plans)
+            : nseg_(segment), step_(segment - segment / 2), nb_(segment / 2 + 1), fs_(fs),
+              f0_(fundamentalHz), maxHarmonic_(maxHarmonic), track_(track), plans_(plans),
+              window_(static_cast<std::size_t>(segment)), in_(static_cast<std::size_t>(segment)),
+              out_(static_cast<std::size_t>(nb_)), power_(static_cast<std::size_t>(nb_))
+        {
+            for (int i = 0; i < nseg_; ++i)
+            {
+                window_[i] = 0.5 - 0.5 * std::cos(2.0 * PI * i / nseg_);
+                windowSq_ += window_[i] * window_[i];
+            }
+        }
+
+        [[nodiscard]] int step() const { return step_; }
+        [[nodiscard]] double fs() const { return fs_; }
+
+        // Consume every complete segment waiting in ch.pending.
+        void drain(WelchChannel& ch)
+        {
+            while (ch.pending.size() >= static_cast<std::size_t>(nseg_))
+            {
+                addSegment(ch, ch.pending.data());
+                ch.pending.erase(ch.pending.begin(), ch.pending.begin() + step_);
+            }
+        }
+
+        [[nodiscard]] WelchStats finish(const WelchChannel& ch) const
+        {
+            WelchStats s;
+            s.name = ch.name;
+            s.samples = ch.count;
+            s.segments = ch.segments;
+            const double n = static_cast<double>(ch.count);
+            s.mean = ch.sum / n;
+            s.rms = std::sqrt(ch.sumSq / n);
+            s.stddev = std::sqrt(std::max(ch.sumSq / n - s.mean * s.mean, 0.0));
+
+            int dom = 1;
+            for (int k = 1; k < nb_; ++k)
+                if (ch.powerSum[k] > ch.powerSum[dom]) dom = k;
+            s.dominantFreqHz = dom * fs_ / nseg_;
+
+            const double segs = static_cast<double>(ch.segments);
+            s.fundamentalHz = ch.fundamentalSum / segs;
+            s.fundamentalSpreadHz = std::sqrt(std::max(ch.fundamentalSq / segs - s.fundamentalHz * s.fundamentalHz, 0.0));
+
+            double harmonicPower = 0.0;
+            for (int h = 1; h <= maxHarmonic_; ++h)
+            {
+                HarmonicInfo hi;
+                hi.harmonic = h;
+                hi.fftBin = nearestBin(h * s.fundamentalHz);
+                hi.freqHz = track_ ? h * s.fundamentalHz : hi.fftBin * fs_ / nseg_;
+                hi.amplitude = std::sqrt(2.0 * ch.harmonicMs[h - 1] / segs);
+                if (h >= 2)
+                    harmonicPower += hi.amplitude * hi.amplitude;
+                s.harmonics.push_back(hi);
+            }
+            s.fundamentalAmplitude = s.harmonics[0].amplitude;
+            for (auto& hi : s.harmonics)
+                hi.relToFundamental = (s.fundamentalAmplitude > 0.0) ? hi.amplitude / s.fundamentalAmplitude : 0.0;
+            s.thd = (s.fundamentalAmplitude > 0.0) ? std::sqrt(harmonicPower) / s.fundamentalAmplitude : 0.0;
+            return s;
+        }
+
+    private:
+        [[nodiscard]] int nearestBin(double freqHz) const
+        {
+            return std::clamp(static_cast<int>(std::llround(freqHz * nseg_ / fs_)), 0, nb_ - 1);
+        }
+
+        // Mean-square of the signal in +-kHarmonicBandBins around `centre`
+        // (Parseval with the window's power normalisation; DC excluded).
+        [[nodiscard]] double bandMs(int centre) const
+        {
+            const int lo = std::max(1, centre - kHarmonicBandBins);
+            const int hi = std::min(nb_ - 1, centre + kHarmonicBandBins);
+            double s = 0.0;
+            for (int k = lo; k <= hi; ++k)
+                s += power_[k];
+            return 2.0 * s / (nseg_ * windowSq_);
+        }
+
+        // Peak near the target fundamental (+-10 %, at least 2 bins),
+        // refined by a parabola through the log power of its neighbours.
+        [[nodiscard]] double trackFundamental() const
+        {
+            const int kt = nearestBin(f0_);
+            const int w = std::max(2, static_cast<int>(std::llround(0.1 * kt)));
+            const int lo = std::max(1, kt - w);
+            const int hi = std::min(nb_ - 2, kt + w);
+            if (hi < lo)
+                return f0_;
+
+            int k = lo;
+            for (int j = lo; j <= hi; ++j)
+                if (power_[j] > power_[k]) k = j;
+
+            double delta = 0.0;
+            if (power_[k - 1] > 0.0 && power_[k] > 0.0 && power_[k + 1] > 0.0)
+            {
+                const double lm = std::log(power_[k - 1]);
+                const double l0 = std::log(power_[k]);
+                const double lp = std::log(power_[k + 1]);
+                const double den = lm - 2.0 * l0 + lp;
+                if (den < 0.0)
+                    delta = std::clamp(0.5 * (lm - lp) / den, -0.5, 0.5);
+            }
+            return (k + delta) * fs_ / nseg_;
+        }
+
+        void addSegment(WelchChannel& ch, const double* x)
+        {
+            double mu = 0.0;
+            for (int i = 0; i < nseg_; ++i)
+                mu += x[i];
+            mu /= nseg_;
+            for (int i = 0; i < nseg_; ++i)
+                in_.data()[i] = (x[i] - mu) * window_[i];
+
+            fftw_execute_dft_r2c(plans_.get(nseg_).r2c, in_.data(), out_.data());
+            for (int k = 0; k < nb_; ++k)
+                power_[k] = out_.data()[k][0] * out_.data()[k][0] + out_.data()[k][1] * out_.data()[k][1];
+
+            if (ch.powerSum.empty())
+            {
+                ch.powerSum.assign(static_cast<std::size_t>(nb_), 0.0);
+                ch.harmonicMs.assign(static_cast<std::size_t>(maxHarmonic_), 0.0);
+            }
+            for (int k = 0; k < nb_; ++k)
+                ch.powerSum[k] += power_[k];
+
+            const double f1 = track_ ? trackFundamental() : f0_;
+            ch.fundamentalSum += f1;
+            ch.fundamentalSq += f1 * f1;
+            for (int h = 1; h <= maxHarmonic_; ++h)
+                ch.harmonicMs[h - 1] += bandMs(nearestBin(h * f1));
+            ++ch.segments;
+        }
+
+        int nseg_;
+        int step_;
+        int nb_;
+        double fs_;
+        double f0_;
+        int maxHarmonic_;
+        bool track_;
+        FftPlanCache& plans_;
+        std::vector<double> window_;
+        double windowSq_ = 0.0;
+        FftwBuffer<double> in_;
+        FftwBuffer<fftw_complex> out_;
+        std::vector<double> power_;
+    };
+
+    struct WelchRun
+    {
+        std::size_t rows = 0;
+        double dt = 0.0;
+        std::size_t timeIdx = 0;
+        std::string timeHeader;
+        std::vector<WelchStats> channels;
+    };
+
+    // Stream `path` once, feeding every signal column through the Welch
+    // accumulator.  Rows and fields are parsed exactly as readCsv() does;
+    // dt comes from the first kDtRows rows.
+    [[nodiscard]] static WelchRun runWelch(
+        const std::string& path,
+        int segment,
+        double fundamentalHz,
+        int maxHarmonic,
+        bool track,
+        FftPlanCache& plans)
+    {
+        std::ifstream fin(path);
+        if (!fin)
+            throw std::runtime_error("Cannot open input CSV: " + path);
+
+        std::string line;
+        if (!std::getline(fin, line))
+            throw std::runtime_error("CSV is empty");
+        const auto headers = splitCsvLine(line);
+        if (headers.size() < 2)
+            throw std::runtime_error("Need at least time column + one signal column");
+
+        WelchRun run;
+        run.timeIdx = findTimeColumnIndex(headers);
+        run.timeHeader = headers[run.timeIdx];
+
+        std::vector<WelchChannel> chans;
+        for (std::size_t c = 0; c < headers.size(); ++c)
+        {
+            if (c == run.timeIdx || isAuxiliarySkipHeader(headers[c]))
+                continue;
+            WelchChannel ch;
+            ch.name = headers[c];
+            ch.column = c;
+            chans.push_back(std::move(ch));
+        }
+
+        std::vector<double> leadTimes;
+        std::optional<WelchAnalyzer> welch;
+        auto start = [&]
+        {
+            run.dt = estimateDt(leadTimes);
+            welch.emplace(segment, 1.0 / run.dt, fundamentalHz, maxHarmonic, track, plans);
+        };
+
+        std::vector<double> parsed(headers.size());
+        while (std::getline(fin, line))
+        {
+            if (line.empty())
+                continue;
+
+            auto fields = splitCsvLine(line);
+            if (fields.size() < headers.size())
+                fields.resize(headers.size());
+
+            bool anyValid = false;
+            for (std::size_t c = 0; c < headers.size(); ++c)
+            {
+                const auto v = parseDouble(fields[c]);
+                parsed[c] = v.value_or(std::numeric_limits<double>::quiet_NaN());
+                anyValid = anyValid || v.has_value();
+            }
+            if (!anyValid)
+                continue;
+
+            ++run.rows;
+            const double t = parsed[run.timeIdx];
+            if (!std::isfinite(t))
+                throw std::runtime_error("Time column contains non-finite values");
+            if (leadTimes.size() < kDtRows)
+                leadTimes.push_back(t);
+
+            for (auto& ch : chans)
+            {
+                if (!ch.valid)
+                    continue;
+                const double v = parsed[ch.column];
+                if (!std::isfinite(v))
+                {
+                    ch.valid = false;
+                    ch.pending = {};
+                    continue;
+                }
+                ch.pending.push_back(v);
+                ch.sum += v;
+                ch.sumSq += v * v;
+                ++ch.count;
+            }
+
+            if (!welch && leadTimes.size() == kDtRows)
+                start();
+            if (welch)
+            {
+                for (auto& ch : chans)
+                    if (ch.valid) welch->drain(ch);
+            }
+        }
+
+        if (run.rows == 0)
+            throw std::runtime_error("No numeric rows found in CSV");
+        if (!welch)
+        {
+            start();
+            for (auto& ch : chans)
+                if (ch.valid) welch->drain(ch);
+        }
+
+        for (const auto& ch : chans)
+        {
+            if (!ch.valid)
+                continue;
+            if (ch.segments == 0)
+                throw std::runtime_error("Record (" + std::to_string(run.rows) +
+                                         " rows) is shorter than one segment");
+            run.channels.push_back(welch->finish(ch));
+        }
+        if (run.channels.empty())
+            throw std::runtime_error("No valid numeric signal channels found");
+        return run;
+    }
+
     static void writeSeparator(std::ostream& os, char ch = '=', int count = 90)
     {
         for (int i = 0; i < count; ++i) os << ch;
@@ -832,6 +1386,8 @@ namespace
         os << "Best cross-corr lag [s]     : " << p.bestLagSec << "\n";
         os << "Best cross-corr lag [us]    : " << p.bestLagUs << "\n";
         os << "Best cross-corr score       : " << p.bestLagCorrelation << "\n";
+        os << "Refined lag [samp]          : " << p.refinedLagSamples << "\n";
+        os << "Refined lag [us]            : " << p.refinedLagUs << "\n";
         os << "Aligned correlation         : " << p.alignedCorrelation << "\n";
         os << "\n";
 
@@ -840,6 +1396,52 @@ namespace
         os << "\n";
     }
 
+    static void writeWelchChannelReport(
+        std::ostream& os,
+        const WelchStats& s,
+        double fs)
+    {
+        writeSeparator(os);
+        os << "CHANNEL: " << s.name << "\n";
+        writeSeparator(os, '-');
+
+        os << std::fixed << std::setprecision(9);
+        os << "Samples                     : " << s.samples << "\n";
+        os << "Sample rate [Hz]            : " << fs << "\n";
+        os << "Segments                    : " << s.segments << "\n";
+        os << "Mean/DC                     : " << s.mean << "\n";
+        os << "RMS                         : " << s.rms << "\n";
+        os << "StdDev                      : " << s.stddev << "\n";
+        os << "\n";
+
+        os << "Dominant frequency [Hz]     : " << s.dominantFreqHz << "\n";
+        os << "Fundamental [Hz]            : " << s.fundamentalHz << "\n";
+        os << "Fundamental spread [Hz]     : " << s.fundamentalSpreadHz << "\n";
+        os << "Fundamental amplitude       : " << s.fundamentalAmplitude << "\n";
+        os << "THD                         : " << s.thd << "\n";
+        os << "\n";
+
+        os << "HARMONICS\n";
+        writeSeparator(os, '.');
+        os << "H  "
+        << std::setw(14) << "Freq[Hz]"
+        << std::setw(12) << "Bin"
+        << std::setw(18) << "Amplitude"
+        << std::setw(18) << "Rel/Fund"
+        << "\n";
+
+        for (const auto& hi : s.harmonics)
+        {
+            os << std::setw(2) << hi.harmonic
+            << std::setw(14) << hi.freqHz
+            << std::setw(12) << hi.fftBin
+            << std::setw(18) << hi.amplitude
+            << std::setw(18) << hi.relToFundamental
+            << "\n";
+        }
+        os << "\n";
+    }
+
     [[nodiscard]] static std::string nowString()
     {
         return "local-time-unavailable-in-portable-std-only-build";
@@ -850,17 +1452,40 @@ int main(int argc, char** argv)
 {
     try
     {
-        if (argc < 3)
+        // Options may appear anywhere: --welch <segment> selects the
+        // streaming Welch mode, --track follows the fundamental per segment.
+        std::vector<std::string> args;
+        int welchSegment = 0;
+        bool track = false;
+        for (int i = 1; i < argc; ++i)
+        {
+            const std::string_view a = argv[i];
+            if (a == "--welch" && i + 1 < argc)
+                welchSegment = std::stoi(argv[++i]);
+            else if (a == "--track")
+                track = true;
+            else
+                args.emplace_back(a);
+        }
+
+        if (args.size() < 2)
         {
             std::cerr << "Usage: " << argv[0]
-            << " <input.csv> <output.log> [fundamental_hz] [max_harmonic]\n";
+            << " [--welch segment [--track]] <input.csv> <output.log> [fundamental_hz] [max_harmonic]"
+               " [fftw_wisdom_file]\n";
             return 1;
         }
 
-        const std::string inputCsv = argv[1];
-        const std::string outputLog = argv[2];
-        const double targetFundamentalHz = (argc >= 4) ? std::stod(argv[3]) : 50.0;
-        const int maxHarmonic = (argc >= 5) ? std::stoi(argv[4]) : 15;
+        const std::string inputCsv = args[0];
+        const std::string outputLog = args[1];
+        const double targetFundamentalHz = (args.size() >= 3) ? std::stod(args[2]) : 50.0;
+        const int maxHarmonic = (args.size() >= 4) ? std::stoi(args[3]) : 15;
+        // With a wisdom file, plans are measured once and the result is
+        // kept for the next run; without one, FFTW_ESTIMATE as before.
+        const std::string wisdomFile = (args.size() >= 5) ? args[4] : "";
+        if (!wisdomFile.empty())
+            fftw_import_wisdom_from_filename(wisdomFile.c_str());
+        FftPlanCache plans(wisdomFile.empty() ? FFTW_ESTIMATE : FFTW_MEASURE);
 
         if (targetFundamentalHz <= 0.0)
             throw std::runtime_error("fundamental_hz must be > 0");
@@ -868,6 +1493,50 @@ int main(int argc, char** argv)
         if (maxHarmonic < 1)
             throw std::runtime_error("max_harmonic must be >= 1");
 
+        if (welchSegment != 0)
+        {
+            if (welchSegment < 4)
+                throw std::runtime_error("Welch segment must be >= 4 samples");
+
+            const WelchRun run = runWelch(inputCsv, welchSegment, targetFundamentalHz, maxHarmonic, track, plans);
+            const double fs = 1.0 / run.dt;
+
+            std::ofstream log(outputLog);
+            if (!log)
+                throw std::runtime_error("Cannot open output log: " + outputLog);
+
+            writeSeparator(log);
+            log << "OSCILLOSCOPE WELCH SPECTRAL REPORT\n";
+            writeSeparator(log);
+            log << "Input file                  : " << inputCsv << "\n";
+            log << "Output log                  : " << outputLog << "\n";
+            log << "Generated                   : " << nowString() << "\n";
+            log << "\n";
+
+            log << std::fixed << std::setprecision(9);
+            log << "Rows                        : " << run.rows << "\n";
+            log << "Estimated dt [s]            : " << run.dt << "\n";
+            log << "Estimated Fs [Hz]           : " << fs << "\n";
+            log << "Segment length              : " << welchSegment << "\n";
+            log << "Segment step                : " << (welchSegment - welchSegment / 2) << "\n";
+            log << "Window                      : hann\n";
+            log << "Frequency resolution [Hz]   : " << fs / welchSegment << "\n";
+            log << "Target fundamental [Hz]     : " << targetFundamentalHz << "\n";
+            log << "Max harmonic                : " << maxHarmonic << "\n";
+            log << "Fundamental tracking        : " << (track ? "on" : "off") << "\n";
+            log << "Time column                 : " << run.timeHeader << " (column " << run.timeIdx << ")\n";
+            log << "Signal channels             : " << run.channels.size() << "\n";
+            log << "\n";
+
+            for (const auto& ch : run.channels)
+                writeWelchChannelReport(log, ch, fs);
+
+            if (!wisdomFile.empty())
+                fftw_export_wisdom_to_filename(wisdomFile.c_str());
+            std::cout << "Analysis complete. Log written to: " << outputLog << "\n";
+            return 0;
+        }
+
         const CsvData csv = readCsv(inputCsv);
         if (csv.headers.size() < 2)
             throw std::runtime_error("Need at least time column + one signal column");
@@ -902,12 +1571,15 @@ int main(int argc, char** argv)
         if (channels.empty())
             throw std::runtime_error("No valid numeric signal channels found");
 
+        CrossCorrelator xcorr(plans, static_cast<int>(N), pairMaxLag(fs, targetFundamentalHz));
         std::vector<PairStats> pairs;
         for (std::size_t i = 0; i < channels.size(); ++i)
         {
             for (std::size_t j = i + 1; j < channels.size(); ++j)
-                pairs.push_back(analyzePair(channels[i], channels[j], fs, targetFundamentalHz));
+                pairs.push_back(analyzePair(channels[i], channels[j], fs, targetFundamentalHz, xcorr));
         }
+        if (!wisdomFile.empty())
+            fftw_export_wisdom_to_filename(wisdomFile.c_str());
 
         std::ofstream log(outputLog);
         if (!log)
@@ -0,0 +1,1181 @@
+#!/usr/bin/env python3
+"""
+NumPy port of ``scope_analyzer.cpp``: per-channel and pairwise waveform
+analysis straight from a ``Capture``.
+
+The metrics are the C++ analyser's: DC / RMS / extremes, the FFT bins
+of a target fundamental and its harmonics, THD, the residual after
+subtracting the best-fit fundamental sine, the first rising zero
+crossing, and per pair the correlation, phase difference, best
+cross-correlation lag and harmonic similarity.  The algorithms are kept
+step for step (bin rounding, first-maximum tie breaks, zero-padded
+shifts) so both produce the same report for the same samples.
+
+``analyze_capture`` works on the aligned grid of the aligned CSV, but
+gathers the voltages from the capture's codes directly — an in-memory
+capture right after the download, or a memory-mapped archive from
+``capture_archive.load_archive`` — so there is no CSV to write or parse.
+``download1.py`` runs it after each capture when ``ANALYZE`` is set.
+
+``write_report`` emits the C++ log format line for line, and
+``--compare`` diffs two such logs numerically, to cross-check this port
+against the C++ binary on a shared ``_aligned.csv``.
+
+``--welch SEGMENT`` switches to the streaming Welch mode of the C++
+binary (``welch_capture`` / ``welch_csv``): averaged Hann-windowed
+segment spectra, with memory bounded by the segment length rather than
+the record length, and optionally a per-segment fundamental tracker.
+
+Usage:
+    python scope_analyzer.py <capture_dir | capture.json | input.csv>
+                             <output.log> [fundamental_hz] [max_harmonic]
+                             [--welch SEGMENT [--track]]
+    python scope_analyzer.py --compare <a.log> <b.log> [--rtol R] [--atol A]
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import sys
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from capture_archive import load_archive
+from waveform import Capture
+
+_AUX_HEADERS = {"rowid", "row_id", "rowindex", "row_index"}
+_HARMONIC_BAND_BINS = 2     # +- bins summed per harmonic in Welch mode
+_DT_ROWS = 4097             # leading CSV rows used to estimate dt in Welch mode
+_WELCH_BATCH = 1 << 22      # samples transformed per vectorised Welch batch
+_CSV_BATCH_ROWS = 65536     # CSV rows parsed at a time
+_TIME_HEADERS = {"time", "time_s", "t_s", "timestamp", "seconds", "sec",
+                 "time(s)", "time[s]"}
+
+
+# ── Results ──────────────────────────────────────────────────────────
+
+class Harmonic(NamedTuple):
+    harmonic: int
+    freq_hz: float
+    fft_bin: int
+    amplitude: float          # peak amplitude estimate
+    phase_rad: float
+    phase_deg: float
+    rel_to_fundamental: float
+
+
+class ChannelStats(NamedTuple):
+    name: str
+    mean: float
+    rms: float
+    stddev: float
+    minv: float
+    maxv: float
+    p2p: float
+    crest_factor: float
+    fundamental_hz: float
+    fundamental_bin: int
+    fundamental_amplitude: float
+    fundamental_phase_rad: float
+    fundamental_phase_deg: float
+    dominant_freq_hz: float
+    dominant_bin: int
+    dominant_amplitude: float
+    thd: float
+    total_spectral_energy: float
+    harmonic_energy: float
+    fundamental_energy_ratio: float
+    sine_residual_rms: float
+    sine_residual_to_signal_rms: float
+    sine_residual_to_signal_std: float
+    zero_crossing_time: float
+    harmonics: list[Harmonic]
+    detrended: np.ndarray
+    sine_residual: np.ndarray
+
+
+class PairStats(NamedTuple):
+    a: str
+    b: str
+    pearson_correlation: float
+    normalized_dot: float
+    amplitude_ratio: float
+    phase_diff_rad: float
+    phase_diff_deg: float
+    time_shift_sec: float
+    time_shift_us: float
+    best_lag_samples: int
+    best_lag_sec: float
+    best_lag_us: float
+    best_lag_correlation: float
+    refined_lag_samples: float   # sub-sample peak (parabolic fit)
+    refined_lag_us: float
+    aligned_correlation: float
+    harmonic_similarity: float   # 1 is ideal
+    residual_correlation: float
+
+
+class Analysis(NamedTuple):
+    """One analysed record: its time base plus channel and pair results."""
+    source: str
+    rows: int
+    duration: float
+    dt: float
+    fs: float
+    fundamental_hz: float
+    max_harmonic: int
+    time_column: str
+    time_index: int
+    channels: list[ChannelStats]
+    pairs: list[PairStats]
+
+
+# ── Primitives ───────────────────────────────────────────────────────
+
+def _estimate_dt(steps: np.ndarray) -> float:
+    """Median positive step, taking the upper middle element like the C++."""
+    steps = steps[np.isfinite(steps) & (steps > 0)]
+    if not len(steps):
+        raise ValueError("Invalid time axis")
+    k = len(steps) // 2
+    return float(np.partition(steps, k)[k])
+
+
+def _rms(x: np.ndarray) -> float:
+    return math.sqrt(float(np.dot(x, x)) / len(x))
+
+
+def _stddev(x: np.ndarray, mu: float) -> float:
+    d = x - mu
+    return math.sqrt(float(np.dot(d, d)) / len(x))
+
+
+def _amplitudes(bins: np.ndarray, n: int) -> np.ndarray:
+    """Peak amplitude of every rfft bin (DC and Nyquist are not doubled)."""
+    amp = np.abs(bins) * (2.0 / n)
+    amp[0] /= 2
+    if n % 2 == 0:
+        amp[-1] /= 2
+    return amp
+
+
+def _nearest_bin(freq_hz: float, n: int, fs: float, nbins: int) -> int:
+    k = math.floor(freq_hz * n / fs + 0.5)     # llround for freq >= 0
+    return min(max(k, 0), nbins - 1)
+
+
+def _wrap_phase_pi(x: float) -> float:
+    while x > math.pi:
+        x -= 2.0 * math.pi
+    while x < -math.pi:
+        x += 2.0 * math.pi
+    return x
+
+
+def _pearson(a: np.ndarray, b: np.ndarray) -> float:
+    n = min(len(a), len(b))
+    if n < 2:
+        return 0.0
+    da = a[:n] - a[:n].mean()
+    db = b[:n] - b[:n].mean()
+    den = math.sqrt(float(np.dot(da, da)) * float(np.dot(db, db)))
+    return float(np.dot(da, db)) / den if den > 0.0 else 0.0
+
+
+def _normalized_dot(a: np.ndarray, b: np.ndarray) -> float:
+    n = min(len(a), len(b))
+    if n == 0:
+        return 0.0
+    a, b = a[:n], b[:n]
+    den = math.sqrt(float(np.dot(a, a)) * float(np.dot(b, b)))
+    return float(np.dot(a, b)) / den if den > 0.0 else 0.0
+
+
+# Above this many multiply-adds (n * number of lags) the lag search
+# switches from the direct scan to FFT cross-correlation.
+_DIRECT_LAG_WORK = 16 * 1024 * 1024
+
+
+def _fast_fft_size(n: int) -> int:
+    """Smallest 2^a 3^b 5^c >= n."""
+    m = max(n, 1)
+    while True:
+        r = m
+        for p in (2, 3, 5):
+            while r % p == 0:
+                r //= p
+        if r == 1:
+            return m
+        m += 1
+
+
+def _lag_scores(a: np.ndarray, b: np.ndarray, max_lag: int, numer) -> np.ndarray:
+    """
+    Normalised overlap correlation for every lag in ``[-max_lag, max_lag]``:
+    ``sum a[i] b[i + lag] / sqrt(sum a[i]^2 * sum b[i + lag]^2)`` over the
+    overlapping range, ``-inf`` where either energy is zero.
+
+    The energy terms come from prefix sums; ``numer(lags)`` supplies the
+    dot products for an array of lags.
+    """
+    n = len(a)
+    ca = np.concatenate(([0.0], np.cumsum(a * a)))
+    cb = np.concatenate(([0.0], np.cumsum(b * b)))
+    lags = np.arange(-max_lag, max_lag + 1)
+    lo = np.maximum(0, -lags)
+    hi = np.minimum(n, n - lags)
+    aa = ca[hi] - ca[lo]
+    bb = cb[hi + lags] - cb[lo + lags]
+    ok = (aa > 0.0) & (bb > 0.0)
+    scores = np.full(len(lags), -np.inf)
+    scores[ok] = numer(lags[ok]) / np.sqrt(aa[ok] * bb[ok])
+    return scores
+
+
+def _pick_lag(scores: np.ndarray, max_lag: int) -> tuple[int, float, float]:
+    """
+    First (most negative) lag with the highest score, as the direct scan
+    picks it, plus a parabolic fit through the peak and its neighbours
+    for a sub-sample estimate.
+    """
+    if not len(scores) or not np.isfinite(scores).any():
+        return 0, -math.inf, 0.0
+    best = int(np.argmax(scores))
+    lag = best - max_lag
+    refined = float(lag)
+    if 0 < best < len(scores) - 1:
+        ym, y0, yp = scores[best - 1:best + 2]
+        den = ym - 2.0 * y0 + yp
+        if np.isfinite(ym) and np.isfinite(yp) and den < 0.0:
+            refined += float(min(max(0.5 * (ym - yp) / den, -0.5), 0.5))
+    return lag, float(scores[best]), refined
+
+
+def _best_lag(a: np.ndarray, b: np.ndarray, max_lag: int) -> tuple[int, float, float]:
+    """O(n * max_lag) lag search: one dot product per lag."""
+    n = min(len(a), len(b))
+    if n < 8:
+        return 0, 0.0, 0.0
+    a, b = a[:n], b[:n]
+    max_lag = min(max_lag, n - 1)
+
+    def numer(lags):
+        return np.array([np.dot(a[max(0, -k):min(n, n - k)],
+                                b[max(0, k):min(n, n + k)]) for k in lags])
+
+    return _pick_lag(_lag_scores(a, b, max_lag, numer), max_lag)
+
+
+def estimate_lag(a: np.ndarray, b: np.ndarray,
+                 max_lag: int) -> tuple[int, float, float]:
+    """
+    Lag in ``[-max_lag, max_lag]`` that best aligns *b* with *a*, i.e.
+    maximises the normalised overlap correlation of ``a[i]`` and
+    ``b[i + lag]``; returns ``(lag, score, refined)`` where *refined* is
+    the sub-sample estimate.  Pass detrended signals.
+
+    Scans the lags directly while that is cheap and switches to FFT
+    cross-correlation above ``_DIRECT_LAG_WORK`` multiply-adds.
+    """
+    n = min(len(a), len(b))
+    if n < 8:
+        return 0, 0.0, 0.0
+    max_lag = min(max_lag, n - 1)
+    if n * (2 * max_lag + 1) <= _DIRECT_LAG_WORK:
+        return _best_lag(a, b, max_lag)
+    a, b = a[:n], b[:n]
+    m = _fast_fft_size(n + max_lag)
+    r = np.fft.irfft(np.conj(np.fft.rfft(a, m)) * np.fft.rfft(b, m), m)
+    return _pick_lag(_lag_scores(a, b, max_lag, lambda lags: r[lags]), max_lag)
+
+
+class _CrossCorrelator:
+    """
+    O(n log n) lag search by FFT cross-correlation.
+
+    Every channel is transformed once (zero-padded so lags up to
+    *max_lag* do not wrap); each pair then costs one spectrum product
+    and one inverse transform.
+    """
+
+    def __init__(self, n: int, max_lag: int):
+        self.n = n
+        self.max_lag = min(max_lag, n - 1)
+        self.m = _fast_fft_size(n + self.max_lag)
+        self._spectra: dict[str, np.ndarray] = {}
+
+    def _spectrum(self, s: "ChannelStats") -> np.ndarray:
+        spec = self._spectra.get(s.name)
+        if spec is None:
+            spec = self._spectra[s.name] = np.fft.rfft(s.detrended[:self.n],
+                                                       self.m)
+        return spec
+
+    def best_lag(self, a: "ChannelStats", b: "ChannelStats") -> tuple[int, float, float]:
+        if self.n < 8:
+            return 0, 0.0, 0.0
+        # conj(A) * B  ->  r[lag] = sum a[i] b[i + lag]
+        r = np.fft.irfft(np.conj(self._spectrum(a)) * self._spectrum(b), self.m)
+        scores = _lag_scores(a.detrended[:self.n], b.detrended[:self.n],
+                             self.max_lag, lambda lags: r[lags])
+        return _pick_lag(scores, self.max_lag)
+
+
+def _shift(x: np.ndarray, lag: int) -> np.ndarray:
+    """``out[i] = x[i - lag]``, zero where that falls outside *x*."""
+    if lag == 0:
+        return x
+    out = np.zeros_like(x)
+    if lag > 0:
+        out[lag:] = x[:len(x) - lag]
+    else:
+        out[:lag] = x[-lag:]
+    return out
+
+
+def _first_rising_zero(x: np.ndarray) -> float | None:
+    """Fractional index of the first ``x[i-1] <= 0 < x[i]`` crossing."""
+    hit = np.flatnonzero((x[:-1] <= 0.0) & (x[1:] > 0.0))
+    if not len(hit):
+        return None
+    i = int(hit[0])
+    return i + (0.0 - x[i]) / (x[i + 1] - x[i])
+
+
+def _harmonic_similarity(a: list[Harmonic], b: list[Harmonic]) -> float:
+    n = min(len(a), len(b))
+    if n == 0:
+        return 0.0
+    err = denom = 0.0
+    for ha, hb in zip(a[:n], b[:n]):
+        da, db = ha.rel_to_fundamental, hb.rel_to_fundamental
+        err += abs(da - db)
+        denom += max(abs(da), abs(db), 1e-12)
+    return max(0.0, 1.0 - err / denom) if denom > 0.0 else 1.0
+
+
+# ── Analysis ─────────────────────────────────────────────────────────
+
+def analyze_channel(name: str, x: np.ndarray, fs: float,
+                    fundamental_hz: float = 50.0, max_harmonic: int = 15,
+                    time_at=None) -> ChannelStats:
+    """
+    Analyse one channel of voltages sampled at *fs*.
+
+    *time_at* maps a (fractional) sample index to seconds for the zero
+    crossing; the default is ``index / fs``.
+    """
+    n = len(x)
+    if n < 4:
+        raise ValueError("Signal too short for FFT")
+    x = np.asarray(x, dtype=np.float64)
+    mu = float(x.mean())
+    rms = _rms(x)
+    sd = _stddev(x, mu)
+    minv, maxv = float(x.min()), float(x.max())
+    detrended = x - mu
+    del x
+
+    zc = _first_rising_zero(detrended)
+    if zc is None:
+        zc_time = math.nan
+    elif time_at is None:
+        zc_time = zc / fs
+    else:
+        # Interpolate between the bracketing timestamps, as the C++ does.
+        i = math.floor(zc)
+        t0, t1 = float(time_at(i)), float(time_at(i + 1))
+        zc_time = t0 + (zc - i) * (t1 - t0)
+
+    bins = np.fft.rfft(detrended)
+    amp = _amplitudes(bins, n)
+    phase = np.angle(bins)
+    freq = lambda k: k * fs / n  # noqa: E731
+
+    fund_bin = _nearest_bin(fundamental_hz, n, fs, len(bins))
+    fund_amp = float(amp[fund_bin])
+    fund_phase = float(phase[fund_bin])
+    dom_bin = int(np.argmax(amp[1:])) + 1
+    dom_amp = float(amp[dom_bin])
+
+    harmonics = []
+    harmonic_power = 0.0
+    for h in range(1, max_harmonic + 1):
+        k = _nearest_bin(fundamental_hz * h, n, fs, len(bins))
+        a = float(amp[k])
+        harmonics.append(Harmonic(
+            h, freq(k), k, a, float(phase[k]), math.degrees(phase[k]),
+            a / fund_amp if fund_amp > 0.0 else 0.0))
+        if h >= 2:
+            harmonic_power += a * a
+    total_power = float(np.dot(amp[1:], amp[1:]))
+    del bins, amp, phase
+
+    t = np.arange(n, dtype=np.float64)
+    t *= 2.0 * math.pi * fundamental_hz / fs
+    t += fund_phase
+    residual = detrended - fund_amp * np.cos(t)
+    del t
+    res_rms = _rms(residual)
+    sig_rms = _rms(detrended)
+
+    return ChannelStats(
+        name=name, mean=mu, rms=rms, stddev=sd, minv=minv, maxv=maxv,
+        p2p=maxv - minv,
+        crest_factor=max(abs(minv), abs(maxv)) / rms if rms > 0.0 else 0.0,
+        fundamental_hz=fundamental_hz, fundamental_bin=fund_bin,
+        fundamental_amplitude=fund_amp, fundamental_phase_rad=fund_phase,
+        fundamental_phase_deg=math.degrees(fund_phase),
+        dominant_freq_hz=freq(dom_bin), dominant_bin=dom_bin,
+        dominant_amplitude=dom_amp,
+        thd=(math.sqrt(harmonic_power) / fund_amp if fund_amp > 0.0 else 0.0),
+        total_spectral_energy=total_power,
+        harmonic_energy=harmonic_power,
+        fundamental_energy_ratio=(fund_amp * fund_amp / total_power
+                                  if total_power > 0.0 else 0.0),
+        sine_residual_rms=res_rms,
+        sine_residual_to_signal_rms=res_rms / sig_rms if sig_rms > 0.0 else 0.0,
+        sine_residual_to_signal_std=(
+            _stddev(residual, float(residual.mean())) / sd if sd > 0.0 else 0.0),
+        zero_crossing_time=zc_time,
+        harmonics=harmonics, detrended=detrended, sine_residual=residual,
+    )
+
+
+def _pair_max_lag(fs: float, fundamental_hz: float) -> int:
+    return max(1, math.floor(fs / fundamental_hz * 0.5 + 0.5))
+
+
+def analyze_pair(a: ChannelStats, b: ChannelStats, fs: float,
+                 fundamental_hz: float = 50.0,
+                 xcorr: _CrossCorrelator | None = None) -> PairStats:
+    """
+    Compare two analysed channels.  The lag search is ``estimate_lag``;
+    on long records an *xcorr* shared across pairs does the same FFT
+    search but keeps each channel's spectrum for the next pair.
+    """
+    phase = _wrap_phase_pi(b.fundamental_phase_rad - a.fundamental_phase_rad)
+    shift = math.degrees(phase) / 360.0 / fundamental_hz
+    n = min(len(a.detrended), len(b.detrended))
+    max_lag = min(_pair_max_lag(fs, fundamental_hz), max(n - 1, 1))
+    if xcorr is not None and n * (2 * max_lag + 1) > _DIRECT_LAG_WORK:
+        lag, score, refined = xcorr.best_lag(a, b)
+    else:
+        lag, score, refined = estimate_lag(a.detrended, b.detrended, max_lag)
+    return PairStats(
+        a=a.name, b=b.name,
+        pearson_correlation=_pearson(a.detrended, b.detrended),
+        normalized_dot=_normalized_dot(a.detrended, b.detrended),
+        amplitude_ratio=a.rms / b.rms if b.rms > 0.0 else 0.0,
+        phase_diff_rad=phase, phase_diff_deg=math.degrees(phase),
+        time_shift_sec=shift, time_shift_us=shift * 1e6,
+        best_lag_samples=lag, best_lag_sec=lag / fs, best_lag_us=lag / fs * 1e6,
+        best_lag_correlation=score,
+        refined_lag_samples=refined, refined_lag_us=refined / fs * 1e6,
+        aligned_correlation=_pearson(a.detrended, _shift(b.detrended, lag)),
+        harmonic_similarity=_harmonic_similarity(a.harmonics, b.harmonics),
+        residual_correlation=_pearson(a.sine_residual, b.sine_residual),
+    )
+
+
+def _analyze(source: str, signals, time_at, n: int, dt: float,
+             fundamental_hz: float, max_harmonic: int, time_column: str,
+             time_index: int) -> Analysis:
+    """Run the channel and pair analyses over ``(name, volts)`` *signals*."""
+    if fundamental_hz <= 0.0:
+        raise ValueError("fundamental_hz must be > 0")
+    if max_harmonic < 1:
+        raise ValueError("max_harmonic must be >= 1")
+    fs = 1.0 / dt
+    channels = [analyze_channel(name, x, fs, fundamental_hz, max_harmonic,
+                                time_at)
+                for name, x in signals]
+    if not channels:
+        raise ValueError("No valid numeric signal channels found")
+    xcorr = _CrossCorrelator(n, _pair_max_lag(fs, fundamental_hz))
+    pairs = [analyze_pair(a, b, fs, fundamental_hz, xcorr)
+             for i, a in enumerate(channels) for b in channels[i + 1:]]
+    return Analysis(source, n, float(time_at(n - 1) - time_at(0)), dt, fs,
+                    fundamental_hz, max_harmonic, time_column, time_index,
+                    channels, pairs)
+
+
+def analyze_capture(capture: Capture, fundamental_hz: float = 50.0,
+                    max_harmonic: int = 15) -> Analysis:
+    """
+    Analyse *capture* on the aligned grid (the rows of ``_aligned.csv``).
+
+    Each channel is converted to volts one at a time straight from its
+    codes, so a memory-mapped archive is only paged in channel by channel.
+    """
+    al = capture.alignment()
+    ref = capture.ref
+    if al.n < 2:
+        raise ValueError("Need at least 2 time samples")
+    step = 1.0 if al.ref_idx is None else _estimate_dt(
+        np.diff(al.ref_idx).astype(np.float64))
+    dt = ref.xinc * step
+    if not dt > 0:
+        raise ValueError("Invalid time axis")
+
+    def time_at(i):
+        return ref.time_at(al.ref_rows(i))
+
+    def signals():
+        for k, wf in enumerate(capture.waveforms):
+            idx = al.indices[k]
+            yield wf.channel, wf.voltages() if idx is None else wf.voltages_at(idx)
+
+    source = str(capture.path) if capture.path else capture.idn or "capture"
+    return _analyze(source, signals(), time_at, al.n, dt, fundamental_hz,
+                    max_harmonic, "time_s", 1)
+
+
+def _csv_batches(f, ncols: int):
+    """
+    Yield ``(ncols, k)`` float blocks of the CSV rows left in *f*,
+    ``_CSV_BATCH_ROWS`` lines at a time; rows with no numeric field are
+    dropped.
+    """
+    while True:
+        raw = list(itertools.islice(f, _CSV_BATCH_ROWS))
+        if not raw:
+            return
+        lines = [line for line in raw if line.strip()]
+        if not lines:
+            continue
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")     # ragged rows are dropped
+            data = np.genfromtxt(lines, delimiter=",", dtype=np.float64,
+                                 ndmin=2, invalid_raise=False)
+        if data.shape[1] < ncols:
+            pad = np.full((len(data), ncols - data.shape[1]), np.nan)
+            data = np.hstack([data, pad])
+        data = data[:, :ncols]
+        data = data[~np.isnan(data).all(axis=1)]
+        if len(data):
+            yield data.T
+
+
+def _read_csv(path: Path) -> tuple[list[str], np.ndarray]:
+    """Header and float columns of a CSV; rows with no numeric field dropped."""
+    with open(path, newline="") as f:
+        headers = [h.strip() for h in next(csv.reader(f))]
+        blocks = list(_csv_batches(f, len(headers)))
+    if not blocks:
+        raise ValueError("No numeric rows found in CSV")
+    return headers, np.concatenate(blocks, axis=1)
+
+
+def _time_column(headers: list[str]) -> int:
+    return next((i for i, h in enumerate(headers)
+                 if "".join(h.lower().split()) in _TIME_HEADERS), 0)
+
+
+def analyze_csv(path: Path, fundamental_hz: float = 50.0,
+                max_harmonic: int = 15) -> Analysis:
+    """Analyse a CSV exactly as the C++ binary reads it (for cross-checks)."""
+    headers, columns = _read_csv(path)
+    if len(headers) < 2:
+        raise ValueError("Need at least time column + one signal column")
+    time_index = _time_column(headers)
+    t = columns[time_index]
+    if not np.isfinite(t).all():
+        raise ValueError("Time column contains non-finite values")
+    if len(t) < 2:
+        raise ValueError("Need at least 2 time samples")
+    dt = _estimate_dt(np.diff(t))
+    signals = [(h, columns[i]) for i, h in enumerate(headers)
+               if i != time_index and h.lower() not in _AUX_HEADERS
+               and np.isfinite(columns[i]).all()]
+    return _analyze(str(path), signals, t.__getitem__, len(t), dt,
+                    fundamental_hz, max_harmonic, headers[time_index],
+                    time_index)
+
+
+# ── Welch spectral mode ──────────────────────────────────────────────
+#
+# For records larger than RAM: each channel is cut into 50 %-overlapping
+# Hann-windowed segments, read a batch at a time (a memory-mapped archive
+# only pages in the batch), and the segment power spectra are averaged.
+# Harmonic amplitudes come from the power within +-2 bins of each
+# harmonic (the Hann main lobe), so they do not depend on the tone
+# falling exactly on a bin.  With tracking, each segment's fundamental
+# is located near the target first and the harmonics follow it.
+
+class WelchStats(NamedTuple):
+    name: str
+    samples: int
+    fs: float
+    segments: int
+    mean: float
+    rms: float
+    stddev: float
+    dominant_freq_hz: float
+    fundamental_hz: float            # mean over segments when tracking
+    fundamental_spread_hz: float
+    fundamental_amplitude: float
+    thd: float
+    harmonics: list[Harmonic]        # phase fields are 0 (not meaningful)
+    psd: np.ndarray                  # averaged one-sided PSD, V^2/Hz
+
+
+class WelchAnalysis(NamedTuple):
+    source: str
+    rows: int
+    dt: float
+    fs: float
+    segment: int
+    fundamental_hz: float
+    max_harmonic: int
+    track: bool
+    time_column: str
+    time_index: int
+    channels: list[WelchStats]
+
+
+def _welch_bins(freq_hz, nseg: int, fs: float, nb: int) -> np.ndarray:
+    return np.clip(np.floor(np.asarray(freq_hz) * nseg / fs + 0.5), 0,
+                   nb - 1).astype(np.int64)
+
+
+def _track_fundamental(power: np.ndarray, nseg: int, fs: float,
+                       fundamental_hz: float) -> np.ndarray:
+    """Per-segment peak within +-10 % (>= 2 bins) of the target, log-parabola refined."""
+    nb = power.shape[1]
+    kt = int(_welch_bins(fundamental_hz, nseg, fs, nb))
+    w = max(2, math.floor(0.1 * kt + 0.5))
+    lo, hi = max(1, kt - w), min(nb - 2, kt + w)
+    if hi < lo:
+        return np.full(len(power), fundamental_hz)
+    k = lo + np.argmax(power[:, lo:hi + 1], axis=1)
+    rows = np.arange(len(power))
+    pm, p0, pp = power[rows, k - 1], power[rows, k], power[rows, k + 1]
+    delta = np.zeros(len(power))
+    ok = (pm > 0) & (p0 > 0) & (pp > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lm, l0, lp = np.log(pm), np.log(p0), np.log(pp)
+        den = lm - 2.0 * l0 + lp
+        ok &= den < 0.0
+        delta[ok] = np.clip(0.5 * (lm - lp)[ok] / den[ok], -0.5, 0.5)
+    return (k + delta) * fs / nseg
+
+
+class _WelchChannel:
+    """
+    Streaming Welch accumulator for one channel (the C++ ``WelchChannel``
+    plus ``WelchAnalyzer::drain``): ``feed`` appends samples to a pending
+    buffer, and every complete segment in it is transformed and dropped
+    once the sample rate is known (``start``).  Memory is the pending
+    buffer plus one batch of segment spectra, whatever the record length.
+    """
+
+    def __init__(self, name: str, segment: int, fundamental_hz: float,
+                 max_harmonic: int, track: bool):
+        nseg = segment
+        if nseg < 4:
+            raise ValueError("Welch segment must be >= 4 samples")
+        self.name = name
+        self.nseg = nseg
+        self.step = nseg - nseg // 2
+        self.nb = nseg // 2 + 1
+        self.fundamental_hz = fundamental_hz
+        self.track = track
+        self.fs = 0.0
+        self.window = 0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(nseg) / nseg)
+        self.window_sq = float(np.dot(self.window, self.window))
+        self.harmonics = np.arange(1, max_harmonic + 1)
+        self.per_batch = max(1, _WELCH_BATCH // nseg)
+
+        self.pending = np.empty(0)
+        self.power_sum = np.zeros(self.nb)
+        self.harmonic_ms = np.zeros(max_harmonic)
+        self.f_sum = self.f_sq = 0.0
+        self.total = self.total_sq = 0.0
+        self.samples = self.segments = 0
+
+    def start(self, fs: float):
+        self.fs = fs
+        self._drain()
+
+    def feed(self, x: np.ndarray):
+        x = np.asarray(x, dtype=np.float64)
+        self.total += float(x.sum())
+        self.total_sq += float(np.dot(x, x))
+        self.samples += len(x)
+        self.pending = (np.concatenate([self.pending, x]) if len(self.pending)
+                        else x)
+        if self.fs:
+            self._drain()
+
+    def _drain(self):
+        nseg, step = self.nseg, self.step
+        ready = ((len(self.pending) - nseg) // step + 1
+                 if len(self.pending) >= nseg else 0)
+        for s0 in range(0, ready, self.per_batch):
+            s1 = min(s0 + self.per_batch, ready)
+            self._add_segments(
+                self.pending[s0 * step:(s1 - 1) * step + nseg])
+        if ready:
+            self.pending = self.pending[ready * step:].copy()
+
+    def _add_segments(self, x: np.ndarray):
+        nseg, nb, fs = self.nseg, self.nb, self.fs
+        segs = np.lib.stride_tricks.sliding_window_view(x, nseg)[::self.step]
+        segs = segs - segs.mean(axis=1, keepdims=True)
+        segs *= self.window
+        spec = np.fft.rfft(segs, axis=1)
+        del segs
+        power = spec.real ** 2 + spec.imag ** 2
+        del spec
+        self.power_sum += power.sum(axis=0)
+        self.segments += len(power)
+
+        f1 = (_track_fundamental(power, nseg, fs, self.fundamental_hz)
+              if self.track else np.full(len(power), self.fundamental_hz))
+        self.f_sum += float(f1.sum())
+        self.f_sq += float(np.dot(f1, f1))
+        centre = _welch_bins(np.outer(f1, self.harmonics), nseg, fs, nb)
+        cum = np.zeros((len(power), nb + 1))
+        np.cumsum(power, axis=1, out=cum[:, 1:])
+        b_lo = np.maximum(1, centre - _HARMONIC_BAND_BINS)
+        b_hi = np.minimum(nb - 1, centre + _HARMONIC_BAND_BINS)
+        band = (np.take_along_axis(cum, b_hi + 1, axis=1)
+                - np.take_along_axis(cum, b_lo, axis=1))
+        self.harmonic_ms += (2.0 * band / (nseg * self.window_sq)).sum(axis=0)
+
+    def finish(self) -> WelchStats:
+        n, nseg, nb, fs = self.samples, self.nseg, self.nb, self.fs
+        segments, harmonics = self.segments, self.harmonics
+        if not segments:
+            raise ValueError(f"Record ({n} rows) is shorter than one segment")
+        mean = self.total / n
+        f1 = self.f_sum / segments
+        amp = np.sqrt(2.0 * self.harmonic_ms / segments)
+        bins = _welch_bins(harmonics * f1, nseg, fs, nb)
+        freqs = harmonics * f1 if self.track else bins * fs / nseg
+        a1 = float(amp[0])
+        dom = int(np.argmax(self.power_sum[1:])) + 1
+        return WelchStats(
+            name=self.name, samples=n, fs=fs, segments=segments, mean=mean,
+            rms=math.sqrt(self.total_sq / n),
+            stddev=math.sqrt(max(self.total_sq / n - mean * mean, 0.0)),
+            dominant_freq_hz=dom * fs / nseg,
+            fundamental_hz=f1,
+            fundamental_spread_hz=math.sqrt(
+                max(self.f_sq / segments - f1 * f1, 0.0)),
+            fundamental_amplitude=a1,
+            thd=(math.sqrt(float(np.dot(amp[1:], amp[1:]))) / a1 if a1 > 0.0
+                 else 0.0),
+            harmonics=[Harmonic(int(h), float(f), int(k), float(a), 0.0, 0.0,
+                                float(a) / a1 if a1 > 0.0 else 0.0)
+                       for h, f, k, a in zip(harmonics, freqs, bins, amp)],
+            psd=self.power_sum / segments * 2.0 / (fs * self.window_sq),
+        )
+
+
+def welch_channel(name: str, read, n: int, fs: float,
+                  fundamental_hz: float = 50.0, max_harmonic: int = 15,
+                  segment: int = 65536, track: bool = False) -> WelchStats:
+    """
+    Welch statistics for one channel of *n* samples at *fs*.
+
+    ``read(lo, hi)`` returns voltages for samples ``[lo, hi)``; it is
+    called for consecutive runs of about one batch of segments, so peak
+    memory is a few batches of ``segment`` samples whatever *n* is.
+    """
+    acc = _WelchChannel(name, segment, fundamental_hz, max_harmonic, track)
+    if n < acc.nseg:
+        raise ValueError(f"Record ({n} rows) is shorter than one segment")
+    acc.start(fs)
+    chunk = acc.per_batch * acc.step
+    for lo in range(0, n, chunk):
+        acc.feed(read(lo, min(lo + chunk, n)))
+    return acc.finish()
+
+
+def welch_capture(capture: Capture, fundamental_hz: float = 50.0,
+                  max_harmonic: int = 15, segment: int = 65536,
+                  track: bool = False) -> WelchAnalysis:
+    """
+    Welch analysis of every channel at its own sample rate, reading the
+    codes a batch at a time (pass a ``load_archive`` capture to keep a
+    multi-GB record out of RAM).
+    """
+    channels = [welch_channel(wf.channel, wf.voltages, wf.points,
+                              1.0 / wf.xinc, fundamental_hz, max_harmonic,
+                              segment, track)
+                for wf in capture]
+    ref = capture.ref
+    source = str(capture.path) if capture.path else capture.idn or "capture"
+    return WelchAnalysis(source, ref.points, ref.xinc, 1.0 / ref.xinc,
+                         segment, fundamental_hz, max_harmonic, track,
+                         "time_s", 1, channels)
+
+
+def welch_csv(path: Path, fundamental_hz: float = 50.0,
+              max_harmonic: int = 15, segment: int = 65536,
+              track: bool = False) -> WelchAnalysis:
+    """
+    Welch analysis of a CSV streamed as the C++ ``--welch`` mode does:
+    rows are parsed a batch at a time into each channel's pending buffer,
+    so memory does not grow with the file.  dt comes from the first
+    ``_DT_ROWS`` rows; a channel with a non-finite value is dropped.
+    """
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), None)
+        if header is None:
+            raise ValueError("CSV is empty")
+        headers = [h.strip() for h in header]
+        if len(headers) < 2:
+            raise ValueError("Need at least time column + one signal column")
+        time_index = _time_column(headers)
+        chans = {i: _WelchChannel(h, segment, fundamental_hz, max_harmonic,
+                                  track)
+                 for i, h in enumerate(headers)
+                 if i != time_index and h.lower() not in _AUX_HEADERS}
+        lead: list[np.ndarray] = []
+        lead_rows = rows = 0
+        dt = 0.0
+        for block in _csv_batches(f, len(headers)):
+            t = block[time_index]
+            if not np.isfinite(t).all():
+                raise ValueError("Time column contains non-finite values")
+            rows += len(t)
+            if lead_rows < _DT_ROWS:
+                lead.append(t[:_DT_ROWS - lead_rows])
+                lead_rows += len(lead[-1])
+            for i in list(chans):
+                if np.isfinite(block[i]).all():
+                    chans[i].feed(block[i])
+                else:
+                    del chans[i]
+            if not dt and lead_rows == _DT_ROWS:
+                dt = _estimate_dt(np.diff(np.concatenate(lead)))
+                for acc in chans.values():
+                    acc.start(1.0 / dt)
+    if not rows:
+        raise ValueError("No numeric rows found in CSV")
+    if not dt:
+        dt = _estimate_dt(np.diff(np.concatenate(lead)))
+        for acc in chans.values():
+            acc.start(1.0 / dt)
+    if not chans:
+        raise ValueError("No valid numeric signal channels found")
+    channels = [acc.finish() for acc in chans.values()]
+    return WelchAnalysis(str(path), rows, dt, 1.0 / dt, segment,
+                         fundamental_hz, max_harmonic, track,
+                         headers[time_index], time_index, channels)
+
+
+# ── Report ───────────────────────────────────────────────────────────
+
+def _sep(ch: str = "=") -> str:
+    return ch * 90 + "\n"
+
+
+def _f(x: float) -> str:
+    return f"{x:.9f}"
+
+
+def _channel_report(s: ChannelStats) -> str:
+    zc = "n/a" if math.isnan(s.zero_crossing_time) else _f(s.zero_crossing_time)
+    out = [
+        _sep(), f"CHANNEL: {s.name}\n", _sep("-"),
+        f"Mean/DC                     : {_f(s.mean)}\n",
+        f"RMS                         : {_f(s.rms)}\n",
+        f"StdDev                      : {_f(s.stddev)}\n",
+        f"Min                         : {_f(s.minv)}\n",
+        f"Max                         : {_f(s.maxv)}\n",
+        f"Peak-to-peak                : {_f(s.p2p)}\n",
+        f"Crest factor                : {_f(s.crest_factor)}\n",
+        "\n",
+        f"Dominant FFT bin            : {s.dominant_bin}\n",
+        f"Dominant frequency [Hz]     : {_f(s.dominant_freq_hz)}\n",
+        f"Dominant amplitude          : {_f(s.dominant_amplitude)}\n",
+        "\n",
+        f"Target fundamental [Hz]     : {_f(s.fundamental_hz)}\n",
+        f"Fundamental bin             : {s.fundamental_bin}\n",
+        f"Fundamental amplitude       : {_f(s.fundamental_amplitude)}\n",
+        f"Fundamental phase [rad]     : {_f(s.fundamental_phase_rad)}\n",
+        f"Fundamental phase [deg]     : {_f(s.fundamental_phase_deg)}\n",
+        "\n",
+        f"THD                         : {_f(s.thd)}\n",
+        f"Total spectral energy       : {_f(s.total_spectral_energy)}\n",
+        f"Harmonic energy (2..N)      : {_f(s.harmonic_energy)}\n",
+        f"Fundamental energy ratio    : {_f(s.fundamental_energy_ratio)}\n",
+        "\n",
+        f"Sine residual RMS           : {_f(s.sine_residual_rms)}\n",
+        f"Residual / signal RMS       : {_f(s.sine_residual_to_signal_rms)}\n",
+        f"Residual / signal StdDev    : {_f(s.sine_residual_to_signal_std)}\n",
+        "\n",
+        f"First rising zero-cross [s] : {zc}\n",
+        "\n",
+        "HARMONICS\n", _sep("."),
+        f"H  {'Freq[Hz]':>14}{'Bin':>12}{'Amplitude':>18}{'Phase[deg]':>18}"
+        f"{'Rel/Fund':>18}\n",
+    ]
+    out += [f"{h.harmonic:>2}{_f(h.freq_hz):>14}{h.fft_bin:>12}"
+            f"{_f(h.amplitude):>18}{_f(h.phase_deg):>18}"
+            f"{_f(h.rel_to_fundamental):>18}\n" for h in s.harmonics]
+    out.append("\n")
+    return "".join(out)
+
+
+def _pair_report(p: PairStats) -> str:
+    return "".join([
+        _sep(), f"PAIR: {p.a}  <->  {p.b}\n", _sep("-"),
+        f"Pearson correlation         : {_f(p.pearson_correlation)}\n",
+        f"Normalized dot              : {_f(p.normalized_dot)}\n",
+        f"Amplitude ratio A/B         : {_f(p.amplitude_ratio)}\n",
+        "\n",
+        f"Phase diff [rad]            : {_f(p.phase_diff_rad)}\n",
+        f"Phase diff [deg]            : {_f(p.phase_diff_deg)}\n",
+        f"Time shift [s]              : {_f(p.time_shift_sec)}\n",
+        f"Time shift [us]             : {_f(p.time_shift_us)}\n",
+        "\n",
+        f"Best cross-corr lag [samp]  : {p.best_lag_samples}\n",
+        f"Best cross-corr lag [s]     : {_f(p.best_lag_sec)}\n",
+        f"Best cross-corr lag [us]    : {_f(p.best_lag_us)}\n",
+        f"Best cross-corr score       : {_f(p.best_lag_correlation)}\n",
+        f"Refined lag [samp]          : {_f(p.refined_lag_samples)}\n",
+        f"Refined lag [us]            : {_f(p.refined_lag_us)}\n",
+        f"Aligned correlation         : {_f(p.aligned_correlation)}\n",
+        "\n",
+        f"Harmonic similarity         : {_f(p.harmonic_similarity)}\n",
+        f"Residual correlation        : {_f(p.residual_correlation)}\n",
+        "\n",
+    ])
+
+
+def _verdict(p: PairStats) -> str:
+    if (abs(p.phase_diff_deg) < 2.0 and p.aligned_correlation > 0.98
+            and p.harmonic_similarity > 0.9):
+        return "very similar waveform and nearly phase aligned"
+    if p.aligned_correlation > 0.9 and p.harmonic_similarity > 0.8:
+        return "similar shape, possible moderate phase/amplitude offset"
+    return "waveform family likely different or strongly distorted"
+
+
+def format_report(an: Analysis, output: str = "") -> str:
+    """The ``scope_analyzer.cpp`` log for *an*, line for line."""
+    out = [
+        _sep(), "OSCILLOSCOPE CSV ANALYSIS REPORT\n", _sep(),
+        f"Input file                  : {an.source}\n",
+        f"Output log                  : {output}\n",
+        f"Generated                   : "
+        f"{datetime.now().isoformat(timespec='seconds')}\n",
+        "\n",
+        f"Rows                        : {an.rows}\n",
+        f"Duration [s]                : {_f(an.duration)}\n",
+        f"Estimated dt [s]            : {_f(an.dt)}\n",
+        f"Estimated Fs [Hz]           : {_f(an.fs)}\n",
+        f"Target fundamental [Hz]     : {_f(an.fundamental_hz)}\n",
+        f"Max harmonic                : {an.max_harmonic}\n",
+        f"Time column                 : {an.time_column} "
+        f"(column {an.time_index})\n",
+        f"Signal channels             : {len(an.channels)}\n",
+        "\n",
+        _sep(), "CHANNEL LIST\n", _sep("-"),
+        *(f" - {ch.name}\n" for ch in an.channels),
+        "\n",
+        *(_channel_report(ch) for ch in an.channels),
+        _sep(), "PAIRWISE ANALYSIS\n", _sep(),
+        *(_pair_report(p) for p in an.pairs),
+        _sep(), "SUMMARY HINTS\n", _sep("-"),
+    ]
+    for p in an.pairs:
+        out += [
+            f"{p.a} vs {p.b}:\n",
+            f"  Phase diff [deg]          : {_f(p.phase_diff_deg)}\n",
+            f"  Time shift [us]           : {_f(p.time_shift_us)}\n",
+            f"  Pearson corr              : {_f(p.pearson_correlation)}\n",
+            f"  Aligned corr              : {_f(p.aligned_correlation)}\n",
+            f"  Harmonic similarity       : {_f(p.harmonic_similarity)}\n",
+            f"  Residual correlation      : {_f(p.residual_correlation)}\n",
+            f"  Verdict                   : {_verdict(p)}\n",
+            "\n",
+        ]
+    return "".join(out)
+
+
+def write_report(an: Analysis, path: Path) -> Path:
+    path = Path(path)
+    path.write_text(format_report(an, str(path)))
+    return path
+
+
+def _welch_channel_report(s: WelchStats) -> str:
+    out = [
+        _sep(), f"CHANNEL: {s.name}\n", _sep("-"),
+        f"Samples                     : {s.samples}\n",
+        f"Sample rate [Hz]            : {_f(s.fs)}\n",
+        f"Segments                    : {s.segments}\n",
+        f"Mean/DC                     : {_f(s.mean)}\n",
+        f"RMS                         : {_f(s.rms)}\n",
+        f"StdDev                      : {_f(s.stddev)}\n",
+        "\n",
+        f"Dominant frequency [Hz]     : {_f(s.dominant_freq_hz)}\n",
+        f"Fundamental [Hz]            : {_f(s.fundamental_hz)}\n",
+        f"Fundamental spread [Hz]     : {_f(s.fundamental_spread_hz)}\n",
+        f"Fundamental amplitude       : {_f(s.fundamental_amplitude)}\n",
+        f"THD                         : {_f(s.thd)}\n",
+        "\n",
+        "HARMONICS\n", _sep("."),
+        f"H  {'Freq[Hz]':>14}{'Bin':>12}{'Amplitude':>18}{'Rel/Fund':>18}\n",
+    ]
+    out += [f"{h.harmonic:>2}{_f(h.freq_hz):>14}{h.fft_bin:>12}"
+            f"{_f(h.amplitude):>18}{_f(h.rel_to_fundamental):>18}\n"
+            for h in s.harmonics]
+    out.append("\n")
+    return "".join(out)
+
+
+def format_welch_report(an: WelchAnalysis, output: str = "") -> str:
+    """The ``scope_analyzer --welch`` log for *an*, line for line."""
+    return "".join([
+        _sep(), "OSCILLOSCOPE WELCH SPECTRAL REPORT\n", _sep(),
+        f"Input file                  : {an.source}\n",
+        f"Output log                  : {output}\n",
+        f"Generated                   : "
+        f"{datetime.now().isoformat(timespec='seconds')}\n",
+        "\n",
+        f"Rows                        : {an.rows}\n",
+        f"Estimated dt [s]            : {_f(an.dt)}\n",
+        f"Estimated Fs [Hz]           : {_f(an.fs)}\n",
+        f"Segment length              : {an.segment}\n",
+        f"Segment step                : {an.segment - an.segment // 2}\n",
+        "Window                      : hann\n",
+        f"Frequency resolution [Hz]   : {_f(an.fs / an.segment)}\n",
+        f"Target fundamental [Hz]     : {_f(an.fundamental_hz)}\n",
+        f"Max harmonic                : {an.max_harmonic}\n",
+        f"Fundamental tracking        : {'on' if an.track else 'off'}\n",
+        f"Time column                 : {an.time_column} "
+        f"(column {an.time_index})\n",
+        f"Signal channels             : {len(an.channels)}\n",
+        "\n",
+        *(_welch_channel_report(ch) for ch in an.channels),
+    ])
+
+
+def write_welch_report(an: WelchAnalysis, path: Path) -> Path:
+    path = Path(path)
+    path.write_text(format_welch_report(an, str(path)))
+    return path
+
+
+# ── Cross-check ──────────────────────────────────────────────────────
+
+# Header lines that legitimately differ between two runs.
+_COMPARE_SKIP = {"Input file", "Output log", "Generated"}
+
+
+def _parse_report(text: str) -> dict[tuple[str, str], str]:
+    """``(section, label) -> value`` for every value line of a report."""
+    values = {}
+    section = ""
+    row = 0          # harmonic rows seen in the current HARMONICS table
+    names: list[str] = []
+    for line in text.splitlines():
+        if line.startswith(("CHANNEL: ", "PAIR: ")):
+            section, row = line, 0
+        elif line.startswith("H  "):
+            names = line.split()[1:]
+        elif line.endswith(":") and " vs " in line:
+            section = line
+        elif " : " in line:
+            label, value = line.split(" : ", 1)
+            values[(section, label.strip())] = value.strip()
+        elif line[:2].strip().isdigit() and section.startswith("CHANNEL"):
+            # Fixed-width columns can run together (``setw(2)`` harmonic
+            # number then a 15-character frequency), so rows are numbered
+            # by position and a fused leading field is split by that.
+            row += 1
+            cols = line.split()
+            if len(cols) == len(names):
+                cols = [str(row), cols[0][len(str(row)):], *cols[1:]]
+            for name, v in zip(names, cols[1:]):
+                values[(section, f"H{row} {name}")] = v
+    return values
+
+
+def compare_reports(a: str, b: str, rtol: float = 1e-6,
+                    atol: float = 1e-9) -> list[str]:
+    """
+    Numerically diff two analysis reports; returns the mismatching lines.
+
+    Numbers match when ``|x - y| <= atol + rtol * max(|x|, |y|)``; other
+    values (channel names, verdicts, ``n/a``) must be identical.
+    """
+    va, vb = _parse_report(a), _parse_report(b)
+    problems = []
+    for key in sorted(va.keys() | vb.keys()):
+        if key[1] in _COMPARE_SKIP:
+            continue
+        x, y = va.get(key), vb.get(key)
+        where = f"{key[0] or 'header'} / {key[1]}"
+        if x is None or y is None:
+            problems.append(f"{where}: only in {'b' if x is None else 'a'}")
+            continue
+        try:
+            fx, fy = float(x), float(y)
+        except ValueError:
+            if x != y:
+                problems.append(f"{where}: {x!r} != {y!r}")
+            continue
+        if fx == fy or (math.isnan(fx) and math.isnan(fy)):
+            continue
+        if not abs(fx - fy) <= atol + rtol * max(abs(fx), abs(fy)):
+            problems.append(f"{where}: {x} != {y}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("input", type=Path,
+                    help="capture directory / _capture.json, or a CSV")
+    ap.add_argument("output", type=Path)
+    ap.add_argument("fundamental_hz", type=float, nargs="?", default=50.0)
+    ap.add_argument("max_harmonic", type=int, nargs="?", default=15)
+    ap.add_argument("--welch", type=int, metavar="SEGMENT", default=None,
+                    help="segmented Welch spectrum with this segment length "
+                         "(bounded memory, for very long records)")
+    ap.add_argument("--track", action="store_true",
+                    help="with --welch: follow the fundamental per segment")
+    ap.add_argument("--compare", action="store_true",
+                    help="diff the two reports given as input and output")
+    ap.add_argument("--rtol", type=float, default=1e-6)
+    ap.add_argument("--atol", type=float, default=1e-9)
+    a = ap.parse_args()
+
+    if a.compare:
+        problems = compare_reports(a.input.read_text(), a.output.read_text(),
+                                   a.rtol, a.atol)
+        for p in problems:
+            print(p)
+        print(f"{len(problems)} mismatch(es) between {a.input} and {a.output}")
+        sys.exit(1 if problems else 0)
+
+    if a.welch is not None:
+        args = (a.fundamental_hz, a.max_harmonic, a.welch, a.track)
+        an = (welch_csv(a.input, *args) if a.input.suffix.lower() == ".csv"
+              else welch_capture(load_archive(a.input), *args))
+        print(f"Analysis complete. Log written to: "
+              f"{write_welch_report(an, a.output)}")
+        return
+
+    if a.input.suffix.lower() == ".csv":
+        an = analyze_csv(a.input, a.fundamental_hz, a.max_harmonic)
+    else:
+        an = analyze_capture(load_archive(a.input), a.fundamental_hz,
+                             a.max_harmonic)
+    print(f"Analysis complete. Log written to: {write_report(an, a.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Simulated Rigol DHO800/DHO900 for offline testing and benchmarking.
+
+Speaks SCPI over a plain TCP socket, the same protocol as the scope's
+raw socket port (5555), so ``download1.py`` can target it with
+``IP = "127.0.0.1:5555"``.  Implements the commands the scripts use:
+
+    *IDN?  *OPC?  *RST
+    :RUN  :STOP  :SING  :TRIG:STAT?
+    :ACQ:MDEP?
+    :WAV:SOUR  :WAV:MODE  :WAV:FORM  :WAV:POIN  :WAV:STAR  :WAV:STOP
+    (each also as a query), :WAV:PRE?  :WAV:DATA?
+    :SYST:ERR?
+    :DISP:DATA? PNG
+    :CHANn:SCAL?  :CHANn:OFFS?  :TIM:SCAL?
+
+Long and short SCPI keyword forms are accepted, as are several commands
+joined with ``;`` in one line.
+
+Waveforms are synthetic (sine / square / triangle / noise per channel,
+optional single-sample glitches) with a 12-bit ADC; BYTE reads return
+the top 8 bits, WORD reads the full 12-bit code as little-endian
+``uint16``.  Link speed is modelled with a per-query latency and a
+bulk bandwidth limit.
+
+With ``quirk=True`` the WAV state-leak described in the README is
+reproduced: after a RAW read, switching ``:WAV:SOUR`` without first
+cycling ``:WAV:MODE NORMal`` truncates the next channel to
+``depth // quirk_divisor`` points, with no SCPI error.  ``settle``
+additionally makes the preamble / ``:WAV:POIN?`` report the truncated
+count for that many seconds after ``:WAV:MODE RAW``.
+
+Usage:
+    python scope_sim.py [--port 5555] [--depth 1000000] [--quirk] ...
+"""
+
+import argparse
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Long → short SCPI keyword forms for the headers we implement.
+_SHORT = {
+    "WAVEFORM": "WAV", "SOURCE": "SOUR", "FORMAT": "FORM", "POINTS": "POIN",
+    "START": "STAR", "PREAMBLE": "PRE", "ACQUIRE": "ACQ", "MDEPTH": "MDEP",
+    "SYSTEM": "SYST", "ERROR": "ERR", "DISPLAY": "DISP", "TRIGGER": "TRIG",
+    "STATUS": "STAT", "SINGLE": "SING", "CHANNEL": "CHAN", "SCALE": "SCAL",
+    "OFFSET": "OFFS", "TIMEBASE": "TIM", "NORMAL": "NORM", "MAXIMUM": "MAX",
+}
+_CHANNELS = ("CHAN1", "CHAN2", "CHAN3", "CHAN4")
+_SIGNALS = ("sine", "square", "triangle", "noise")
+_NORMAL_POINTS = 1000
+_ADC_BITS = 12
+
+
+def _short(word: str) -> str:
+    word = word.upper()
+    for long, short in _SHORT.items():
+        if word == long or word == short:
+            return short
+    m = word.rstrip("0123456789")
+    if m != word and m in _SHORT:         # e.g. CHANNEL1 -> CHAN1
+        return _SHORT[m] + word[len(m):]
+    return word
+
+
+def _tiny_png() -> bytes:
+    """A valid 1×1 grey PNG, standing in for the screen capture."""
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(
+            ">I", zlib.crc32(body) & 0xFFFFFFFF)
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(b"\x00\x80"))
+            + chunk(b"IEND", b""))
+
+
+@dataclass
+class SimConfig:
+    depth: int = 1_000_000          # points per channel (:ACQ:MDEP?)
+    srate: float = 1e9              # samples/s
+    freq: float = 10e3              # signal frequency, Hz
+    signals: tuple = _SIGNALS       # one per channel
+    noise: float = 4.0              # RMS noise in 12-bit codes
+    glitches: int = 3               # single-sample spikes per channel
+    vdiv: float = 1.0               # V/div (8 vertical divisions)
+    latency: float = 0.0            # seconds added to every query
+    bandwidth: float = 0.0          # bulk bytes/s (0 = unlimited)
+    max_chunk_bytes: int = 1_000_000
+    quirk: bool = False
+    quirk_divisor: int = 4
+    settle: float = 0.0
+    trigger_delay: float = 0.05     # :SING -> stopped
+    seed: int = 0
+    idn: str = "RIGOL TECHNOLOGIES,DHO924S,SIM000000,00.01.02"
+
+
+@dataclass
+class _State:
+    source: str = "CHAN1"
+    mode: str = "NORM"
+    fmt: str = "BYTE"
+    points: int = _NORMAL_POINTS
+    start: int = 1
+    stop: int = _NORMAL_POINTS
+    run: str = "RUN"                # RUN / STOP / WAIT (armed single)
+    armed_at: float = 0.0
+    raw_since: float = 0.0
+    dirty: bool = False             # a RAW read happened since last NORM
+    truncated: set = field(default_factory=set)
+    errors: list = field(default_factory=list)
+    acquisition: int = 0
+
+
+class SimulatedScope:
+    """Instrument state machine; one instance per simulated scope."""
+
+    def __init__(self, cfg: SimConfig):
+        self.cfg = cfg
+        self.st = _State()
+        self.lock = threading.Lock()
+        self.stats = {"queries": 0, "writes": 0, "bytes": 0}
+        self._codes: dict[str, np.ndarray] = {}
+        self._png = _tiny_png()
+
+    # ── Synthetic data ───────────────────────────────────────────────
+
+    def _adc(self, channel: str) -> np.ndarray:
+        """12-bit codes for *channel* of the current acquisition."""
+        codes = self._codes.get(channel)
+        if codes is not None:
+            return codes
+        cfg = self.cfg
+        k = _CHANNELS.index(channel)
+        rng = np.random.default_rng((cfg.seed, self.st.acquisition, k))
+        n = cfg.depth
+        phase = 2 * np.pi * (np.arange(n) * (cfg.freq / cfg.srate)) + k * np.pi / 6
+        kind = cfg.signals[k % len(cfg.signals)]
+        if kind == "sine":
+            x = np.sin(phase)
+        elif kind == "square":
+            x = np.sign(np.sin(phase))
+        elif kind == "triangle":
+            x = 2 / np.pi * np.arcsin(np.sin(phase))
+        else:
+            x = np.zeros(n)
+        full = (1 << _ADC_BITS) - 1
+        amp = 0.35 * full * (1 - 0.1 * k)
+        y = full / 2 + amp * x + rng.normal(0, cfg.noise, n)
+        if cfg.glitches and n:
+            y[rng.integers(0, n, cfg.glitches)] = rng.choice((0, full),
+                                                             cfg.glitches)
+        codes = np.clip(np.rint(y), 0, full).astype(np.uint16)
+        self._codes[channel] = codes
+        return codes
+
+    def _effective_depth(self) -> int:
+        st, cfg = self.st, self.cfg
+        if st.mode != "RAW":
+            return _NORMAL_POINTS
+        settling = time.monotonic() - st.raw_since < cfg.settle
+        if cfg.quirk and (st.source in st.truncated or settling):
+            return max(1, cfg.depth // cfg.quirk_divisor)
+        return cfg.depth
+
+    def _preamble(self) -> str:
+        st, cfg = self.st, self.cfg
+        pts = min(st.points, self._effective_depth())
+        word = st.fmt == "WORD"
+        levels = 1 << (_ADC_BITS if word else 8)
+        yinc = cfg.vdiv * 8 / levels
+        xinc = 1 / cfg.srate
+        if st.mode != "RAW":
+            xinc *= cfg.depth / _NORMAL_POINTS
+        xorig = -cfg.depth / cfg.srate / 2
+        fmt = 1 if word else 0
+        typ = {"NORM": 0, "MAX": 1, "RAW": 2}[st.mode]
+        return (f"{fmt},{typ},{pts},1,{xinc:.6e},{xorig:.6e},0,"
+                f"{yinc:.6e},0,{levels // 2}")
+
+    def _data(self) -> bytes:
+        st, cfg = self.st, self.cfg
+        codes = self._adc(st.source)
+        if st.mode != "RAW":
+            idx = np.linspace(0, cfg.depth - 1, _NORMAL_POINTS).astype(np.int64)
+            sel = codes[idx]
+        else:
+            pts = min(st.points, self._effective_depth())
+            lo = max(st.start, 1) - 1
+            hi = min(st.stop, pts)
+            width = 2 if st.fmt == "WORD" else 1
+            hi = min(hi, lo + cfg.max_chunk_bytes // width)
+            sel = codes[lo:max(lo, hi)]
+            st.dirty = True
+        if st.fmt == "WORD":
+            return sel.astype("<u2").tobytes()
+        return (sel >> (_ADC_BITS - 8)).astype(np.uint8).tobytes()
+
+    # ── Command dispatch ─────────────────────────────────────────────
+
+    def handle(self, line: str):
+        """Execute one line; return the response (str / bytes) or None."""
+        reply = None
+        with self.lock:
+            for cmd in line.split(";"):
+                cmd = cmd.strip()
+                if cmd:
+                    r = self._one(cmd)
+                    if r is not None:
+                        reply = r
+        return reply
+
+    def _err(self, code: int, msg: str):
+        self.st.errors.append(f'{code},"{msg}"')
+
+    def _one(self, cmd: str):
+        st, cfg = self.st, self.cfg
+        head, _, arg = cmd.partition(" ")
+        arg = arg.strip()
+        query = head.endswith("?")
+        key = ":".join(_short(p) for p in head.rstrip("?").strip(":").split(":"))
+        if query:
+            self.stats["queries"] += 1
+        else:
+            self.stats["writes"] += 1
+
+        if key == "*IDN":
+            return cfg.idn
+        if key == "*OPC":
+            return "1" if query else None
+        if key == "*RST":
+            self.st = _State()
+            return None
+        if key in ("RUN", "STOP", "SING"):
+            self._trigger(key)
+            return None
+        if key == "TRIG:STAT":
+            self._poll_trigger()
+            return st.run
+        if key == "ACQ:MDEP":
+            return str(cfg.depth) if query else None
+        if key == "SYST:ERR":
+            return st.errors.pop(0) if st.errors else '0,"No error"'
+        if key == "DISP:DATA":
+            return self._png
+        if key == "TIM:SCAL":
+            return f"{cfg.depth / cfg.srate / 10:.6e}"
+        if key.startswith("CHAN") and key.endswith(":SCAL"):
+            return f"{cfg.vdiv:.6e}"
+        if key.startswith("CHAN") and key.endswith(":OFFS"):
+            return "0.000000e+00"
+        if key.startswith("WAV:"):
+            return self._wav(key[4:], arg, query)
+        self._err(-113, "Undefined header")
+        return None
+
+    def _wav(self, key: str, arg: str, query: bool):
+        st, cfg = self.st, self.cfg
+        if key == "PRE":
+            return self._preamble()
+        if key == "DATA":
+            return self._data()
+        if key == "SOUR":
+            if query:
+                return st.source
+            src = _short(arg)
+            if src not in _CHANNELS:
+                self._err(-224, "Illegal parameter value")
+            elif src != st.source:
+                if cfg.quirk and st.dirty:
+                    st.truncated.add(src)
+                st.source = src
+            return None
+        if key == "MODE":
+            if query:
+                return st.mode
+            mode = _short(arg)
+            if mode not in ("NORM", "MAX", "RAW"):
+                self._err(-224, "Illegal parameter value")
+                return None
+            if mode == "NORM":
+                st.dirty = False
+                st.truncated.clear()
+            if mode == "RAW" and st.mode != "RAW":
+                st.raw_since = time.monotonic()
+            st.mode = mode
+            return None
+        if key == "FORM":
+            if query:
+                return st.fmt
+            fmt = arg.upper()
+            if fmt not in ("BYTE", "WORD", "ASC", "ASCII"):
+                self._err(-224, "Illegal parameter value")
+            else:
+                st.fmt = fmt
+            return None
+        if key in ("POIN", "STAR", "STOP"):
+            attr = {"POIN": "points", "STAR": "start", "STOP": "stop"}[key]
+            if query:
+                if key == "POIN":
+                    return str(min(st.points, self._effective_depth()))
+                return str(getattr(st, attr))
+            try:
+                val = int(float(arg))
+            except ValueError:
+                self._err(-224, "Illegal parameter value")
+                return None
+            if val < 1 or (key == "POIN" and val > cfg.depth):
+                self._err(-222, "Data out of range")
+                return None
+            setattr(st, attr, val)
+            return None
+        self._err(-113, "Undefined header")
+        return None
+
+    def _trigger(self, key: str):
+        st = self.st
+        if key == "STOP":
+            st.run = "STOP"
+            return
+        st.run = "RUN" if key == "RUN" else "WAIT"
+        st.armed_at = time.monotonic()
+        self._new_acquisition()
+
+    def _poll_trigger(self):
+        st = self.st
+        if st.run == "WAIT" and time.monotonic() - st.armed_at >= self.cfg.trigger_delay:
+            st.run = "STOP"
+
+    def _new_acquisition(self):
+        self.st.acquisition += 1
+        self._codes.clear()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        scope: SimulatedScope = self.server.scope
+        cfg = scope.cfg
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for raw in self.rfile:
+            line = raw.decode("ascii", "replace").strip()
+            if not line:
+                continue
+            reply = scope.handle(line)
+            if reply is None:
+                continue
+            if cfg.latency:
+                time.sleep(cfg.latency)
+            if isinstance(reply, bytes):
+                n = str(len(reply))
+                payload = b"#" + str(len(n)).encode() + n.encode() + reply + b"\n"
+                scope.stats["bytes"] += len(reply)
+                if cfg.bandwidth:
+                    time.sleep(len(payload) / cfg.bandwidth)
+            else:
+                payload = reply.encode() + b"\n"
+            self.wfile.write(payload)
+
+
+class SimServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, cfg: SimConfig, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.scope = SimulatedScope(cfg)
+
+    @property
+    def address(self) -> str:
+        """``host:port`` string accepted by ``download1._open_scope``."""
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+
+def serve_in_thread(cfg: SimConfig | None = None, host: str = "127.0.0.1",
+                    port: int = 0) -> SimServer:
+    """Start a simulator on a background thread (port 0 = pick a free one)."""
+    server = SimServer(cfg or SimConfig(), host, port)
+    threading.Thread(target=server.serve_forever, name="scope-sim",
+                     daemon=True).start()
+    return server
+
+
+def _parse_args(argv=None) -> tuple[argparse.Namespace, SimConfig]:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5555)
+    d = SimConfig()
+    ap.add_argument("--depth", type=int, default=d.depth)
+    ap.add_argument("--srate", type=float, default=d.srate)
+    ap.add_argument("--freq", type=float, default=d.freq)
+    ap.add_argument("--signals", default=",".join(d.signals),
+                    help="comma-separated, one per channel: " + ", ".join(_SIGNALS))
+    ap.add_argument("--noise", type=float, default=d.noise)
+    ap.add_argument("--glitches", type=int, default=d.glitches)
+    ap.add_argument("--latency", type=float, default=d.latency,
+                    help="seconds per query round-trip")
+    ap.add_argument("--bandwidth", type=float, default=d.bandwidth,
+                    help="bulk data rate in bytes/s (0 = unlimited)")
+    ap.add_argument("--max-chunk-bytes", type=int, default=d.max_chunk_bytes)
+    ap.add_argument("--quirk", action="store_true",
+                    help="reproduce the WAV state-leak truncation")
+    ap.add_argument("--quirk-divisor", type=int, default=d.quirk_divisor)
+    ap.add_argument("--settle", type=float, default=d.settle)
+    ap.add_argument("--seed", type=int, default=d.seed)
+    a = ap.parse_args(argv)
+    cfg = SimConfig(
+        depth=a.depth, srate=a.srate, freq=a.freq,
+        signals=tuple(a.signals.split(",")), noise=a.noise,
+        glitches=a.glitches, latency=a.latency, bandwidth=a.bandwidth,
+        max_chunk_bytes=a.max_chunk_bytes, quirk=a.quirk,
+        quirk_divisor=a.quirk_divisor, settle=a.settle, seed=a.seed,
+    )
+    return a, cfg
+
+
+def main():
+    a, cfg = _parse_args()
+    server = SimServer(cfg, a.host, a.port)
+    print(f"Simulated {cfg.idn.split(',')[1]} on {server.address} "
+          f"(depth {cfg.depth:,}, quirk {'on' if cfg.quirk else 'off'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Minimal SCPI-over-TCP transport for the scope's raw socket port.
+
+``SocketInstrument`` covers the subset of the PyVISA resource API that
+``download1`` uses (``write``, ``query``, ``query_binary_values``,
+``timeout``, ``close``) and adds ``read_block_into()``, which parses the
+IEEE 488.2 ``#N<len>`` block header itself and ``recv_into``s the payload
+straight into a caller-supplied buffer — for ``:WAV:DATA?`` that is a
+slice of the channel's preallocated code array, so a bulk read makes no
+intermediate ``bytes`` objects at all.
+
+Rigol DHO800/DHO900 scopes listen on port 5555; ``scope_sim.py`` speaks
+the same protocol.
+"""
+
+import socket
+
+import numpy as np
+
+DEFAULT_PORT = 5555
+
+
+class SocketInstrument:
+    """
+    One SCPI session on a plain TCP socket, newline terminated.
+
+    ``timeout`` is in milliseconds, as on a PyVISA resource.  Text replies
+    and block headers are parsed from a small internal buffer; block
+    payloads bypass it once the header has been consumed.
+    """
+
+    def __init__(self, host: str, port: int = DEFAULT_PORT,
+                 timeout: int = 180_000, rcvbuf: int = 4 << 20):
+        self._sock = socket.create_connection((host, port), timeout / 1000)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self._buf = bytearray()
+        self._timeout = timeout
+        self.address = f"{host}:{port}"
+
+    def __repr__(self) -> str:
+        return f"SocketInstrument({self.address!r})"
+
+    @property
+    def timeout(self) -> int:
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, ms: int):
+        self._timeout = ms
+        self._sock.settimeout(None if ms is None else ms / 1000)
+
+    def close(self):
+        self._sock.close()
+
+    # ── Text I/O ─────────────────────────────────────────────────────
+
+    def write(self, cmd: str):
+        self._sock.sendall(cmd.encode("ascii") + b"\n")
+
+    def _fill(self, need: int = 1):
+        """Receive until the internal buffer holds at least *need* bytes."""
+        while len(self._buf) < need:
+            data = self._sock.recv(65536)
+            if not data:
+                raise ConnectionError(f"{self.address}: connection closed")
+            self._buf += data
+
+    def _take(self, n: int) -> bytes:
+        self._fill(n)
+        out = bytes(self._buf[:n])
+        del self._buf[:n]
+        return out
+
+    def read(self) -> str:
+        while True:
+            nl = self._buf.find(b"\n")
+            if nl >= 0:
+                break
+            self._fill(len(self._buf) + 1)
+        line = bytes(self._buf[:nl])
+        del self._buf[:nl + 1]
+        return line.decode("ascii", "replace").rstrip("\r")
+
+    def query(self, cmd: str) -> str:
+        self.write(cmd)
+        return self.read()
+
+    # ── Binary blocks ────────────────────────────────────────────────
+
+    def _block_header(self) -> int:
+        """Consume a ``#N<len>`` header and return the payload length."""
+        self._fill(2)
+        while self._buf[:1] != b"#":
+            # Skip stray whitespace / terminators left before the block.
+            if self._buf[:1] not in (b"\n", b"\r", b" "):
+                raise ValueError(f"{self.address}: expected '#' block, got "
+                                 f"{bytes(self._buf[:16])!r}")
+            del self._buf[:1]
+            self._fill(2)
+        ndigits = self._buf[1] - ord("0")
+        if not 1 <= ndigits <= 9:
+            raise ValueError(f"{self.address}: unsupported block header "
+                             f"{bytes(self._buf[:2])!r}")
+        return int(self._take(2 + ndigits)[2:])
+
+    def _recv_exact(self, view: memoryview):
+        """Fill *view* completely, first from the buffer, then the socket."""
+        pos = min(len(self._buf), len(view))
+        if pos:
+            view[:pos] = self._buf[:pos]
+            del self._buf[:pos]
+        while pos < len(view):
+            n = self._sock.recv_into(view[pos:])
+            if not n:
+                raise ConnectionError(f"{self.address}: connection closed")
+            pos += n
+
+    def _end_block(self, expect_termination: bool):
+        if expect_termination:
+            self._fill(1)
+            if self._buf[:1] == b"\n":
+                del self._buf[:1]
+
+    def read_block_into(self, cmd: str, out, expect_termination: bool = True) -> int:
+        """
+        Send *cmd* and receive its block reply into *out* (any writable
+        contiguous buffer, e.g. a NumPy slice).
+
+        Returns the payload length the instrument declared.  If that
+        exceeds ``len(out)`` in bytes, the excess is read and discarded so
+        the session stays in sync; the caller decides whether a length
+        mismatch is an error.
+        """
+        self.write(cmd)
+        n = self._block_header()
+        view = memoryview(out).cast("B")
+        self._recv_exact(view[:n])
+        if n > len(view):
+            self._recv_exact(memoryview(bytearray(n - len(view))))
+        self._end_block(expect_termination)
+        return n
+
+    def query_binary_values(self, cmd: str, datatype: str = "B",
+                            is_big_endian: bool = False, container=list,
+                            header_fmt: str = "ieee",
+                            expect_termination: bool = True, **_):
+        """PyVISA-compatible block query for the occasional small reply."""
+        if header_fmt != "ieee":
+            raise ValueError(f"unsupported header format {header_fmt!r}")
+        self.write(cmd)
+        buf = bytearray(self._block_header())
+        self._recv_exact(memoryview(buf))
+        self._end_block(expect_termination)
+        if container is bytes or container is bytearray:
+            return container(buf)
+        dtype = np.dtype(datatype).newbyteorder(">" if is_big_endian else "<")
+        values = np.frombuffer(buf, dtype)
+        if container is np.ndarray:
+            return values
+        return container(values.tolist())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks and regression checks for download1.py against the
+simulated scope in scope_sim.py — no hardware needed.
+
+Checks run:
+  throughput   download every channel through _read_channel_raw and
+               report MB/s, seconds per channel and SCPI round-trips
+               for each --transport (PyVISA vs raw socket) and --format
+               (BYTE vs WORD), batched and (with --strict) one command
+               per write
+  workaround   with the WAV state-leak quirk enabled, confirm that
+               _reset_wav_subsystem() + _settle_wav() yield full-length
+               records (waiting out the simulated settle window) and
+               that a naive source switch reproduces the truncation
+
+Exits non-zero if the workaround check fails, so it can gate changes to
+the reset sequence.
+
+Usage:
+    python sim_bench.py [--depth 1000000] [--bandwidth 0] [--latency 0]
+                        [--settle 0.1] [--reset-pause S] [--strict]
+                        [--transport visa,socket] [--format BYTE,WORD]
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import download1
+from scope_sim import SimConfig, serve_in_thread
+
+
+@contextlib.contextmanager
+def _session(cfg: SimConfig, strict: bool = False, transport: str = "visa"):
+    """Simulator + open ``_ScpiLink`` session; yields (server, scope)."""
+    server = serve_in_thread(cfg)
+    rm, visa = download1._open_scope(server.address, transport)
+    scope = download1._ScpiLink(visa, strict=strict)
+    try:
+        yield server, scope
+    finally:
+        scope.close()
+        if rm is not None:
+            rm.close()
+        server.shutdown()
+        server.server_close()
+
+
+def _quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def bench_throughput(cfg: SimConfig, channels: list[str],
+                     strict: bool = False, transport: str = "visa") -> dict:
+    with _session(cfg, strict, transport) as (server, scope):
+        per_channel = {}
+        t0 = time.perf_counter()
+        for ch in channels:
+            t = time.perf_counter()
+            wf = _quiet(download1._read_channel_raw, scope, ch, cfg.depth)
+            per_channel[ch] = (wf.points, time.perf_counter() - t)
+        total = time.perf_counter() - t0
+        stats = dict(server.scope.stats)
+        stats["round_trips"] = scope.writes + scope.queries
+    nbytes = (sum(p for p, _ in per_channel.values())
+              * download1._WAV_DTYPES[download1.WAV_FORMAT].itemsize)
+    label = (f"{transport}, {download1.WAV_FORMAT}, "
+             f"{'strict' if strict else 'batched'}")
+    print(f"throughput ({label}): {len(channels)} × {cfg.depth:,} pts in "
+          f"{total:.2f} s = {nbytes / total / 1e6:.2f} MB/s "
+          f"({stats['round_trips']} round-trips, {stats['queries']} queries, "
+          f"{stats['writes']} commands)")
+    for ch, (pts, dt) in per_channel.items():
+        print(f"  {ch}: {pts:,} pts, {dt:.2f} s")
+    return {"seconds": total, "bytes": nbytes, **stats}
+
+
+def _naive_read(scope, channel: str, memory_depth: int):
+    """Switch source without the reset cycle (what the quirk punishes)."""
+    scope.write(f":WAV:SOUR {channel}")
+    scope.write(":WAV:MODE RAW")
+    scope.write(":WAV:FORM BYTE")
+    scope.write(f":WAV:POIN {memory_depth}")
+    return int(scope.query(":WAV:POIN?"))
+
+
+def check_workaround(cfg: SimConfig, channels: list[str]) -> bool:
+    cfg = SimConfig(**{**cfg.__dict__, "quirk": True})
+    with _session(cfg) as (_, scope):
+        got = {ch: _quiet(download1._read_channel_raw, scope, ch, cfg.depth).points
+               for ch in channels}
+        ok = all(p == cfg.depth for p in got.values())
+        print(f"workaround: reset sequence -> {got} "
+              f"{'OK' if ok else 'TRUNCATED'}")
+
+        _quiet(download1._read_channel_raw, scope, channels[0], cfg.depth)
+        naive = {ch: _naive_read(scope, ch, cfg.depth) for ch in channels[1:]}
+        reproduced = any(p < cfg.depth for p in naive.values())
+        print(f"workaround: naive switch   -> {naive} "
+              f"({'quirk reproduced' if reproduced else 'no truncation'})")
+    return ok and (reproduced or len(channels) < 2)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--depth", type=int, default=1_000_000)
+    ap.add_argument("--bandwidth", type=float, default=0.0,
+                    help="simulated link bytes/s (0 = unlimited)")
+    ap.add_argument("--latency", type=float, default=0.0,
+                    help="simulated seconds per query")
+    ap.add_argument("--channels", default=",".join(download1.CHANNELS))
+    ap.add_argument("--reset-pause", type=float, default=download1.RESET_PAUSE,
+                    help="fixed settle sleep (default: poll for readiness)")
+    ap.add_argument("--settle", type=float, default=0.1,
+                    help="simulated seconds the WAV engine reports a short "
+                         "record after :WAV:MODE RAW")
+    ap.add_argument("--transport", default="visa,socket",
+                    help="comma-separated transports to benchmark")
+    ap.add_argument("--format", default=download1.WAV_FORMAT,
+                    help="comma-separated :WAV:FORM values to benchmark")
+    ap.add_argument("--strict", action="store_true",
+                    help="also bench one command per write (STRICT_SCPI)")
+    a = ap.parse_args()
+
+    download1.RESET_PAUSE = a.reset_pause
+    channels = a.channels.split(",")
+    cfg = SimConfig(depth=a.depth, bandwidth=a.bandwidth, latency=a.latency,
+                    settle=a.settle)
+
+    default_format = download1.WAV_FORMAT
+    for fmt in a.format.split(","):
+        download1.WAV_FORMAT = fmt
+        for transport in a.transport.split(","):
+            bench_throughput(cfg, channels, transport=transport)
+            if a.strict:
+                bench_throughput(cfg, channels, strict=True,
+                                 transport=transport)
+    download1.WAV_FORMAT = default_format
+    ok = check_workaround(cfg, channels)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
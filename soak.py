@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Continuous segmented capture for soak tests.
+
+Repeatedly re-arms the scope, waits for the trigger, downloads every
+channel in ``download1.CHANNELS`` and streams it into a
+``RollingArchive`` segment (``soak_YYYY-MM-DD_HHMMSS/seg_NNNNNN/``, the
+normal binary archive layout).  Per-channel statistics come from a code
+histogram accumulated as each chunk arrives, so the keep/discard
+decision needs no second pass over the data.
+
+While the scope waits for its next trigger, the previous segment is
+finished on a background thread: envelope pyramids and sidecar are
+written, ``KEEP_IF`` is evaluated and the oldest segments beyond
+``DISK_CAP_BYTES`` are evicted, so the loop runs as fast as trigger +
+transfer allow.  With ``download1.ARCHIVE_CODEC`` set, the codes are
+compressed there too, so the cap holds several times more captures, and
+with ``download1.ENSEMBLE_DIR`` every kept capture is folded into the
+ensemble statistics (``ensemble.py``).
+Every iteration is appended to ``soak_log.jsonl`` with its timings,
+statistics and fate.
+
+Connection and download settings (IP, TRANSPORT, CHUNK_POINTS, ...) come
+from ``download1.py``.  Stop with Ctrl-C; the segment being finished is
+completed first.
+
+Usage:
+    python soak.py [--iterations N] [--duration SECONDS] [--out DIR]
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import download1
+from capture_archive import RollingArchive, code_path, save_archive
+from waveform import Capture
+
+# ── User-configurable constants ──────────────────────────────────────
+OUT_DIR_PREFIX = "soak_"
+DISK_CAP_BYTES = 2 << 30    # evict oldest segments beyond this
+ARM_MODE = "single"         # "single" (:SING, wait for trigger) or "run"
+RUN_DWELL = 0.1             # "run" mode: seconds to acquire before :STOP
+TRIGGER_POLL = 0.005        # first :TRIG:STAT? poll interval, doubled up to
+TRIGGER_POLL_MAX = 0.2      # this
+TRIGGER_TIMEOUT = 30.0      # re-arm if no trigger within this many seconds
+ARM_CONFIRM = 0.5           # STOP only, this long after :SING: trigger fired
+                            # before the first poll
+# Keep only captures for which this returns True (None = keep all).  It
+# receives {channel: {"vmin", "vmax", "vpp", "mean", "rms"}} in volts
+# (rms includes the DC component), e.g.
+#   KEEP_IF = lambda s: s["CHAN1"]["vpp"] > 1.0
+KEEP_IF = None
+LOG_NAME = "soak_log.jsonl"
+
+
+# ── Trigger handling ─────────────────────────────────────────────────
+
+def _arm_and_wait(scope) -> bool:
+    """
+    Start one acquisition and wait until the scope has stopped on it.
+
+    Right after ``:SING`` the scope may still report the previous
+    acquisition's STOP, so STOP only counts once the scope has been seen
+    armed (WAIT / RUN / TD).  ``*OPC?`` makes sure ``:SING`` has been
+    processed first; if the status then stays STOP for ARM_CONFIRM
+    seconds, the trigger fired before the first poll.
+    """
+    if ARM_MODE == "run":
+        scope.write(":RUN")
+        time.sleep(RUN_DWELL)
+        scope.write(":STOP")
+        return True
+    scope.write(":SING")
+    scope.query("*OPC?")
+    t_armed = time.perf_counter()
+    deadline = t_armed + TRIGGER_TIMEOUT
+    delay = TRIGGER_POLL
+    armed = False
+    while True:
+        if scope.query(":TRIG:STAT?").strip().upper() != "STOP":
+            armed = True
+        elif armed or time.perf_counter() - t_armed >= ARM_CONFIRM:
+            return True
+        if time.perf_counter() >= deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, TRIGGER_POLL_MAX)
+
+
+# ── Streaming statistics ─────────────────────────────────────────────
+
+class _CodeHistogram:
+    """Per-channel code histogram, filled chunk by chunk."""
+
+    def __init__(self):
+        self.counts: dict[str, np.ndarray] = {}
+
+    def add(self, channel: str, codes: np.ndarray):
+        size = 1 << (8 * codes.dtype.itemsize)
+        h = np.bincount(codes, minlength=size)
+        if channel in self.counts:
+            self.counts[channel] += h
+        else:
+            self.counts[channel] = h
+
+    def stats(self, capture: Capture) -> dict:
+        """Voltage min / max / peak-to-peak / mean / RMS per channel."""
+        out = {}
+        for wf in capture:
+            h = self.counts.get(wf.channel)
+            if h is None or not h.any():
+                continue
+            volts = wf.to_volts(np.arange(len(h), dtype=np.float64))
+            used = np.nonzero(h)[0]
+            n = h.sum()
+            mean = float(h @ volts / n)
+            vmin, vmax = float(volts[used[0]]), float(volts[used[-1]])
+            out[wf.channel] = {
+                "vmin": vmin, "vmax": vmax, "vpp": vmax - vmin,
+                "mean": mean, "rms": float(np.sqrt(h @ volts ** 2 / n)),
+            }
+        return out
+
+
+# ── Loop ─────────────────────────────────────────────────────────────
+
+def _download(scope, archive: RollingArchive, memory_depth: int, idn: str):
+    """Stream one acquisition into a new segment; returns its parts."""
+    seg = archive.new_segment()
+    hist = _CodeHistogram()
+    spills = {}
+
+    def on_chunk(channel, codes, lo, hi):
+        f = spills.get(channel)
+        if f is None:
+            f = spills[channel] = open(
+                code_path(seg, "", channel, codes.dtype), "wb")
+        chunk = codes[lo:hi]
+        f.write(chunk.astype(codes.dtype.newbyteorder("<"), copy=False).data)
+        hist.add(channel, chunk)
+
+    try:
+        waveforms = [
+            download1._read_channel_raw(scope, ch, memory_depth,
+                                        download1.CHUNK_POINTS, on_chunk)
+            for ch in download1.CHANNELS
+        ]
+    except BaseException:
+        archive.discard(seg)
+        raise
+    finally:
+        for f in spills.values():
+            f.close()
+    return seg, Capture(waveforms, idn=idn, memory_depth=memory_depth), hist
+
+
+def _finish(archive: RollingArchive, seg: Path, capture: Capture,
+            hist: _CodeHistogram, record: dict, log_path: Path) -> dict:
+    """Keep-or-discard one segment and append its log record."""
+    t0 = time.perf_counter()
+    stats = hist.stats(capture)
+    keep = KEEP_IF is None or bool(KEEP_IF(stats))
+    evicted = []
+    if keep:
+        save_archive(capture, seg, "", download1.LOD_FACTOR,
+                     download1.OUTPUT_POINTS, write_codes=False,
+                     codec=download1.ARCHIVE_CODEC,
+                     level=download1.ARCHIVE_LEVEL,
+                     workers=download1.ARCHIVE_WORKERS)
+        evicted = archive.commit(seg, iteration=record["iteration"],
+                                 stats=stats)
+        if download1.ENSEMBLE_DIR:
+            download1._fold_into_ensemble(capture)
+    else:
+        archive.discard(seg)
+    record.update(kept=keep, segment=seg.name if keep else None,
+                  evicted=evicted, stats=stats,
+                  finish_s=time.perf_counter() - t0,
+                  archive_bytes=archive.total_bytes)
+    with open(log_path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"#{record['iteration']}: {'kept ' + seg.name if keep else 'discarded'}"
+          f" (arm {record['arm_s']:.2f} s, transfer {record['transfer_s']:.2f} s,"
+          f" finish {record['finish_s']:.2f} s; archive "
+          f"{archive.total_bytes / 1e6:.1f} MB"
+          f"{', evicted ' + ', '.join(evicted) if evicted else ''})")
+    return record
+
+
+def soak(iterations: int | None = None, duration: float | None = None,
+         out: Path | None = None):
+    download1._validate_channels(download1.CHANNELS)
+    download1.LOG_CHUNKS = False
+    out = out or Path(
+        f"{OUT_DIR_PREFIX}{datetime.now().strftime('%Y-%m-%d_%H%M%S')}")
+    archive = RollingArchive(out, DISK_CAP_BYTES)
+    log_path = archive.root / LOG_NAME
+    print(f"Rolling archive: {archive.root.resolve()} "
+          f"(cap {DISK_CAP_BYTES / 1e9:.2f} GB)")
+    if archive.recovered:
+        print(f"Adopted {len(archive.recovered)} unindexed segment(s) "
+              f"from a previous run")
+
+    rm, visa = download1._open_scope(download1.IP, download1.TRANSPORT)
+    scope = download1._ScpiLink(visa, strict=download1.STRICT_SCPI)
+    finisher = ThreadPoolExecutor(1, thread_name_prefix="soak-finish")
+    pending = None
+    done = kept = 0
+    t_start = time.perf_counter()
+    try:
+        idn = scope.query("*IDN?").strip()
+        print(idn)
+        download1._check_scpi_errors(scope, "startup", quiet=True)
+        memory_depth = download1._acquire_memory_depth(scope)
+        download1._check_scpi_errors(scope, "ACQ:MDEP")
+        print(f"Memory depth (points): {memory_depth}")
+
+        i = 0
+        while iterations is None or i < iterations:
+            if duration is not None and time.perf_counter() - t_start >= duration:
+                break
+            i += 1
+            t0 = time.perf_counter()
+            record = {"iteration": i,
+                      "started": datetime.now().isoformat(timespec="milliseconds")}
+            triggered = _arm_and_wait(scope)
+            t1 = time.perf_counter()
+            record["arm_s"] = t1 - t0
+            if not triggered:
+                print(f"#{i}: no trigger within {TRIGGER_TIMEOUT:g} s, re-arming")
+                record.update(kept=False, timeout=True)
+                with open(log_path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+                continue
+            seg, capture, hist = _download(scope, archive, memory_depth, idn)
+            record["transfer_s"] = time.perf_counter() - t1
+            record["points"] = {wf.channel: wf.points for wf in capture}
+            if pending is not None:
+                kept += pending.result()["kept"]
+            pending = finisher.submit(_finish, archive, seg, capture, hist,
+                                      record, log_path)
+            done += 1
+    except KeyboardInterrupt:
+        print("Interrupted; finishing the last segment")
+    finally:
+        if pending is not None:
+            kept += pending.result()["kept"]
+        finisher.shutdown()
+        scope.close()
+        if rm is not None:
+            rm.close()
+
+    wall = time.perf_counter() - t_start
+    rate = done / wall * 60 if wall else 0.0
+    print(f"Soak: {done} captures in {wall:.1f} s ({rate:.1f}/min), "
+          f"{kept} kept, {archive.evicted} evicted, "
+          f"{len(archive.segments)} in archive "
+          f"({archive.total_bytes / 1e6:.1f} MB)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--iterations", type=int, default=None)
+    ap.add_argument("--duration", type=float, default=None,
+                    help="stop after this many seconds")
+    ap.add_argument("--out", type=Path, default=None,
+                    help="rolling archive root (existing roots are resumed)")
+    a = ap.parse_args()
+    soak(a.iterations, a.duration, a.out)
+
+
+if __name__ == "__main__":
+    main()
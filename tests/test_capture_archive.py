@@ -0,0 +1,128 @@
+import json
+
+import numpy as np
+import pytest
+
+from capture_archive import (
+    META_SUFFIX, ROLLING_INDEX, CompressedCodes, RollingArchive,
+    compress_archive, load_archive, save_archive, write_compressed,
+)
+from waveform import Capture, Preamble, Waveform
+
+
+def _capture(n, dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    info = np.iinfo(dtype)
+    waveforms = []
+    for i, ch in enumerate(["CHAN1", "CHAN2"]):
+        # A random walk (wrapping) plus full-range jumps: exercises the
+        # delta coding's wrap-around in both directions.
+        codes = np.cumsum(rng.integers(-3, 4, n)).astype(dtype)
+        codes[rng.integers(0, n, 8)] = [info.min, info.max] * 4
+        pre = Preamble(0 if dtype == np.uint8 else 1, 2, n, 1, 1e-9 * (i + 1),
+                       -1e-6, 0.0, 0.01, 0.0, 128.0)
+        waveforms.append(Waveform(ch, codes, pre))
+    return Capture(waveforms, idn="TEST", memory_depth=n)
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+@pytest.mark.parametrize("dtype", [np.uint8, np.dtype("<u2")])
+@pytest.mark.parametrize("n", [1, 999, 4096, 10_001])
+def test_compressed_codes_round_trip(tmp_path, codec, dtype, n):
+    codes = _capture(n, dtype).waveforms[0].codes
+    path = tmp_path / "codes.bin"
+    index = write_compressed(codes, path, codec, block_points=1000)
+    assert len(index["offsets"]) == -(-n // 1000) + 1
+    got = CompressedCodes(path, dtype, n, index, cache_blocks=2)
+    assert np.asarray(got).tobytes() == codes.tobytes()
+    assert got.dtype == codes.dtype and got.nbytes == codes.nbytes
+    # Slices across block edges, strided and fancy indexing, scalars.
+    for a, b in [(0, n), (n // 3, n - n // 3), (max(0, n - 1001), n)]:
+        assert np.array_equal(got[a:b], codes[a:b])
+    assert np.array_equal(got[::7], codes[::7])
+    idx = np.random.default_rng(1).integers(-n, n, 50)
+    assert np.array_equal(got[idx], codes[idx])
+    assert got[-1] == codes[-1]
+
+
+def test_compressed_codes_empty(tmp_path):
+    path = tmp_path / "empty.bin"
+    index = write_compressed(np.empty(0, np.uint8), path, "zlib")
+    got = CompressedCodes(path, np.uint8, 0, index)
+    assert len(got) == 0 and np.asarray(got).size == 0
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_compressed_archive_loads_like_raw(tmp_path, codec):
+    cap = _capture(5000, np.dtype("<u2"))
+    for sub in ("raw", "packed"):
+        (tmp_path / sub).mkdir()
+    save_archive(cap, tmp_path / "raw", lod_min_points=100)
+    save_archive(cap, tmp_path / "packed", codec=codec, block_points=1024,
+                 lod_min_points=100)
+    raw, packed = load_archive(tmp_path / "raw"), load_archive(tmp_path / "packed")
+    for a, b in zip(raw, packed):
+        assert isinstance(b.codes, CompressedCodes)
+        assert np.array_equal(np.asarray(a.codes), np.asarray(b.codes))
+        assert a.preamble == b.preamble
+        assert np.array_equal(a.voltages(100, 2100), b.voltages(100, 2100))
+    assert not list((tmp_path / "packed").glob("_CHAN?.u16"))
+
+
+def test_compress_archive_replaces_raw_files(tmp_path):
+    cap = _capture(3000, np.uint8)
+    meta_path = save_archive(cap, tmp_path, lod_min_points=100)
+    raw_files = sorted(tmp_path.glob("_CHAN?.u8"))
+    assert [p.name for p in raw_files] == ["_CHAN1.u8", "_CHAN2.u8"]
+
+    compress_archive(tmp_path, "zlib", block_points=512)
+    assert not any(p.exists() for p in raw_files)
+    meta = json.loads(meta_path.read_text())
+    assert all(w["file"].endswith(".u8.zlib") for w in meta["waveforms"].values())
+    loaded = load_archive(tmp_path)
+    for wf, ref in zip(loaded, cap):
+        assert np.asarray(wf.codes).tobytes() == ref.codes.tobytes()
+    # Already-compressed channels are left alone.
+    compress_archive(tmp_path, "lzma")
+    assert json.loads(meta_path.read_text()) == meta
+
+
+def _fill(path, nbytes, sidecar=True):
+    (path / "CHAN1.u1").write_bytes(b"\0" * nbytes)
+    if sidecar:
+        (path / META_SUFFIX).write_text("{}")
+
+
+def test_rolling_archive_reopen_recovers_numbering_and_orphans(tmp_path):
+    archive = RollingArchive(tmp_path, cap_bytes=10_000)
+    first = archive.new_segment()
+    _fill(first, 1000)
+    archive.commit(first)
+    # A killed run: one complete segment never committed, one partial.
+    done = archive.new_segment()
+    _fill(done, 4000)
+    partial = archive.new_segment()
+    _fill(partial, 500, sidecar=False)
+
+    reopened = RollingArchive(tmp_path, cap_bytes=3000)
+    assert reopened.recovered == [done.name]
+    assert not partial.exists()
+    # The cap covers the adopted orphan; the newest segment is kept.
+    assert [s["name"] for s in reopened.segments] == [done.name]
+    assert not first.exists()
+    assert reopened.total_bytes == _dir_size(done)
+
+    nxt = reopened.new_segment()
+    assert nxt.name > partial.name
+    index = json.loads((tmp_path / ROLLING_INDEX).read_text())
+    assert index["next"] > int(nxt.name[4:])
+
+
+def test_rolling_archive_new_segment_skips_existing_dirs(tmp_path):
+    archive = RollingArchive(tmp_path, cap_bytes=10_000)
+    (tmp_path / "seg_000001").mkdir()
+    assert archive.new_segment().name == "seg_000002"
+
+
+def _dir_size(path):
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+import pytest
+
+import ensemble
+from ensemble import Ensemble
+from waveform import Capture, Preamble, Waveform
+
+N = 20_001
+XINC = 1e-8
+
+
+def _capture(shift, seed, channels=("CHAN1", "CHAN2")):
+    """A burst plus square wave, displaced by *shift* samples, with noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(N) + shift
+    sig = (100 + 60 * np.sin(2 * np.pi * t / 500) * np.exp(-((t - N / 2) / 3000) ** 2)
+           + 40 * (np.sin(2 * np.pi * t / 777) > 0))
+    codes = np.clip(sig + rng.normal(0, 3, N), 0, 255).astype(np.uint8)
+    waveforms = []
+    for i, ch in enumerate(channels):
+        c = codes if i == 0 else 255 - codes
+        pre = Preamble(0, 2, N, 1, XINC, -N // 2 * XINC, 0, 0.02, 0, 128)
+        waveforms.append(Waveform(ch, c, pre))
+    return Capture(waveforms, idn="TEST")
+
+
+def _stack(captures, ens, channel):
+    """Aligned NaN-padded voltages, one row per capture, as folded in."""
+    stack = np.full((len(captures), N), np.nan)
+    for row, cap, entry in zip(stack, captures, ens.meta["captures"]):
+        g = np.arange(N) - round(entry["lag_s"] / XINC)
+        ok = (g >= 0) & (g < N)
+        row[g[ok]] = cap[channel].voltages()[ok]
+    return stack
+
+
+def test_fold_matches_numpy_on_the_aligned_stack(tmp_path, monkeypatch):
+    monkeypatch.setattr(ensemble, "BLOCK_POINTS", 4096)
+    shifts = [0, 17, -40, 250, -3]
+    captures = [_capture(s, i) for i, s in enumerate(shifts)]
+    ens = Ensemble(tmp_path, align="CHAN1")
+    for cap in captures[:2]:
+        ens.add(cap)
+    ens = Ensemble(tmp_path)                # reopened: carries on
+    for cap in captures[2:]:
+        ens.add(cap)
+
+    # Capture i holds the signal at t + s, so x[i - s] ~ mean[i]: L = -s.
+    assert [c["lag_samples"] for c in ens.meta["captures"]] == [-s for s in shifts]
+    for ch in ("CHAN1", "CHAN2"):
+        stack = _stack(captures, ens, ch)
+        count = (~np.isnan(stack)).sum(axis=0)
+        mean = np.nanmean(stack, axis=0)
+        acc = ens._acc(ch)
+        assert np.array_equal(acc["count"], count)
+        np.testing.assert_allclose(acc["mean"], mean, rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(acc["m2"],
+                                   np.nansum((stack - mean) ** 2, axis=0),
+                                   rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(acc["min"], np.nanmin(stack, axis=0),
+                                   rtol=1e-6)
+        np.testing.assert_allclose(acc["max"], np.nanmax(stack, axis=0),
+                                   rtol=1e-6)
+        tr = ens.trace(ch)
+        std = np.nanstd(stack, axis=0, ddof=1)
+        np.testing.assert_allclose(tr.std, std, rtol=1e-9, atol=1e-12)
+    assert ens.summary_path("CHAN1").exists()
+
+
+def test_interrupted_add_leaves_a_pending_marker(tmp_path, monkeypatch):
+    ens = Ensemble(tmp_path)
+    ens.add(_capture(0, 0), source="first")
+
+    def crash(self, channel, wf, shift):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(Ensemble, "_fold", crash)
+    with pytest.raises(KeyboardInterrupt):
+        ens.add(_capture(0, 1), source="second")
+    monkeypatch.undo()
+
+    meta = json.loads((tmp_path / ensemble.META_NAME).read_text())
+    assert meta["pending"] == "second"
+    assert [c["source"] for c in meta["captures"]] == ["first"]
+    with pytest.raises(RuntimeError, match="interrupted while adding second"):
+        Ensemble(tmp_path)
+
+
+def test_first_capture_defines_the_channels(tmp_path):
+    ens = Ensemble(tmp_path)
+    ens.add(_capture(0, 0, ("CHAN1", "CHAN2")))
+    assert ens.channels == ["CHAN1", "CHAN2"]
+
+    ens.add(_capture(0, 1, ("CHAN1", "CHAN2", "CHAN3")))
+    ens.add(_capture(0, 2, ("CHAN2",)))
+    assert ens.channels == ["CHAN1", "CHAN2"]
+    assert not list(tmp_path.glob("CHAN3.*"))
+    assert (ens.trace("CHAN1").count == 2).all()
+    assert (ens.trace("CHAN2").count == 3).all()
+    assert ens.meta["captures"][-1]["points"] == {"CHAN2": N}
+
+    with pytest.raises(ValueError, match="none of the ensemble's channels"):
+        ens.add(_capture(0, 3, ("CHAN3",)))
+    assert len(Ensemble(tmp_path)) == 3
+
+
+def test_channels_argument_limits_the_first_capture(tmp_path):
+    ens = Ensemble(tmp_path, channels=["CHAN2"])
+    ens.add(_capture(0, 0))
+    assert ens.channels == ["CHAN2"]
+    with pytest.raises(ValueError, match="align channel"):
+        Ensemble(tmp_path / "other", align="CHAN4").add(_capture(0, 0))
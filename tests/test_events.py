@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from events import MIN_BAND_LSB, index_events
+from waveform import Preamble, Waveform
+
+XINC = 1e-6
+YINC = 0.01
+
+
+def _wf(codes, channel="CHAN1"):
+    pre = Preamble(0, 2, len(codes), 1, XINC, 0.0, 0.0, YINC, 0.0, 128.0)
+    return Waveform(channel, np.asarray(codes, dtype=np.uint8), pre)
+
+
+def _square(cycles, period=100, high=30, lo=40, hi=200, ramp=4, first=10):
+    """Codes of a square wave with linear *ramp*-sample edges."""
+    n = cycles * period + first
+    t = np.arange(n)
+    phase = (t - first) % period
+    up = np.clip(phase / ramp, 0, 1)
+    down = np.clip((phase - high) / ramp, 0, 1)
+    x = lo + (hi - lo) * (up - down)
+    x[t < first] = lo
+    return np.rint(x).astype(np.uint8)
+
+
+def test_clean_square_wave():
+    cycles = 50
+    wf = _wf(_square(cycles))
+    idx = index_events(wf)
+    # Mid-level 120 is hit exactly half way up each 40 -> 200 ramp.
+    assert wf.to_volts(120) == pytest.approx(idx.threshold)
+    assert len(idx) == 2 * cycles
+    assert list(idx.events["rising"]) == [True, False] * cycles
+    starts = 10 + 100 * np.arange(cycles)
+    assert np.allclose(idx.edges("rising"), (starts + 2) * XINC)
+    assert np.allclose(idx.edges("falling"), (starts + 32) * XINC)
+    assert idx.nth(-1) == pytest.approx((starts[-1] + 2) * XINC)
+    s = idx.stats()
+    assert (s.rising, s.falling) == (cycles, cycles)
+    assert s.period_mean_s == pytest.approx(100 * XINC)
+    assert s.period_std_s == pytest.approx(0, abs=1e-15)
+    assert s.frequency_hz == pytest.approx(1 / (100 * XINC))
+    assert s.duty_mean == pytest.approx(0.3)
+    assert s.high_time_mean_s == pytest.approx(30 * XINC)
+
+
+@pytest.mark.parametrize("spread", [1, 2, 3])
+def test_noisy_flat_line_has_no_events(spread):
+    # A few LSB of noise: every default band would be crossed by noise.
+    rng = np.random.default_rng(spread)
+    wf = _wf(128 + rng.integers(-spread, spread + 1, 100_000))
+    idx = index_events(wf)
+    assert len(idx) == 0
+    assert idx.high - idx.low >= MIN_BAND_LSB * YINC - 1e-12
+    # An explicit threshold is honoured.
+    assert len(index_events(wf, threshold=wf.to_volts(128.5), hysteresis=0.0))
+
+
+def test_default_band_has_a_floor_of_two_lsb():
+    # 10 % of a 12-LSB swing is 1.2 codes; the band widens to 2 LSB.
+    rng = np.random.default_rng(0)
+    codes = _square(40, lo=122, hi=134, ramp=1).astype(np.int16)
+    flat = (codes == 122) | (codes == 134)
+    codes[flat] += rng.integers(-1, 2, flat.sum()).astype(np.int16)
+    idx = index_events(_wf(codes))
+    assert idx.high - idx.low == pytest.approx(MIN_BAND_LSB * YINC)
+    assert len(idx) == 80
+
+
+@pytest.mark.parametrize("block_points", [1, 2, 3, 7, 64, 99, 100, 101, 4096])
+def test_block_boundaries_do_not_change_the_index(block_points):
+    rng = np.random.default_rng(5)
+    codes = _square(60, period=37, high=11, ramp=3).astype(np.int16)
+    codes += rng.integers(-6, 7, len(codes)).astype(np.int16)
+    wf = _wf(np.clip(codes, 0, 255))
+    ref = index_events(wf, block_points=1 << 20)
+    got = index_events(wf, block_points=block_points)
+    assert len(ref) == 120
+    assert np.array_equal(got.events, ref.events)
+    pos = got.events["pos"]
+    assert (np.diff(pos) > 0).all()                       # no duplicates
+    assert (got.events["rising"][1:] != got.events["rising"][:-1]).all()
@@ -0,0 +1,77 @@
+"""
+Resume of a fleet download broken mid-channel, against the simulator.
+
+The link is cut after a few ``:WAV:DATA?`` chunks of the second channel;
+``download1.py --resume`` must reconnect to the address in the journal
+(``download1.IP`` points nowhere) and finish with codes identical to an
+uninterrupted download.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import download1
+import fleet
+import scope_sim
+from capture_archive import load_archive
+
+DEPTH = 200_000
+CHUNK = 20_000
+
+
+@pytest.fixture
+def sim(tmp_path, monkeypatch):
+    server = scope_sim.serve_in_thread(scope_sim.SimConfig(depth=DEPTH))
+    monkeypatch.chdir(tmp_path)
+    for name, value in {"IP": "127.0.0.1:1", "TRANSPORT": "socket",
+                        "CHANNELS": ["CHAN1", "CHAN2"],
+                        "CHUNK_POINTS": CHUNK, "LOG_CHUNKS": False,
+                        "OUTPUT_POINTS": 1000, "PLOT_WORKERS": 1}.items():
+        monkeypatch.setattr(download1, name, value)
+    monkeypatch.setattr(fleet, "PLOTS", False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _codes(path):
+    return {wf.channel: np.array(wf.codes) for wf in load_archive(path)}
+
+
+def test_fleet_download_resumes_from_journal_address(sim, tmp_path,
+                                                     monkeypatch):
+    spec = [{"name": "bench", "address": sim.address,
+             "channels": ["CHAN1", "CHAN2"]}]
+    (tmp_path / "fleet.json").write_text(json.dumps(spec))
+
+    real, calls = download1._ScpiLink.read_block, [0]
+
+    def flaky(link, cmd, out):
+        calls[0] += 1
+        if calls[0] == DEPTH // CHUNK + 4:      # mid CHAN2
+            raise ConnectionError("simulated link drop")
+        return real(link, cmd, out)
+
+    monkeypatch.setattr(download1._ScpiLink, "read_block", flaky)
+    with pytest.raises(SystemExit):             # a failed scope exits 1
+        fleet.main([str(tmp_path / "fleet.json")])
+    monkeypatch.setattr(download1._ScpiLink, "read_block", real)
+
+    sub = next(tmp_path.glob("fleet_*")) / "bench"
+    journal = json.loads(next(sub.glob("*_download.json")).read_text())
+    assert journal["address"] == sim.address
+    assert journal["waveforms"]["CHAN1"]["done"] == [[1, DEPTH]]
+    assert journal["waveforms"]["CHAN2"]["done"] == [[1, 3 * CHUNK]]
+
+    download1.main(["--resume", str(sub)])
+    assert not list(sub.glob("*_download.json"))
+
+    monkeypatch.setattr(download1, "IP", sim.address)
+    download1.main([])
+    ref = next(tmp_path.glob("aq_*"))
+    resumed, whole = _codes(sub), _codes(ref)
+    assert resumed.keys() == whole.keys() == {"CHAN1", "CHAN2"}
+    for ch in whole:
+        assert resumed[ch].tobytes() == whole[ch].tobytes()
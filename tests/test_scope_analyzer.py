@@ -0,0 +1,54 @@
+"""
+Cross-check of scope_analyzer.py against the C++ analyser.
+
+``fixtures/analyzer_small_analysis.log`` is the report written by
+``scope_analyzer.cpp`` for ``fixtures/analyzer_small.csv`` (two 50 Hz
+channels with harmonics, 2000 rows at 20 kHz), run as
+
+    scope_analyzer analyzer_small.csv analyzer_small_analysis.log
+
+Regenerate it with the C++ binary whenever the report format changes.
+"""
+
+from pathlib import Path
+
+import pytest
+
+import scope_analyzer
+from scope_analyzer import analyze_csv, compare_reports, format_report, welch_csv
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def test_report_matches_cpp():
+    csv = FIXTURES / "analyzer_small.csv"
+    expected = (FIXTURES / "analyzer_small_analysis.log").read_text()
+    report = format_report(analyze_csv(csv), "analyzer_small_analysis.log")
+    assert compare_reports(expected, report) == []
+
+
+def test_compare_reports_flags_a_changed_value():
+    expected = (FIXTURES / "analyzer_small_analysis.log").read_text()
+    changed = expected.replace("THD                         : 0.130163983",
+                               "THD                         : 0.130263983")
+    assert changed != expected
+    problems = compare_reports(expected, changed)
+    assert len(problems) == 1 and "CHAN1 / THD" in problems[0]
+
+
+@pytest.mark.parametrize("batch_rows", [64, 65536])
+def test_welch_matches_full_fft(monkeypatch, batch_rows):
+    # One 2000-sample segment (10 Hz bins) spans the record; the fixture's
+    # noise spreads over the +-2 bin harmonic bands, so Welch agrees with
+    # the full FFT to 0.1 % on the fundamental and 0.005 on THD.
+    monkeypatch.setattr(scope_analyzer, "_CSV_BATCH_ROWS", batch_rows)
+    csv = FIXTURES / "analyzer_small.csv"
+    full = analyze_csv(csv)
+    welch = welch_csv(csv, segment=2000)
+    assert welch.rows == 2000
+    assert [c.name for c in welch.channels] == [c.name for c in full.channels]
+    for w, f in zip(welch.channels, full.channels):
+        assert w.fundamental_amplitude == pytest.approx(
+            f.fundamental_amplitude, rel=1e-3)
+        assert w.thd == pytest.approx(f.thd, abs=5e-3)
+        assert w.rms == pytest.approx(f.rms, rel=1e-12)
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from waveform import Capture, Preamble, Pyramid, Waveform
+
+
+def _wf(channel, codes, xinc, xorig=-1e-3, xref=0.0):
+    pre = Preamble(0, 2, len(codes), 1, xinc, xorig, xref, 0.01, 0.0, 128.0)
+    return Waveform(channel, np.asarray(codes, dtype=np.uint8), pre)
+
+
+class _Counting:
+    """Code array that counts the raw samples read through it."""
+
+    def __init__(self, codes):
+        self.codes, self.read = codes, 0
+
+    def __getitem__(self, key):
+        out = self.codes[key]
+        self.read += out.size
+        return out
+
+
+# ── index_range / slice bounds ───────────────────────────────────────
+
+def test_index_range_includes_endpoints_lost_to_rounding():
+    wf = _wf("CHAN1", np.zeros(1000), xinc=1e-7, xorig=0.1)
+    for a, b in [(0, 999), (3, 3), (10, 700), (333, 334)]:
+        # time_at() round trips are off by an ulp or so either way.
+        t0, t1 = wf.time_at(a), wf.time_at(b)
+        assert wf.index_range(t0 * (1 + 1e-15), t1 * (1 - 1e-15)) == (a, b + 1)
+    # Between samples: only the samples strictly inside.
+    assert wf.index_range(wf.time_at(9.5), wf.time_at(12.5)) == (10, 13)
+
+
+def test_index_range_clips_to_the_record():
+    wf = _wf("CHAN1", np.zeros(100), xinc=1e-6)
+    assert wf.index_range(wf.time_at(-50), wf.time_at(10)) == (0, 11)
+    assert wf.index_range(wf.time_at(90), wf.time_at(500)) == (90, 100)
+    assert wf.index_range(wf.time_at(-50), wf.time_at(500)) == (0, 100)
+    assert wf.index_range(wf.time_at(200), wf.time_at(300)) == (100, 100)
+    assert wf.index_range(wf.time_at(-20), wf.time_at(-10)) == (0, 0)
+    lo, hi = wf.index_range(wf.time_at(60), wf.time_at(40))   # reversed
+    assert lo == hi
+
+
+def test_slice_uses_each_channels_own_time_axis():
+    rng = np.random.default_rng(0)
+    fast = _wf("CHAN1", rng.integers(0, 256, 4000), xinc=1e-6)
+    slow = _wf("CHAN2", rng.integers(0, 256, 1000), xinc=4e-6)
+    cap = Capture([fast, slow])
+    t0, t1 = fast.time_at(1000), fast.time_at(2000)
+    for wf, (lo, hi) in [(fast, (1000, 2001)), (slow, (250, 501))]:
+        s = cap.slice(wf.channel, t0, t1)
+        assert (s.start, s.stop) == (lo, hi) and s.raw
+        assert np.array_equal(s.times, wf.times(lo, hi))
+        assert np.array_equal(s.vmin, wf.voltages(lo, hi))
+        assert t0 - 1e-12 <= s.times[0] and s.times[-1] <= t1 + 1e-12
+    empty = cap.slice("CHAN2", slow.time_at(2000), slow.time_at(3000))
+    assert empty.stop == empty.start == 1000 and len(empty.times) == 0
+
+
+# ── Pyramid.envelope against brute force ─────────────────────────────
+
+@pytest.fixture(scope="module")
+def codes():
+    rng = np.random.default_rng(3)
+    codes = rng.integers(20, 236, 300_007).astype(np.uint8)
+    codes[rng.integers(0, len(codes), 40)] = 255
+    codes[rng.integers(0, len(codes), 40)] = 0
+    return codes
+
+
+def _check_envelope(codes, pyr, lo, hi, k):
+    starts, mins, maxs = pyr.envelope(codes, lo, hi, k)
+    assert len(starts) == min(k, hi - lo) and starts[0] == lo
+    ends = np.append(starts[1:], hi)
+    seg = codes[lo:hi]
+    true_min = np.minimum.reduceat(seg, starts - lo)
+    true_max = np.maximum.reduceat(seg, starts - lo)
+    # Every bucket covers its own samples; interior ones may borrow from
+    # a neighbour, but the first and last are exact.
+    assert (mins <= true_min).all() and (maxs >= true_max).all()
+    for i in (0, -1):
+        assert mins[i] == codes[starts[i]:ends[i]].min()
+        assert maxs[i] == codes[starts[i]:ends[i]].max()
+    assert mins.min() == seg.min() and maxs.max() == seg.max()
+
+
+def test_envelope_single_bucket_is_exact(codes):
+    pyr = Pyramid.build(codes, 16, 1000)
+    for lo, hi in [(0, len(codes)), (1, len(codes) - 1), (4095, 4097 + 70_000),
+                   (123_457, 123_457 + 17)]:
+        spy = _Counting(codes)
+        starts, mins, maxs = pyr.envelope(spy, lo, hi, 1)
+        assert list(starts) == [lo]
+        assert (mins[0], maxs[0]) == (codes[lo:hi].min(), codes[lo:hi].max())
+        # At most one partial coarsest-level bucket of raw codes per end.
+        assert spy.read <= 2 * pyr.bucket(len(pyr.levels) - 1)
+
+
+def test_envelope_unaligned_windows_match_brute_force(codes):
+    pyr = Pyramid.build(codes, 16, 1000)
+    rng = np.random.default_rng(7)
+    for _ in range(300):
+        lo = int(rng.integers(0, len(codes) - 2))
+        hi = int(rng.integers(lo + 1, len(codes) + 1))
+        k = int(rng.choice([2, 3, 7, 100, 1000]))
+        _check_envelope(codes, pyr, lo, hi, k)
+
+
+def test_slice_envelope_in_volts(codes):
+    wf = _wf("CHAN1", codes, xinc=1e-9)
+    cap = Capture([wf])
+    s = cap.slice("CHAN1", wf.time_at(1001), wf.time_at(250_000), max_points=64)
+    assert not s.raw and len(s.times) == 64 and (s.start, s.stop) == (1001, 250_001)
+    assert s.vmin.min() == wf.to_volts(codes[1001:250_001].min())
+    assert s.vmax.max() == wf.to_volts(codes[1001:250_001].max())
+    with pytest.raises(ValueError):
+        cap.slice("CHAN1", wf.time_at(0), wf.time_at(1000), max_points=0)
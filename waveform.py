@@ -0,0 +1,412 @@
+"""
+Compact in-memory representation of a downloaded DHO800/DHO900 channel.
+
+A ``Waveform`` keeps the raw ADC codes exactly as they came off the
+wire (1 byte per sample in BYTE format, 2 in WORD) together with the
+full 10-field ``:WAV:PRE?`` preamble.  Voltages and timestamps are never stored; they
+are computed on demand for whatever slice the caller asks for, so a
+50 Mpt channel costs 50 MB resident instead of ~1.6 GB of boxed floats.
+
+A ``Capture`` groups the channels of one acquisition with the scope's
+``*IDN?`` string and memory depth; it is what ``capture_archive`` saves
+and reloads.  ``Capture.slice()`` answers time-window queries: the
+preamble maps times to sample indices directly, so only the requested
+range (or its envelope) is read, even from a memory-mapped archive.
+"""
+
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+
+class Preamble(NamedTuple):
+    """The ten comma-separated fields returned by ``:WAV:PRE?``."""
+    format: int
+    type: int
+    points: int
+    count: int
+    xinc: float
+    xorig: float
+    xref: float
+    yinc: float
+    yorig: float
+    yref: float
+
+    @classmethod
+    def parse(cls, text: str) -> "Preamble":
+        parts = [p.strip() for p in text.strip().split(",")]
+        if len(parts) < 10:
+            raise ValueError(f"Unexpected preamble: {text.strip()}")
+        return cls(
+            int(float(parts[0])), int(float(parts[1])),
+            int(float(parts[2])), int(float(parts[3])),
+            *(float(p) for p in parts[4:10]),
+        )
+
+
+class Waveform:
+    """
+    Raw ADC codes for one channel plus the preamble needed to scale them.
+
+    ``codes`` may be any 1-D integer array, including a ``numpy.memmap``;
+    every accessor works on views so nothing is copied until a slice is
+    converted to volts.
+    """
+
+    __slots__ = ("channel", "codes", "preamble")
+
+    def __init__(self, channel: str, codes: np.ndarray, preamble: Preamble):
+        self.channel = channel
+        self.codes = codes
+        self.preamble = preamble
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __repr__(self) -> str:
+        return (f"Waveform({self.channel!r}, {self.points:,} pts, "
+                f"{self.codes.dtype}, xinc={self.xinc:g})")
+
+    @property
+    def points(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    @property
+    def xinc(self) -> float:
+        return self.preamble.xinc
+
+    @property
+    def xorig(self) -> float:
+        return self.preamble.xorig
+
+    @property
+    def xref(self) -> float:
+        return self.preamble.xref
+
+    @property
+    def yinc(self) -> float:
+        return self.preamble.yinc
+
+    @property
+    def yorig(self) -> float:
+        return self.preamble.yorig
+
+    @property
+    def yref(self) -> float:
+        return self.preamble.yref
+
+    # ── Lazy conversions ────────────────────────────────────────────
+
+    def to_volts(self, codes) -> np.ndarray:
+        """Scale an array (or scalar) of codes from this channel to volts."""
+        return (codes - self.yref - self.yorig) * self.yinc
+
+    def voltages(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """Voltages for samples ``[start, stop)`` as a new ``float64`` array."""
+        return self.to_volts(self.codes[start:stop])
+
+    def voltages_at(self, indices) -> np.ndarray:
+        """Voltages gathered at an integer index array."""
+        return self.to_volts(self.codes[indices])
+
+    def time_at(self, idx):
+        """Absolute timestamp of (possibly fractional) sample index *idx*."""
+        return self.xorig + (idx - self.xref) * self.xinc
+
+    def index_at(self, t):
+        """Fractional sample index of absolute time *t* (inverse of ``time_at``)."""
+        return (t - self.xorig) / self.xinc + self.xref
+
+    def index_range(self, t_start: float, t_end: float) -> tuple[int, int]:
+        """
+        Half-open sample range ``[lo, hi)`` of the samples whose timestamps
+        lie in ``[t_start, t_end]``, clipped to the record.
+        """
+        eps = 1e-6      # sample fractions lost to float rounding
+        lo = math.ceil(self.index_at(t_start) - eps)
+        hi = math.floor(self.index_at(t_end) + eps) + 1
+        lo = min(max(lo, 0), self.points)
+        return lo, min(max(hi, lo), self.points)
+
+    def times(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """Timestamps for samples ``[start, stop)`` on this channel's own axis."""
+        stop = self.points if stop is None else stop
+        return self.time_at(np.arange(start, stop, dtype=np.float64))
+
+
+def scaled_indices(src_n: int, dst_n: int) -> np.ndarray:
+    """
+    Map ``dst_n`` evenly spaced positions onto ``[0, src_n - 1]``.
+
+    Element *i* is ``round(i * (src_n - 1) / (dst_n - 1))`` with Python's
+    round-half-even semantics, computed in one vectorised pass.
+    """
+    if dst_n <= 1:
+        return np.zeros(max(dst_n, 0), dtype=np.int64)
+    idx = np.rint(np.arange(dst_n, dtype=np.int64) * (src_n - 1) / (dst_n - 1))
+    return idx.astype(np.int32 if src_n < 2**31 else np.int64)
+
+
+class Alignment(NamedTuple):
+    """
+    Sample indices placing every channel on the shortest channel's grid.
+
+    ``indices[k]`` holds, for each aligned row, the sample of channel *k*
+    to use; it is ``None`` when that channel already has exactly ``n``
+    samples (identity).  ``ref_idx`` is the same for the reference channel
+    and drives the time column.
+    """
+    n: int
+    ref_idx: np.ndarray | None
+    indices: tuple
+
+    def _rows(self, rows) -> np.ndarray:
+        if isinstance(rows, slice):
+            return np.arange(*rows.indices(self.n))
+        return np.asarray(rows)
+
+    def take(self, k: int, rows) -> np.ndarray:
+        """Sample indices of channel *k* for aligned *rows* (slice or array)."""
+        idx = self.indices[k]
+        return self._rows(rows) if idx is None else idx[rows]
+
+    def ref_rows(self, rows) -> np.ndarray:
+        """Reference-channel sample indices for aligned *rows*."""
+        return self._rows(rows) if self.ref_idx is None else self.ref_idx[rows]
+
+
+def minmax_buckets(codes: np.ndarray, starts: np.ndarray, mean: bool = False):
+    """
+    Reduce ``codes`` to per-bucket (min, max[, mean]).
+
+    Bucket *i* spans ``codes[starts[i]:starts[i + 1]]`` (the last one runs
+    to the end).  *starts* must be strictly increasing.
+    """
+    mins = np.minimum.reduceat(codes, starts)
+    maxs = np.maximum.reduceat(codes, starts)
+    if not mean:
+        return mins, maxs
+    sums = np.add.reduceat(codes, starts, dtype=np.int64)
+    counts = np.diff(np.append(starts, len(codes)))
+    return mins, maxs, sums / counts
+
+
+def bucket_starts(lo: int, hi: int, k: int) -> np.ndarray:
+    """First sample of each of *k* near-equal buckets covering ``[lo, hi)``."""
+    return lo + (np.arange(k, dtype=np.int64) * (hi - lo)) // k
+
+
+class Pyramid:
+    """
+    Multi-resolution min/max envelope of one channel's codes.
+
+    Level *j* reduces every ``factor ** (j + 1)`` consecutive samples to
+    their min and max and is stored as a ``(2, m)`` array (row 0 mins,
+    row 1 maxs).  Levels are added until one has at most ``min_points``
+    buckets, so any window can be summarised by reading at most
+    ``factor * max_points`` pre-reduced values instead of the raw record.
+    """
+
+    __slots__ = ("factor", "levels")
+
+    def __init__(self, factor: int, levels: list[np.ndarray]):
+        self.factor = factor
+        self.levels = levels
+
+    @classmethod
+    def build(cls, codes: np.ndarray, factor: int = 16,
+              min_points: int = 10_000) -> "Pyramid":
+        levels = []
+        mins = maxs = codes
+        while len(mins) > min_points:
+            starts = np.arange(0, len(mins), factor)
+            mins = np.minimum.reduceat(mins, starts)
+            maxs = np.maximum.reduceat(maxs, starts)
+            levels.append(np.stack((mins, maxs)))
+            mins, maxs = levels[-1]
+        return cls(factor, levels)
+
+    def bucket(self, j: int) -> int:
+        """Raw samples per bucket on level *j*."""
+        return self.factor ** (j + 1)
+
+    def envelope(self, codes: np.ndarray, lo: int, hi: int, max_points: int):
+        """
+        Min/max codes of ``codes[lo:hi]`` in at most *max_points* buckets.
+
+        Returns ``(starts, mins, maxs)`` where *starts* are raw sample
+        indices.  Reads from the coarsest level whose bucket still fits
+        inside one output bucket.  Interior bucket edges widen outwards to
+        level boundaries, so a bucket may borrow up to one level bucket from
+        each neighbour (a peak can show up twice but is never hidden); the
+        first and last buckets are recomputed exactly, from the level
+        buckets inside them plus at most one partial level bucket of raw
+        codes at each end, so nothing outside ``[lo, hi)`` leaks in.
+        """
+        span = hi - lo
+        if span <= max_points:
+            seg = codes[lo:hi]
+            return np.arange(lo, hi), seg, seg
+        starts = bucket_starts(lo, hi, max_points)
+        j = len(self.levels) - 1
+        while j >= 0 and self.bucket(j) > span // max_points:
+            j -= 1
+        if j < 0:
+            return (starts,) + minmax_buckets(codes[lo:hi], starts - lo)
+        b = self.bucket(j)
+        ls = starts // b
+        end = -(-hi // b)
+        lmin = self.levels[j][0, ls[0]:end]
+        lmax = self.levels[j][1, ls[0]:end]
+        mins = np.minimum.reduceat(lmin, ls - ls[0])
+        maxs = np.maximum.reduceat(lmax, ls - ls[0])
+        # A bucket whose end falls mid level-bucket also takes that level
+        # bucket, so each output bucket covers all of its own samples.
+        split = np.nonzero(starts[1:] % b)[0]
+        nxt = ls[split + 1] - ls[0]
+        mins[split] = np.minimum(mins[split], lmin[nxt])
+        maxs[split] = np.maximum(maxs[split], lmax[nxt])
+        level = self.levels[j]
+
+        def exact(a, z):
+            fa, fz = -(-a // b), z // b
+            if fa >= fz:                    # under two level buckets
+                seg = codes[a:z]
+                return seg.min(), seg.max()
+            parts = [(level[0, fa:fz].min(), level[1, fa:fz].max())]
+            for seg in (codes[a:fa * b], codes[fz * b:z]):
+                if len(seg):
+                    parts.append((seg.min(), seg.max()))
+            return min(p[0] for p in parts), max(p[1] for p in parts)
+
+        mins[0], maxs[0] = exact(lo, starts[1] if len(starts) > 1 else hi)
+        if len(starts) > 1:
+            mins[-1], maxs[-1] = exact(starts[-1], hi)
+        return starts, mins, maxs
+
+
+class Slice(NamedTuple):
+    """
+    One channel over a time window, from ``Capture.slice()``.
+
+    Raw samples when the window fits in *max_points* (``vmin`` and
+    ``vmax`` are then the same array); otherwise near-equal buckets with
+    their min / max voltages, ``times`` being each bucket's first sample.
+    """
+    channel: str
+    start: int              # first raw sample in the window
+    stop: int               # one past the last
+    times: np.ndarray
+    vmin: np.ndarray
+    vmax: np.ndarray
+
+    @property
+    def raw(self) -> bool:
+        return len(self.times) == self.stop - self.start
+
+    @property
+    def bucket(self) -> float:
+        """Average raw samples per returned point."""
+        return (self.stop - self.start) / len(self.times) if len(self.times) else 0.0
+
+
+class Capture:
+    """
+    All channels from one acquisition plus the instrument context.
+
+    ``waveforms`` preserves the channel order of the run.  ``ref`` is the
+    longest channel, whose preamble provides the shared time axis for the
+    aligned/decimated outputs.
+    """
+
+    __slots__ = ("waveforms", "idn", "memory_depth", "path", "_alignment",
+                 "pyramids")
+
+    def __init__(self, waveforms: list[Waveform], idn: str = "",
+                 memory_depth: int = 0, path=None):
+        self.waveforms = list(waveforms)
+        self.idn = idn
+        self.memory_depth = memory_depth
+        self.path = path
+        self._alignment = None
+        self.pyramids: dict[str, Pyramid] = {}
+
+    def __iter__(self):
+        return iter(self.waveforms)
+
+    def __len__(self) -> int:
+        return len(self.waveforms)
+
+    def __getitem__(self, channel: str) -> Waveform:
+        for wf in self.waveforms:
+            if wf.channel == channel:
+                return wf
+        raise KeyError(channel)
+
+    def __repr__(self) -> str:
+        chans = ", ".join(f"{wf.channel}:{wf.points:,}" for wf in self.waveforms)
+        return f"Capture([{chans}], depth={self.memory_depth:,})"
+
+    @property
+    def channels(self) -> list[str]:
+        return [wf.channel for wf in self.waveforms]
+
+    @property
+    def ref(self) -> Waveform:
+        return max(self.waveforms, key=lambda w: w.points)
+
+    def alignment(self) -> Alignment:
+        """
+        Index arrays aligning all channels to the shortest one.
+
+        Computed once per capture and cached; the aligned and decimated
+        exports both gather from it.
+        """
+        if self._alignment is None:
+            n = min(wf.points for wf in self.waveforms)
+
+            def idx(wf_n):
+                return None if wf_n == n else scaled_indices(wf_n, n)
+
+            self._alignment = Alignment(
+                n, idx(self.ref.points),
+                tuple(idx(wf.points) for wf in self.waveforms),
+            )
+        return self._alignment
+
+    def slice(self, channel: str, t_start: float, t_end: float,
+              max_points: int | None = None) -> Slice:
+        """
+        Samples of *channel* with timestamps in ``[t_start, t_end]``.
+
+        The window is located from the channel's preamble in O(1) and only
+        ``codes[lo:hi]`` is read.  When it holds more than *max_points*
+        samples, the min / max envelope is served from the channel's
+        pyramid instead, reading about ``factor * max_points`` values.
+        """
+        wf = self[channel]
+        lo, hi = wf.index_range(t_start, t_end)
+        if max_points is None or hi - lo <= max_points:
+            starts = np.arange(lo, hi)
+            mins = maxs = wf.to_volts(wf.codes[lo:hi])
+        else:
+            if max_points < 1:
+                raise ValueError("max_points must be >= 1")
+            starts, mins, maxs = self.pyramid(channel).envelope(
+                wf.codes, lo, hi, max_points)
+            mins, maxs = wf.to_volts(mins), wf.to_volts(maxs)
+        return Slice(channel, lo, hi, wf.time_at(starts), mins, maxs)
+
+    def pyramid(self, channel: str, factor: int = 16,
+                min_points: int = 10_000) -> Pyramid:
+        """Envelope pyramid for *channel*, built on first use (or loaded)."""
+        pyr = self.pyramids.get(channel)
+        if pyr is None:
+            pyr = Pyramid.build(self[channel].codes, factor, min_points)
+            self.pyramids[channel] = pyr
+        return pyr